@@ -1,14 +1,76 @@
+import atexit
+import os
+import re
 import streamlit as st
-from supabase import create_client, Client
-import pandas as pd
+from streamlit.errors import StreamlitAPIException
+import httpx
+import uuid
 from datetime import datetime
-import time
-import plotly.express as px
 
-# --- Supabase 接続 ---
-url = st.secrets["SUPABASE_URL"]
-key = st.secrets["SUPABASE_KEY"]
-supabase: Client = create_client(url, key)
+# ログイン画面の描画に必要な軽いモジュールだけをここで読み込む
+# （pandas・supabase・グラフ描画など重いモジュールは、使う直前かログイン後に読み込む。
+#   起動時間は python -m bench.startup で計測できる）
+from bookclub.cache import TableCache
+from bookclub.client import SharedClient
+from bookclub.loader import load_concurrently, make_executor
+from bookclub.persist import DiskStore, StaleWhileRevalidate
+from bookclub.projections import columns_for, query_for, strict_embedded
+from bookclub.repository import DEFAULT_CLUB, SQLiteRepository, SupabaseRepository
+from bookclub.tenancy import ClubRegistry, ClubState
+from bookclub.tracing import TracedRepository, Tracer
+from bookclub.writer import BatchWriter
+
+# --- データの保存先 ---
+# "supabase": 本番の Supabase / "sqlite": ローカル SQLite（オフラインでの計測・負荷試験用）
+DATA_BACKEND = st.secrets.get("DATA_BACKEND", "supabase")
+
+# --- 計測 ---
+# Supabase の呼び出し・pandas の加工・各タブの描画の時間を計測する（全セッションで共有。スパンにはクラブを付ける）
+# TRACE_LOG = true でスパンごとに JSON 1 行のログも出す
+@st.cache_resource
+def get_tracer():
+    return Tracer(
+        window=int(st.secrets.get("TRACE_WINDOW", 500)),
+        log=bool(st.secrets.get("TRACE_LOG", False)),
+    )
+
+tracer = get_tracer()
+
+# この rerun の ID（スパンをまとめて Admin タブで見るため）
+RERUN_ID = uuid.uuid4().hex[:8]
+
+def span(name):
+    return tracer.span(name, rerun=RERUN_ID, club=CLUB)
+
+def traced(name):
+    # フラグメントなど、関数全体を 1 つのスパンで囲むデコレーター
+    def wrap(fn):
+        def run(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        run.__name__ = fn.__name__
+        run.__qualname__ = fn.__qualname__
+        return run
+    return wrap
+
+# Supabase のクライアント（と keep-alive の接続プール）は全セッションで共有する
+@st.cache_resource
+def get_shared_client():
+    return SharedClient(
+        st.secrets["SUPABASE_URL"],
+        st.secrets["SUPABASE_KEY"],
+        pool=st.secrets.get("SUPABASE_POOL"),
+        # 受信したバイト数を実行中のスパンに記録する
+        event_hooks={"response": [tracer.on_http_response]},
+    )
+
+@st.cache_resource
+def get_repository():
+    if DATA_BACKEND == "sqlite":
+        return SQLiteRepository(st.secrets.get("SQLITE_PATH", "bookclub.sqlite3"))
+    return SupabaseRepository(get_shared_client().get)
+
+shared_client = get_shared_client() if DATA_BACKEND == "supabase" else None
 
 # --- ページ設定 ---
 st.set_page_config(page_title="Book Club", layout="wide")
@@ -69,71 +131,398 @@ if "page" not in st.session_state: st.session_state.page = "list"
 if "USER" not in st.session_state: st.session_state.USER = None
 if "U_ICON" not in st.session_state: st.session_state.U_ICON = "👤"
 
-# --- データ取得 ---
-def fetch_users():
-    res = supabase.table("users").select("user_name, icon").execute()
-    return pd.DataFrame(res.data)
+# --- クラブ（読書会） ---
+# 1 つのデプロイで複数のクラブを扱う。URL の ?club=<id>（なければ CLUB_ID）のクラブを表示する
+CLUB = st.query_params.get("club") or st.secrets.get("CLUB_ID", DEFAULT_CLUB)
 
-def fetch_categories():
-    # categoriesテーブルから名前を取得。なければ固定リストを返します
-    try:
-        res = supabase.table("categories").select("name").order("id").execute()
-        return [item["name"] for item in res.data]
-    except:
-        return ["カテゴリエラー"] # 失敗時のバックアップ
-
-def fetch_data():
-    res_b = supabase.table("books").select("*").execute()
-    df_b = pd.DataFrame(res_b.data)
-    
-    res_v = supabase.table("votes").select("*").execute()
-    df_v_raw = pd.DataFrame(res_v.data)
-    
-    if df_v_raw.empty:
-        df_v = pd.DataFrame(columns=["id", "created_at", "action", "book_id", "user_name", "points", "書籍タイトル", "著者名"])
-    else:
-        df_b_subset = df_b[["id", "title", "author"]].rename(
-            columns={"id": "book_id", "title": "書籍タイトル", "author": "著者名"}
-        )
-        df_v_raw["book_id"] = df_v_raw["book_id"].astype(str)
-        df_b_subset["book_id"] = df_b_subset["book_id"].astype(str)
-        
-        df_v = pd.merge(df_v_raw, df_b_subset, on="book_id", how="left")
-        
-    return df_b, df_v
-    
-def fetch_events():
+# 別のクラブを開いたら、前のクラブのログイン状態や反映待ちの変更は引き継がない
+if st.session_state.get("club") != CLUB:
+    st.session_state.club = CLUB
+    st.session_state.USER = None
+    st.session_state.U_ICON = "👤"
+    st.session_state.pop("pending_writes", None)
+
+# 最後に取得できたテーブルをディスク（Parquet）に保存しておき、
+# 起動直後はそれをすぐ表示して裏で取り直す。サーバーにつながらないときは閲覧のみで表示を続ける
+# SNAPSHOT_DIR を空にするとディスクには保存しない（メモリ上の直近の値だけで続行する）
+SNAPSHOT_DIR = st.secrets.get("SNAPSHOT_DIR", ".snapshot")
+# 「🔄 更新」は REFRESH_DEBOUNCE_SECONDS 秒以内に取得・突き合わせしたばかりのテーブルには何もしない
+REFRESH_DEBOUNCE_SECONDS = float(st.secrets.get("REFRESH_DEBOUNCE_SECONDS", 5))
+
+# 取得する列は bookclub/projections.py で画面ごとに宣言した列だけにする
+# STRICT_PROJECTIONS = true なら、宣言にない列を読んだ時点でエラーにする（開発・負荷試験用）
+STRICT_PROJECTIONS = bool(st.secrets.get("STRICT_PROJECTIONS", False))
+# PROJECTION_VIEWS を指定すると、全ビューの和集合ではなくそのビューの列だけを取得する
+# （テスト用。画面ごとに、別のビューの列を読んでいないかを確かめる。tests/test_projections.py）
+PROJECTION_VIEWS = st.secrets.get("PROJECTION_VIEWS")
+if PROJECTION_VIEWS is not None:
+    PROJECTION_VIEWS = tuple(PROJECTION_VIEWS)
+
+def strict_events(df):
+    return strict_embedded(df, views=PROJECTION_VIEWS)
+
+@st.cache_resource
+def get_refresh_executor():
+    return make_executor(max_workers=2, name="bookclub-refresh")
+
+def make_club(club_id):
+    # 1 つのクラブのキャッシュ一式。テーブルのキャッシュもスナップショットもクラブごとに分けるので、
+    # あるクラブの書き込みで別のクラブのキャッシュは無効にならない
+    if not re.fullmatch(r"[\w-]{1,64}", club_id):
+        raise KeyError(club_id)
+    club_repo = TracedRepository(get_repository().for_club(club_id), tracer, club=club_id)
+    directory = os.path.join(SNAPSHOT_DIR, club_id) if SNAPSHOT_DIR else None
     try:
-        res = supabase.table("events").select("*, books(*)").order("event_date", desc=True).execute()
-        if not res.data:
-            return pd.DataFrame(columns=["event_date", "book_id", "books"])
-            
-        return pd.DataFrame(res.data)
-    except Exception as e:
-        st.error(f"イベントデータ取得エラー: {e}")
-        return pd.DataFrame(columns=["event_date", "book_id", "books"])
+        known = {c["id"] for c in club_repo.clubs()}
+    except Exception:
+        # サーバーにつながらないときは、保存済みのデータがあるクラブだけ開く
+        known = {club_id} if directory and os.path.isdir(directory) else set()
+    if club_id not in known:
+        raise KeyError(club_id)
+    return ClubState(
+        club_id,
+        repo=club_repo,
+        # テーブルごとの TTL + バージョン付きキャッシュ（このクラブの全セッションで共有）
+        # 同時の読み込みは 1 回の取得にまとめ、「🔄 更新」は REFRESH_DEBOUNCE_SECONDS 秒以内に
+        # 取得したばかりのテーブルは捨てない
+        table_cache=TableCache(
+            ttls=st.secrets.get("CACHE_TTL"),
+            refresh_window=REFRESH_DEBOUNCE_SECONDS,
+        ),
+        freshness=StaleWhileRevalidate(
+            store=DiskStore(directory) if directory else None,
+            executor=get_refresh_executor(),
+            retry_interval=float(st.secrets.get("OFFLINE_RETRY_SECONDS", 30)),
+            save_interval=float(st.secrets.get("SNAPSHOT_SAVE_SECONDS", 60)),
+            restore={"events": strict_events} if STRICT_PROJECTIONS else None,
+        ),
+    )
+
+# メモリに置くのは最近使った CLUB_CACHE_SIZE クラブまで（超えたら使っていないクラブから捨てて、
+# 次に開かれたときにディスクのスナップショットから作り直す）
+# 見つからなかったクラブは CLUB_MISSING_TTL_SECONDS 秒のあいだ問い合わせずに「見つからない」と返す
+@st.cache_resource
+def get_club_registry():
+    return ClubRegistry(
+        make_club,
+        maxsize=int(st.secrets.get("CLUB_CACHE_SIZE", 16)),
+        missing_ttl=float(st.secrets.get("CLUB_MISSING_TTL_SECONDS", 30)),
+    )
+
+try:
+    club = get_club_registry().get(CLUB)
+except KeyError:
+    st.error(f"クラブ「{CLUB}」が見つかりません。URL を確認してね🙏")
+    st.stop()
+
+# 以降の読み書きはすべてこのクラブの分だけ
+repo = club.repo
+table_cache = club.table_cache
+freshness = club.freshness
+
+# --- データ取得 ---
+# テーブルを書き換えたときに一緒に無効化する集計結果
+DERIVED_KEYS = {
+    "books": ("ranking", "category_counts"),
+    "votes": ("ranking",),
+    "events": ("ranking", "category_counts"),
+}
+
+def invalidate_tables(*tables):
+    # 書き込んだテーブルだけを無効化する（引数なしなら全テーブル）
+    keys = list(tables)
+    for t in tables:
+        keys.extend(DERIVED_KEYS.get(t, ()))
+    table_cache.invalidate(*keys)
+
+# books / votes / events の取得モード
+# "incremental": created_at 以降の差分だけを取得 / "full": 毎回全件取得
+SYNC_MODE = st.secrets.get("DATA_SYNC", "incremental")
+
+# 差分は透かしから SYNC_OVERLAP_SECONDS 秒さかのぼって取り直す（遅れてコミットされた行を拾う）
+SYNC_OVERLAP_SECONDS = float(st.secrets.get("SYNC_OVERLAP_SECONDS", 10))
 
-def save_and_refresh(table, data, message=""):
+def make_snapshots():
+    interval = float(st.secrets.get("SYNC_RECONCILE_SECONDS", 300))
+    return {
+        "books": repository_snapshot(
+            repo, "books", empty_columns=columns_for("books", PROJECTION_VIEWS),
+            reconcile_interval=interval, query=query_for("books", PROJECTION_VIEWS),
+            overlap=SYNC_OVERLAP_SECONDS,
+        ),
+        "votes": repository_snapshot(
+            repo, "votes", empty_columns=columns_for("votes", PROJECTION_VIEWS),
+            reconcile_interval=interval, query=query_for("votes", PROJECTION_VIEWS),
+            overlap=SYNC_OVERLAP_SECONDS,
+        ),
+        "events": repository_snapshot(
+            repo, "events",
+            empty_columns=["event_date", "book_id", "books"],
+            sort_by=("event_date", True),
+            reconcile_interval=interval,
+            query=query_for("events", PROJECTION_VIEWS),
+            overlap=SYNC_OVERLAP_SECONDS,
+        ),
+    }
+
+def discard_deleted(table, deleted_rows):
+    # 差分同期モードでは、削除された行をスナップショットからすぐに取り除く
+    if snapshots is not None:
+        snapshots[table].discard(deleted_rows)
+    invalidate_tables(table)
+
+def archive_decided_votes():
+    # 開催が決まった本への投票を votes_archive に移す（以降の votes の取得は今回のラウンドの分だけになる）
+    # 失敗しても表示は used_book_ids での除外で正しいままなので、通知だけして続ける
     try:
-        # ログインユーザー名を付与
-        data["user_name"] = st.session_state.USER
-        supabase.table(table).insert(data).execute()
-        st.cache_data.clear()
-        # 画面右下にふわっと出る通知
-        st.toast(message, icon="🚀")
-        # 待ち時間を消して即リロード
-        st.rerun()
+        archived = repo.archive_decided_votes()
     except Exception as e:
+        st.toast(f"投票のアーカイブに失敗しました（次回の確定時に再実行されます）: {e}", icon="⚠️")
+        return
+    if archived:
+        discard_deleted("votes", archived)
+
+def guarded(loader):
+    # 通信エラーが出たら、次の rerun で接続プールごと作り直す
+    def run():
+        try:
+            return loader()
+        except httpx.TransportError:
+            if shared_client is not None:
+                shared_client.mark_unhealthy()
+            raise
+    return run
+
+# users はログイン画面で使うので DataFrame にせず行のリストのままキャッシュする（pandas を読み込まない）
+def _load_users():
+    return repo.users()
+
+def _load_categories():
+    return repo.categories()
+
+# books / votes は取得時に 1 回だけ型をそろえてからキャッシュする（id は文字列など）
+def _load_books():
+    if snapshots is not None:
+        return normalize_books(snapshots["books"].sync())
+    rows = repo.books(**query_for("books", PROJECTION_VIEWS))
+    return normalize_books(pd.DataFrame(rows, columns=columns_for("books", PROJECTION_VIEWS)))
+
+def _load_votes():
+    if snapshots is not None:
+        return normalize_votes(snapshots["votes"].sync())
+    rows = repo.votes(**query_for("votes", PROJECTION_VIEWS))
+    return normalize_votes(pd.DataFrame(rows, columns=columns_for("votes", PROJECTION_VIEWS)))
+
+def _load_events():
+    if snapshots is not None:
+        df = snapshots["events"].sync()
+    else:
+        rows = repo.events(**query_for("events", PROJECTION_VIEWS))
+        df = pd.DataFrame(rows) if rows else pd.DataFrame(columns=["event_date", "book_id", "books"])
+    return strict_events(df) if STRICT_PROJECTIONS else df
+
+# ディスクに保存して起動直後・障害時に使うテーブル（クラブごとの SNAPSHOT_DIR/<club_id>/）
+PERSISTED_TABLES = ("users", "categories", "books", "votes", "events")
+
+def read_only():
+    # サーバーにつながらず保存済みのデータを表示している間は、書き込みを受け付けない
+    return freshness.offline()
+
+def cached(table, loader):
+    # キャッシュ経由で読み込む関数を返す（スレッドプールから呼ばれる）
+    def fetch():
+        return table_cache.get(table, guarded(loader))
+
+    def load():
+        with span(f"load.{table}") as s:
+            if table in PERSISTED_TABLES:
+                return s.measure(freshness.get(table, fetch))
+            return s.measure(fetch())
+    return load
+
+def show_freshness():
+    # 古いデータを表示しているときは、いつ時点のデータかを出す
+    status = freshness.status()
+    if not status:
+        return
+    since = datetime.fromtimestamp(min(x.since for x in status.values())).strftime("%Y/%m/%d %H:%M")
+    if read_only():
+        st.warning(f"📴 サーバーにつながらないため、{since} 時点のデータを表示しています（閲覧のみ・変更はできません）")
+    else:
+        st.caption(f"💾 {since} 時点の保存データを表示しています（最新のデータを取得中…）")
+
+def fetch_users():
+    return cached("users", _load_users)()
+
+# ランキングとカテゴリ集計をどこで計算するか
+# "server": Supabase のビューで集計 / "client": 生データを取得して pandas で集計
+AGGREGATION = st.secrets.get("AGGREGATION", "client")
+
+@st.cache_resource
+def get_load_executor():
+    return make_executor(max_workers=int(st.secrets.get("LOAD_WORKERS", 8)))
+
+def fetch_page_data(needs):
+    # 独立したテーブルをまとめて並行取得する（待ち時間 = 一番遅いクエリ）
+    # needs に含まれるものだけを取得する
+    loaders = {
+        "books": cached("books", _load_books),
+        "votes": cached("votes", _load_votes),
+        "events": cached("events", _load_events),
+        "categories": cached("categories", _load_categories),
+    }
+    fallbacks = {
+        # categoriesテーブルが読めなければ固定リストを返します
+        "categories": lambda e: ["カテゴリエラー"],
+        "events": lambda e: pd.DataFrame(columns=["event_date", "book_id", "books"]),
+    }
+    if AGGREGATION == "server":
+        aggregates = repo.aggregates
+        loaders["ranking_rows"] = cached("ranking", aggregates.ranking_rows)
+        loaders["category_counts"] = cached("category_counts", aggregates.category_counts)
+        # ビューが読めないときは pandas での集計に戻す
+        fallbacks["ranking_rows"] = lambda e: None
+        fallbacks["category_counts"] = lambda e: None
+    loaders = {name: fn for name, fn in loaders.items() if name in needs}
+    with span("fetch_page_data"):
+        return load_concurrently(get_load_executor(), loaders, fallbacks=fallbacks)
+
+# --- 楽観的更新（選出・投票ボタン） ---
+# 押したらすぐ画面に反映し、サーバーへの書き込みはバックグラウンドで行う
+# （ボタンの on_click から呼ぶので、続くフラグメントの再実行にそのまま反映される）
+@st.cache_resource
+def get_write_executor():
+    return make_executor(max_workers=int(st.secrets.get("WRITE_WORKERS", 4)), name="bookclub-write")
+
+# 選出・投票の書き込み方法
+# "rpc": サーバー側でルールを検証する RPC（更新後のランキングも同じレスポンスで受け取る）
+# "table": votes テーブルに直接 insert / delete する
+WRITE_MODE = st.secrets.get("WRITE_MODE", "table")
+
+def run_vote_command(command):
+    # command は ("cast_vote", user_name, book_id, points) のようなタプル
+    name, *params = command
+    rows = getattr(vote_commands, name)(*params)
+    invalidate_tables("votes")
+    # 返ってきたランキングをそのままキャッシュに入れる（取り直し不要）
+    table_cache.put("ranking", rows)
+
+def pending_writes():
+    if "pending_writes" not in st.session_state:
+        st.session_state.pending_writes = PendingWrites()
+    return st.session_state.pending_writes
+
+# 書き込みを行った画面（失敗はその画面に出す）。フラグメントはセクションごとに 1 つ
+def write_origin():
+    return st.session_state.get("section")
+
+def settle_writes():
+    # コールバックで予約した通知を出す（コールバック内で直接描画しないため）
+    if "toast" in st.session_state:
+        message, icon = st.session_state.pop("toast")
+        st.toast(message, icon=icon)
+    # 書き込みが終わったものを反映待ちから外し、この画面の書き込みが失敗していたら知らせる
+    for e in pending_writes().settle(write_origin()):
         st.error(f"エラーが発生しちゃった😢: {e}")
+
+# 描画した後、この画面の書き込みの完了を最大この秒数だけ待ってフラグメントを描き直す
+# （失敗を次の操作まで待たずに、書き込んだ画面に出す）
+WRITE_SETTLE_SECONDS = float(st.secrets.get("WRITE_SETTLE_SECONDS", 3))
+
+def rerun_when_settled():
+    if not pending_writes().wait(write_origin(), timeout=WRITE_SETTLE_SECONDS):
+        return
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        # 全体の再実行の途中ではフラグメントだけを描き直せない（次の表示で反映される）
+        pass
+
+def settles_writes(fn):
+    # 書き込みボタンのあるフラグメント用: 描画の前に反映待ちを整理し、描画の後に完了を待って描き直す
+    def run(*args, **kwargs):
+        settle_writes()
+        fn(*args, **kwargs)
+        rerun_when_settled()
+    run.__name__ = fn.__name__
+    run.__qualname__ = fn.__qualname__
+    return run
+
+def insert_vote(data, message="", command=None):
+    if read_only():
+        st.session_state.toast = ("サーバーにつながらないため、いまは変更できません🙏", "📴")
+        return
+    # ログインユーザー名を付与
+    row = {**data, "user_name": st.session_state.USER}
+
+    def write():
+        if vote_commands is not None and command is not None:
+            run_vote_command(command)
+            return
+        repo.add_vote(row)
+        invalidate_tables("votes")
+
+    pending_writes().add_insert(get_write_executor(), row, write, origin=write_origin())
+    # 画面右下にふわっと出る通知
+    st.session_state.toast = (message, "🚀")
+
+def delete_votes(match, message=None, command=None):
+    if read_only():
+        st.session_state.toast = ("サーバーにつながらないため、いまは変更できません🙏", "📴")
+        return
+    def write():
+        if vote_commands is not None and command is not None:
+            run_vote_command(command)
+            return
+        discard_deleted("votes", repo.delete_votes(match))
+
+    pending_writes().add_delete(get_write_executor(), match, write, origin=write_origin())
+    if message:
+        st.session_state.toast = (message, "🙋")
+
+# books / votes / users から作る索引付きモデル（入力が変わらなければクラブの全セッションで使い回す）
+def get_model_cache():
+    return club.resource("model_cache", ModelCache)
+
+def club_model(df_b, df_v_raw):
+    with span("transform.model") as s:
+        if pending_writes().pending:
+            # 反映待ちの変更があるセッションだけ、変更を重ねた votes で作り直す
+            df_v = normalize_votes(pending_writes().apply(df_v_raw))
+            model = ClubModel(df_b, df_v, user_df, used_book_ids)
+        else:
+            model = get_model_cache().get(df_b, df_v_raw, user_df, used_book_ids)
+        s.measure(model.active_votes)
+        return model
+
+def fresh_model():
+    # フラグメントの再実行時は、キャッシュから最新の books / votes を読み直す
+    return club_model(cached("books", _load_books)(), cached("votes", _load_votes)())
         
+# アクセスログなどの書きっぱなしの行は、裏のスレッドでまとめて書き込む（ログインを待たせない）
+# （全クラブで 1 つのキュー。行の club_id でクラブを分ける）
+@st.cache_resource
+def get_log_writer():
+    writer = BatchWriter(
+        TracedRepository(get_repository(), tracer).add_log_rows,
+        max_batch=int(st.secrets.get("LOG_BATCH_SIZE", 100)),
+        flush_interval=float(st.secrets.get("LOG_FLUSH_SECONDS", 1.0)),
+    )
+    # プロセス終了時に残りを書き出す
+    atexit.register(writer.close)
+    return writer
+
+log_writer = get_log_writer()
+
 # --- 1. ログイン処理 ---
-user_df = fetch_users()
+users = fetch_users()
 
 if not st.session_state.USER:
     st.markdown("<h2 style='text-align: center; margin-top: 2rem;'>📚 Book Club Login</h2>", unsafe_allow_html=True)
+    show_freshness()
     
-    if not user_df.empty:
-        user_list = user_df.sort_values("user_name").to_dict('records')
+    if users:
+        user_list = sorted(users, key=lambda r: r["user_name"])
         # 3人ずつ分割して表示
         for i in range(0, len(user_list), 3):
             # 💡 horizontal=True を指定することでスマホでも横並びを維持します
@@ -144,11 +533,8 @@ if not st.session_state.USER:
                     
                     # ボタン内の改行とアイコン表示。use_container_widthで幅を揃えます
                     if st.button(f"{row['icon']}\n{row['user_name']}", key=btn_key, use_container_width=True):
-                        # ログ出力（テーブル名は適宜合わせてください）
-                        try:
-                            supabase.table("access_logs").insert({"user_name": row['user_name']}).execute()
-                        except:
-                            pass # ログ用テーブルがない場合はスキップ
+                        # ログ出力（キューに入れるだけ。書き込みは裏でまとめて行う）
+                        log_writer.submit("access_logs", {"user_name": row['user_name'], "club_id": CLUB})
                             
                         st.session_state.USER = row['user_name']
                         st.session_state.U_ICON = row['icon']
@@ -156,21 +542,82 @@ if not st.session_state.USER:
                         st.rerun()
     st.stop()
 
+# --- ここから先はログイン後だけ実行される ---
+# pandas と、それを使うデータ処理・描画のモジュールはここで読み込む
+# （ログイン画面の描画を待たせない。2 回目以降の rerun では読み込み済みのものを使うだけ）
+import pandas as pd
+
+from bookclub.aggregates import ranking_from_rows
+from bookclub.events import EventsView, category_counts
+from bookclub.model import ClubModel, ModelCache, normalize_books, normalize_votes
+from bookclub.optimistic import PendingWrites
+from bookclub.ranking import compute_ranking
+from bookclub.render import book_card_html, history_entry_html, ranking_row_html, vote_panel_html
+from bookclub.search import SearchIndex, book_documents, history_documents
+from bookclub.sync import repository_snapshot
+
+# 読み込みはスレッドプールから行うので、スナップショットはここで取り出しておく
+snapshots = club.resource("snapshots", make_snapshots) if SYNC_MODE == "incremental" else None
+
+vote_commands = repo.vote_commands if WRITE_MODE == "rpc" else None
+
+# users の DataFrame は、キャッシュの行のリストが同じなら同じものを使う（ClubModel を使い回すため）
+def users_frame(rows):
+    memo = club.resource("users_frames", dict)
+    source, df = memo.get("users", (None, None))
+    if source is not rows:
+        df = pd.DataFrame(rows)
+        memo["users"] = (rows, df)
+    return df
+
+user_df = users_frame(users)
+
 # --- メインコンテンツ部分 ---
-df_books, df_votes = fetch_data()
-df_events = fetch_events()
+# 表示中のセクション（タブ）の分だけデータを取得・計算する
+SECTIONS = ["📖 Books", "🗳️ Votes", "📜 History", "⚙️ Admin"]
+SECTION_DATA = {
+    "📖 Books": {"books", "votes", "categories"},
+    "🗳️ Votes": {"books", "votes", "ranking_rows"},
+    "📜 History": {"category_counts"},
+    "⚙️ Admin": {"books", "votes"},
+}
+if st.session_state.get("section") not in SECTIONS:
+    st.session_state.section = SECTIONS[0]
+section = st.session_state.section
+
+def section_needs(section):
+    needs = SECTION_DATA[section]
+    # サーバーで集計したランキングを表示するだけなら books / votes は読まない
+    # （ビューが読めないときや、反映待ちの変更を重ねるときは current_ranking() がその場で読む）
+    if section == "🗳️ Votes" and AGGREGATION == "server" and not pending_writes().pending:
+        needs = needs - {"books", "votes"}
+    return needs
+
+# events はヘッダーの「次回の開催」で常に使う
+page_data = fetch_page_data(section_needs(section) | {"events"})
+show_freshness()
+if "events" in page_data.errors:
+    st.error(f"イベントデータ取得エラー: {page_data.errors['events']}")
+
+df_events = page_data["events"]
 
 # --- データの加工 ---
 # 1. すべてのイベント（過去・未来問わず）に登録された本のIDを取得
-used_book_ids = [str(x) for x in df_events["book_id"].unique().tolist()] if not df_events.empty else []
+# （events は 1 回だけ日付パースし、ヘッダー・History・Admin で使い回す）
+with span("transform.events_view") as s:
+    events_view = EventsView(df_events, today=datetime.now().date())
+    s.measure(events_view.all)
+used_book_ids = events_view.used_book_ids
 
-# 2. Books一覧から、イベントで使用済みの本を除外する
-df_display_books = df_books[~df_books["id"].astype(str).isin(used_book_ids)]
+if "books" in page_data.values:
+    df_books = page_data["books"]
 
-# 3. 選出・投票データからも、既に使用された本のデータを除外する
-# これにより、Booksタブの「選出済」判定や、Votesタブのランキングから「確定済の本」が消えます。
-# かつ、選んだ人の「1冊選出済み」フラグもリセットされます。
-df_active_votes = df_votes[~df_votes["book_id"].astype(str).isin(used_book_ids)]
+    # 2. Books一覧から、イベントで使用済みの本を除外する（model.display_books）
+    # 3. 選出・投票データからも、既に使用された本のデータを除外する（model.active_votes）
+    # これにより、Booksタブの「選出済」判定や、Votesタブのランキングから「確定済の本」が消えます。
+    # かつ、選んだ人の「1冊選出済み」フラグもリセットされます。
+    model = club_model(df_books, page_data["votes"])
+    df_display_books = model.display_books
 
 # 固定ヘッダー（ログインユーザー表示）
 c_head1, c_head_upd = st.columns([0.8, 0.2])
@@ -178,18 +625,20 @@ with c_head1:
     st.subheader(f"{st.session_state.U_ICON} {st.session_state.USER} さん")
 with c_head_upd:
     if st.button("🔄 更新", use_container_width=True):
-        st.cache_data.clear()
+        # 全員のキャッシュを捨てるのではなく、少し前に取得したテーブルはそのまま使う
+        # 差分同期モードでは、次の同期で id の突き合わせもやり直す（差分で拾えない削除・取りこぼしを反映）
+        if snapshots is not None:
+            for snap in snapshots.values():
+                snap.mark_stale(min_age=REFRESH_DEBOUNCE_SECONDS)
+        table_cache.refresh()
         st.rerun()
 
 # ② 次回の読書会（TOPインフォメーション）
-# カラムが存在するかチェックしてから処理
-if "event_date" in df_events.columns and not df_events.empty:
-    today = datetime.now().strftime("%Y-%m-%d")
-    future_events = df_events[df_events["event_date"] >= today]
+if not events_view.all.empty:
+    next_ev = events_view.next_event
     
-    if not future_events.empty:
+    if next_ev is not None:
         # 未来のイベントがある場合
-        next_ev = future_events.sort_values("event_date").iloc[0]
         b_info = next_ev.get("books") if next_ev.get("books") else {}
         b_url = b_info.get("url")
         
@@ -226,19 +675,23 @@ st.markdown(
 )
 
 # --- タブの作成 ---
-tab1, tab2, tab3, tab4 = st.tabs(["📖 Books", "🗳️ Votes", "📜 History", "⚙️ Admin"])
+# st.tabs は全タブの中身を毎回実行してしまうので、選択中のセクションだけを描画する
+st.segmented_control(
+    "表示するタブ", SECTIONS, key="section", required=True,
+    label_visibility="collapsed", width="stretch",
+)
 
 # --- PAGE 1: BOOK LIST ---
-with tab1:
+def render_books():
     # --- 🆕 本の登録フォーム ---
     with st.expander("➕ 新しい本を登録する"):
-        cat_list = fetch_categories() # マスタから取得
+        cat_list = page_data["categories"] # マスタから取得
         with st.form("add_book_form", clear_on_submit=True):
             new_title = st.text_input("* 書籍タイトル")
             new_author = st.text_input("著者名")
             new_cat = st.radio("カテゴリーを選択", cat_list, horizontal=True)
             new_url = st.text_input("詳細URL（出版社URLなど）")
-            submit_book = st.form_submit_button("本を登録する", use_container_width=True, type="primary")
+            submit_book = st.form_submit_button("本を登録する", use_container_width=True, type="primary", disabled=read_only())
             
             if submit_book:
                 if new_title:
@@ -250,8 +703,8 @@ with tab1:
                         "created_by": st.session_state.USER  # ログインユーザーを記録
                     }
                     try:
-                        supabase.table("books").insert(book_data).execute()
-                        st.cache_data.clear()
+                        repo.add_book(book_data)
+                        invalidate_tables("books")
                         st.toast(f"「{new_title}」を登録しました", icon="🚀")
                         st.rerun() # 即座に反映
                     except Exception as e:
@@ -259,6 +712,73 @@ with tab1:
                 else:
                     st.warning("タイトルは必ず入力してね🙏")
     
+    render_book_cards()
+
+# 1 カテゴリあたり最初に表示する冊数（「もっと見る」で同じ数ずつ増やす）
+BOOKS_PAGE_SIZE = int(st.secrets.get("BOOKS_PAGE_SIZE", 10))
+
+def show_more_books(cat, count):
+    # カテゴリごとの表示冊数はセッションに保存する（絞り込みを切り替えても維持される）
+    st.session_state.book_pages[cat] = count
+
+# 本・開催履歴の検索インデックス（クラブの全セッションで共有。元データが変わったら差分だけ反映する）
+def get_search_indexes():
+    return club.resource("search_indexes", lambda: {"books": SearchIndex(), "history": SearchIndex()})
+
+def search_ids(name, source, documents, query):
+    with span(f"search.{name}") as s:
+        index = get_search_indexes()[name].sync(source, documents)
+        return s.measure(index.search(query))
+
+def render_book_card(row, my_book_id, nominated_ids):
+    b_id = str(row["id"])
+    is_nominated = b_id in nominated_ids
+    
+    with st.container(border=True):
+        # --- A. タイトル・著者エリア ---
+        st.markdown(book_card_html(row["title"], row["author"], row["url"]), unsafe_allow_html=True)
+        
+        # --- B. 選出ボタンエリア ---
+        # 詳細ボタンを消したので、ボタン1つを大きく配置
+        if b_id == my_book_id:
+            st.button("✅ これを選んでるよ", disabled=True, use_container_width=True, key=f"my_{b_id}")
+        elif is_nominated:
+            st.button("🙅‍♂️ 他の人が選んでるよ", disabled=True, use_container_width=True, key=f"nom_{b_id}")
+        else:
+            is_disabled = my_book_id is not None
+            btn_label = "これが読みたい" if not is_disabled else "既に選出済みです"
+            st.button(
+                btn_label, key=f"sel_{b_id}", disabled=is_disabled, use_container_width=True, type="primary",
+                on_click=insert_vote,
+                args=(
+                    {"action": "選出", "book_id": b_id},
+                    f"「{row['title']}」を選出したよ👍",
+                    ("nominate", st.session_state.USER, b_id),
+                ),
+            )
+
+def render_more_button(page_key, shown, total):
+    # 表示しきれていない分があれば「もっと見る」を出す
+    rest = total - shown
+    if rest > 0:
+        st.button(
+            f"もっと見る（残り {rest} 冊）", key=f"more_{page_key}", use_container_width=True,
+            on_click=show_more_books, args=(page_key, shown + BOOKS_PAGE_SIZE),
+        )
+
+# 本の一覧（選出ボタンを押したらこの部分だけ再実行する）
+@st.fragment
+@settles_writes
+@traced("render.book_cards")
+def render_book_cards():
+    model = fresh_model()
+
+    # --- 1. 検索（タイトル・著者・カテゴリ） ---
+    query = st.text_input(
+        "本を検索", key="book_query", placeholder="🔍 タイトル・著者・カテゴリで検索",
+        label_visibility="collapsed",
+    ).strip()
+
     # --- 2. カテゴリ絞り込みリスト ---
     unique_cats = sorted(df_display_books["category"].dropna().unique().tolist())
     filter_options = ["すべて"] + unique_cats
@@ -271,191 +791,146 @@ with tab1:
     else:
         # 選んだカテゴリと完全に一致するものだけに絞る
         df_filtered = df_display_books[df_display_books["category"] == selected_cat]
+
+    if query:
+        # 検索結果（関連度順）のうち、一覧に出ている本だけを残す
+        ids = search_ids("books", model.books, book_documents, query)
+        shown_ids = set(df_filtered["id"])
+        df_filtered = model.books.iloc[[model.book_pos[i] for i in ids if i in shown_ids]]
         
     # --- 3. 選出状況チェック ---
-    my_selection = df_active_votes[(df_active_votes["user_name"] == st.session_state.USER) & (df_active_votes["action"] == "選出")]
-    nominated_ids = df_active_votes[df_active_votes["action"] == "選出"]["book_id"].unique().tolist()
+    my_book_id = model.nomination_by_user.get(st.session_state.USER)
+    nominated_ids = model.nominated_ids
 
-    if not my_selection.empty:
+    if my_book_id is not None:
         st.success("✅ もうすでに1冊選んでるよ")
-        if st.button("選出をキャンセルして選び直す", use_container_width=True):
-            target_id = str(my_selection.iloc[0]["book_id"])
-            supabase.table("votes").delete().eq("book_id", target_id).eq("user_name", st.session_state.USER).eq("action", "選出").execute()
-            st.cache_data.clear()
-            st.toast("選出をキャンセルしたよ", icon="🙋")
-            st.rerun()
+        target_id = my_book_id
+        st.button(
+            "選出をキャンセルして選び直す", use_container_width=True,
+            on_click=delete_votes,
+            args=(
+                {"book_id": target_id, "user_name": st.session_state.USER, "action": "選出"},
+                "選出をキャンセルしたよ",
+                ("cancel_nomination", st.session_state.USER),
+            ),
+        )
 
     # --- 5. 本の表示（df_filtered を使用） ---
     if df_filtered.empty:
         st.info("該当する本がありません。")
     else:
-        # 💡 df_filtered からカテゴリを抽出
-        categories = df_filtered["category"].dropna().unique()
-        
-        for cat in categories:
+        if "book_pages" not in st.session_state:
+            st.session_state.book_pages = {}
+
+        # 検索結果の表示冊数は今の検索語の分だけ持つ（検索語を変えたら最初のページから）
+        page_key = f"🔍{query}" if query else None
+        for key in [k for k in st.session_state.book_pages if k.startswith("🔍") and k != page_key]:
+            del st.session_state.book_pages[key]
+
+        if query:
+            # 検索中はカテゴリで分けず、関連度の高い順に並べる
+            st.caption(f"🔍 「{query}」の検索結果: {len(df_filtered)} 冊")
+            limit = st.session_state.book_pages.get(page_key, BOOKS_PAGE_SIZE)
+            for _, row in df_filtered.head(limit).iterrows():
+                render_book_card(row, my_book_id, nominated_ids)
+            render_more_button(page_key, limit, len(df_filtered))
+            return
+
+        # 💡 df_filtered をカテゴリごとに分ける（登場順のまま）
+        for cat, category_books in df_filtered.groupby("category", sort=False, observed=True):
             st.markdown(f"### 📂 {cat}")
-            # 💡 ループ内も df_filtered を参照するように変更
-            category_books = df_filtered[df_filtered["category"] == cat]
+            # 表示するのは先頭から limit 冊まで（残りは「もっと見る」で追加）
+            limit = st.session_state.book_pages.get(cat, BOOKS_PAGE_SIZE)
             
-            for _, row in category_books.iterrows():
-                b_id = str(row["id"])
-                is_nominated = b_id in nominated_ids
-                b_url = row["url"] if pd.notnull(row["url"]) and str(row["url"]).startswith("http") else None
-                
-                with st.container(border=True):
-                    # --- A. タイトル・著者エリア ---
-                    if b_url:
-                        # リンクがある場合は青色（#1E88E5）
-                        st.markdown(f"""
-                            <div style="margin-bottom: 12px;">
-                                <a href="{b_url}" target="_blank" class="book-title-link">
-                                    <div style="font-size: 1.15rem; font-weight: bold; color: #1E88E5; line-height: 1.4;">
-                                        {row['title']}
-                                    </div>
-                                </a>
-                                <div style="color: #888; font-size: 0.8rem; margin-top: 4px;">{row['author']}</div>
-                            </div>
-                        """, unsafe_allow_html=True)
-                    else:
-                        # リンクがない場合は通常の黒色
-                        st.markdown(f"""
-                            <div style="margin-bottom: 12px;">
-                                <div style="font-size: 1.15rem; font-weight: bold; color: #333; line-height: 1.4;">
-                                    {row['title']}
-                                </div>
-                                <div style="color: #888; font-size: 0.8rem; margin-top: 4px;">{row['author']}</div>
-                            </div>
-                        """, unsafe_allow_html=True)
-                    
-                    # --- B. 選出ボタンエリア ---
-                    # 詳細ボタンを消したので、ボタン1つを大きく配置
-                    if not my_selection.empty and b_id == str(my_selection.iloc[0]["book_id"]):
-                        st.button("✅ これを選んでるよ", disabled=True, use_container_width=True, key=f"my_{b_id}")
-                    elif is_nominated:
-                        st.button("🙅‍♂️ 他の人が選んでるよ", disabled=True, use_container_width=True, key=f"nom_{b_id}")
-                    else:
-                        is_disabled = not my_selection.empty
-                        btn_label = "これが読みたい" if not is_disabled else "既に選出済みです"
-                        if st.button(btn_label, key=f"sel_{b_id}", disabled=is_disabled, use_container_width=True, type="primary"):
-                            save_and_refresh("votes", {"action": "選出", "book_id": b_id}, f"「{row['title']}」を選出したよ👍")
+            for _, row in category_books.head(limit).iterrows():
+                render_book_card(row, my_book_id, nominated_ids)
+            render_more_button(cat, limit, len(category_books))
                             
 # --- 7. PAGE 2: RANKING & VOTE ---
-with tab2:
+def render_votes():
     st.header("🏆 Ranking")
-    nominated_rows = df_active_votes[df_active_votes["action"] == "選出"]
+    render_vote_panel()
+
+@traced("transform.ranking")
+def current_ranking():
+    # RPC で書き込んだ場合は、返ってきたランキングがキャッシュに入っている
+    if (AGGREGATION == "server" or vote_commands is not None) and not pending_writes().pending:
+        try:
+            # サーバー側で集計済みのランキングを使う
+            rows = cached("ranking", repo.aggregates.ranking_rows)()
+            return ranking_from_rows(rows, user_df, st.session_state.USER)
+        except Exception:
+            pass # ビューが読めないときは pandas で集計する
+    model = fresh_model()
+    return compute_ranking(
+        model.active_votes, user_df, model.books, st.session_state.USER,
+        icon_by_user=model.icon_by_user, url_by_book=model.url_by_book,
+    )
+
+# ランキングと投票パネル（投票ボタンを押したらこの部分だけ再実行する）
+@st.fragment
+@settles_writes
+@traced("render.vote_panel")
+def render_vote_panel():
+    ranking = current_ranking()
 
-    if nominated_rows.empty:
+    if ranking.table.empty:
         st.info("まだ候補が選ばれていません。")
     else:
-        vote_only = df_active_votes[df_active_votes["action"] == "投票"]
-        user_icon_map = dict(zip(user_df['user_name'], user_df['icon']))
-        url_map = dict(zip(df_books['id'].astype(str), df_books['url']))
-        
-        # 最高得点の計算
-        max_p = 0
-        all_stats = []
-        for _, n in nominated_rows.iterrows():
-            p = int(vote_only[vote_only["book_id"] == str(n["book_id"])]["points"].sum())
-            if p > max_p: max_p = p
-            all_stats.append(p)
+        ranking_rows = ranking.table.to_dict("records")
 
         # --- 1. ランキング表示（超コンパクト） ---
-        ranking_html = ""
-        for i, (_, n) in enumerate(nominated_rows.iterrows()):
-            pts = all_stats[i]
-            is_top = (pts == max_p and max_p > 0)
-            
-            b_votes = vote_only[vote_only["book_id"] == str(n["book_id"])]           
-            vote_list = [f"{user_icon_map.get(v['user_name'], '👤')} {int(v['points'])}" for _, v in b_votes.iterrows()]
-            details = " + ".join(vote_list)
-            
-            prefix = "👑 " if is_top else ""
-            pts_color = "#E65100" if is_top else "#1E88E5"
-            
-            ranking_html += f"""
-            <div style="margin-bottom: 4px; line-height: 1.2;">
-                {prefix}<b>{n['書籍タイトル']}</b> 
-                <span style="font-size: 1.5rem; font-weight: bold; color: {pts_color}; margin-left: 6px;">{pts}</span>
-                <span style="font-size: 0.8rem; color: #555;">pts</span>
-                <span style="font-size: 1.0rem; color: #555; margin-left: 8px;">...{details}</span>
-            </div>
-            <hr style="margin: 4px 0; border: 0; border-top: 1px solid #eee;">
-            """
+        with span("html.ranking") as s:
+            ranking_html = s.measure("".join(ranking_row_html(n) for n in ranking_rows))
         st.markdown(ranking_html, unsafe_allow_html=True)
 
         # --- 2. 投票セクション（パネルUI復活版） ---
         st.divider()
         st.subheader("🗳️ 投票")
-        my_votes = vote_only[vote_only["user_name"] == st.session_state.USER]
-        v_points = my_votes["points"].tolist()
+        v_points = ranking.my_used_points
         
-        for _, n in nominated_rows.iterrows():
-            b_id = str(n["book_id"])
-            current_p = int(my_votes[my_votes["book_id"] == b_id]["points"].sum())
-            b_url = url_map.get(b_id)
-            n_user = n["user_name"]
-            n_icon = user_icon_map.get(n_user, "👤")
-            is_my_nomination = (n_user == st.session_state.USER)
+        for n in ranking_rows:
+            b_id = n["book_id"]
+            current_p = n["my_points"]
+            is_my_nomination = (n["nominator"] == st.session_state.USER)
             
             with st.container(border=True):
-                # タイトルリンク（青色・下線なし）
-                if pd.notnull(b_url) and str(b_url).startswith("http"):
-                    title_style = "color: #1E88E5; text-decoration: none; font-weight: bold; font-size: 1.05rem;"
-                    title_html = f'<a href="{b_url}" target="_blank" style="{title_style}">{n["書籍タイトル"]}</a>'
-                else:
-                    title_html = f'<b style="font-size: 1.05rem;">{n["書籍タイトル"]}</b>'
-
-                st.markdown(f"""
-                    <div style="line-height: 1.5; margin-bottom: 12px;">
-                        {title_html}<br>
-                        <div style="color: #666; font-size: 0.85rem; margin-bottom: 8px;">{n['著者名']}</div>
-                        <span style="background: #e1f5fe; border-radius: 4px; padding: 2px 8px; font-size: 0.75rem; color: #01579b; font-weight: bold; display: inline-block;">
-                            推薦: {n_icon} {n_user}
-                        </span>
-                    </div>
-                """, unsafe_allow_html=True)
+                st.markdown(vote_panel_html(n), unsafe_allow_html=True)
                 
                 # 投票ボタン（3列配置）
                 v1, v2, v3 = st.columns([1, 1, 1])
                 with v1:
                     d1 = is_my_nomination or (1 in v_points) or (current_p > 0)
-                    if st.button("+1", key=f"v1_{b_id}", disabled=d1, use_container_width=True):
-                        save_and_refresh("votes", {"action": "投票", "book_id": b_id, "points": 1}, "1点投票しました")
+                    st.button("+1", key=f"v1_{b_id}", disabled=d1, use_container_width=True,
+                              on_click=insert_vote, args=({"action": "投票", "book_id": b_id, "points": 1}, "1点投票しました",
+                                                          ("cast_vote", st.session_state.USER, b_id, 1)))
                 with v2:
                     d2 = is_my_nomination or (2 in v_points) or (current_p > 0)
-                    if st.button("+2", key=f"v2_{b_id}", disabled=d2, use_container_width=True, type="primary"):
-                        save_and_refresh("votes", {"action": "投票", "book_id": b_id, "points": 2}, "2点投票しました")
+                    st.button("+2", key=f"v2_{b_id}", disabled=d2, use_container_width=True, type="primary",
+                              on_click=insert_vote, args=({"action": "投票", "book_id": b_id, "points": 2}, "2点投票しました",
+                                                          ("cast_vote", st.session_state.USER, b_id, 2)))
                 with v3:
                     if current_p > 0:
-                        if st.button("投票を取り消す", key=f"del_{b_id}", use_container_width=True):
-                            supabase.table("votes").delete().eq("user_name", st.session_state.USER).eq("book_id", b_id).eq("action", "投票").execute()
-                            st.cache_data.clear()
-                            st.rerun()
+                        st.button("投票を取り消す", key=f"del_{b_id}", use_container_width=True,
+                                  on_click=delete_votes, args=({"user_name": st.session_state.USER, "book_id": b_id, "action": "投票"}, None,
+                                                               ("cancel_vote", st.session_state.USER, b_id)))
 
         # --- 3. 自分の投票リセット ---
         st.divider()
-        if st.button("自分の投票をすべてリセット", type="secondary", key="reset_all_my_votes", use_container_width=True):
-            supabase.table("votes").delete().eq("user_name", st.session_state.USER).eq("action", "投票").execute()
-            st.cache_data.clear()
-            st.rerun()
+        st.button("自分の投票をすべてリセット", type="secondary", key="reset_all_my_votes", use_container_width=True,
+                  on_click=delete_votes, args=({"user_name": st.session_state.USER, "action": "投票"}, None,
+                                               ("reset_my_votes", st.session_state.USER)))
             
 # --- Tab 3: History (これまでの読書会) ---
-with tab3:
-    try:
-        response = supabase.table("events").select("*, books(*)").execute()
-        all_events = pd.DataFrame(response.data)
-        
-        # 日付処理
-        all_events["event_date_dt"] = pd.to_datetime(all_events["event_date"]).dt.date
-        all_events["year"] = pd.to_datetime(all_events["event_date"]).dt.year.astype(str)
-        
-        today = datetime.now().date()
-        past_events = all_events[all_events["event_date_dt"] < today]
-    except Exception as e:
-        st.error(f"データの取得に失敗しました: {e}")
-        past_events = pd.DataFrame()
+def render_history():
+    past_events = events_view.past
 
     if not past_events.empty:
+        query = st.text_input(
+            "開催履歴を検索", key="history_query", placeholder="🔍 タイトル・著者・カテゴリで検索",
+            label_visibility="collapsed",
+        ).strip()
+
         # 1. 重複を除いた年リストを降順（2026, 2025...）で取得
         unique_years = sorted(past_events["year"].unique().tolist(), reverse=True)
         
@@ -465,52 +940,30 @@ with tab3:
         # 3. リストの先頭（＝一番新しい年）をデフォルトにする
         default_year = unique_years[0]
         
-        selected_year = st.pills("開催年で絞り込み", year_options, default=default_year)
+        # 検索中は全期間から探すので、年の絞り込みは出さない
+        selected_year = None if query else st.pills("開催年で絞り込み", year_options, default=default_year)
 
         # フィルタリング実行
-        if selected_year == "すべて":
+        if query:
+            # 関連度の高い順に並べる
+            rank = {event_id: i for i, event_id in enumerate(search_ids("history", df_events, history_documents, query))}
+            order = past_events["id"].astype(str).map(rank)
+            df_history_display = past_events[order.notna()].iloc[order.dropna().argsort()]
+            st.caption(f"🔍 「{query}」の検索結果: {len(df_history_display)} 件")
+        elif selected_year == "すべて":
             df_history_display = past_events.sort_values("event_date", ascending=False)
         else:
             df_history_display = past_events[past_events["year"] == selected_year].sort_values("event_date", ascending=False)
             
         # --- リスト表示部分 ---
-        for _, row in df_history_display.iterrows():
-            book = row.get("books", {})
-            if not book: continue
-
-            date_str = str(row["event_date"]).replace("-", "/")
-            title = book.get("title", "不明")
-            author = book.get("author", "不明")
-            category = book.get("category", "その他")
-            target_url = book.get("url", "")
-
-            # カテゴリ色
-            bg_color = "#F5F5F5"
-
-            # HTML組み立て（f-string内でダブルクォーテーションがぶつからないようシングルクォーテーションを使用）
-            if target_url:
-                title_html = f"<a href='{target_url}' target='_blank' style='text-decoration: none; color: #1E88E5; font-weight: 600; font-size: 1rem;'>{title}</a>"
-            else:
-                title_html = f"<span style='color: #333; font-weight: 600; font-size: 1rem;'>{title}</span>"
-
-            st.markdown(f"""
-            <div style='display: flex; align-items: flex-start; padding: 15px 0; border-bottom: 1px solid #eee; gap: 15px;'>
-                <div style='width: 100px; flex-shrink: 0;'>
-                    <div style='color: #888; font-size: 0.8rem; margin-bottom: 4px;'>{date_str}</div>
-                    <div style='color: #555; font-size: 0.85rem; line-height: 1.2; word-break: break-all;'>{author}</div>
-                </div>
-                <div style='flex-grow: 1;'>
-                    <div style='margin-bottom: 8px; line-height: 1.4;'>
-                        {title_html}
-                    </div>
-                    <div>
-                        <span style='background-color: {bg_color}; padding: 2px 10px; border-radius: 4px; font-size: 0.7rem; font-weight: bold; border: 1px solid #ddd; color: #444;'>
-                            {category}
-                        </span>
-                    </div>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+        # 1 件ずつ st.markdown せず、まとめて 1 つのブロックで送る
+        with span("html.history") as s:
+            history_html = s.measure("".join(
+                history_entry_html(event_date, book)
+                for event_date, book in zip(df_history_display["event_date"], df_history_display["books"])
+                if book
+            ))
+        st.markdown(history_html, unsafe_allow_html=True)
     else:
         st.info("過去の開催履歴はありません。")
                 
@@ -519,23 +972,13 @@ with tab3:
     st.subheader("📊 カテゴリランキング")
 
     if not past_events.empty:
-        # 1. 重複を排除した「本」のリストを作成
-        # event_dateなどは無視して、book_idが同じなら1件とみなす
-        unique_books_df = past_events.drop_duplicates(subset=['book_id'])
-
-        # 2. カテゴリを抽出してカウント
-        cat_list = [
-            str(row.get("books", {}).get("category")) 
-            for row in unique_books_df.to_dict('records') 
-            if row.get("books")
-        ]
-        # 無効な値を排除
-        cat_list = [c for c in cat_list if c not in ['None', '', 'nan']]
-
-        if cat_list:
-            df_counts = pd.Series(cat_list).value_counts().reset_index()
-            df_counts.columns = ["カテゴリ", "冊数"]
+        # サーバー側で集計済みならそれを使う
+        df_counts = page_data.values.get("category_counts")
+        if df_counts is None:
+            with span("transform.category_counts") as s:
+                df_counts = s.measure(category_counts(past_events))
 
+        if not df_counts.empty:
             # 2. Altairでグラフを作成
             import altair as alt
 
@@ -577,14 +1020,13 @@ with tab3:
 
 
 # --- Tab 4: Admin (管理者画面) ---
-with tab4:
+def render_admin():
     if "admin_form_counter" not in st.session_state:
         st.session_state.admin_form_counter = 0
         
     # --- 1. 新規選出セクション（ここがメイン！） ---
     st.subheader("🆕 次回の課題本を確定する")
-    nominated_ids = df_active_votes[df_active_votes["action"] == "選出"]["book_id"].unique().tolist()
-    nominated_books = df_books[df_books["id"].astype(str).isin([str(x) for x in nominated_ids])]
+    nominated_books = model.books_by_ids(model.nominated_ids)
 
     if not nominated_books.empty:
         st.info("🗳️ 現在メンバーが選出中の本が表示されています")
@@ -605,26 +1047,27 @@ with tab4:
             st.error("選択可能な本がありません。")
             target_book_id = None
         
-        if st.form_submit_button("次回予告を確定する", type="primary", use_container_width=True):
+        if st.form_submit_button("次回予告を確定する", type="primary", use_container_width=True, disabled=read_only()):
             if target_book_id:
                 new_event = {
                     "event_date": str(next_date),
                     "book_id": str(target_book_id)
                 }
-                supabase.table("events").insert(new_event).execute()
+                repo.add_event(new_event)
                 
                 st.session_state.admin_form_counter += 1
             
-                st.cache_data.clear()
+                invalidate_tables("events")
+                archive_decided_votes()
                 st.toast("次回予告を更新しました", icon="🚀")
                 st.rerun()
 
     st.divider()
 
     # --- 2. 継続登録セクション（前回の本をもう一度） ---
-    if not df_events.empty:
+    last_event = events_view.latest_event
+    if last_event is not None:
         # 最新のイベントを1件取得
-        last_event = df_events.sort_values("event_date", ascending=False).iloc[0]
         last_book = last_event.get("books", {})
         
         st.subheader("🔁 前回の本を継続する")
@@ -632,13 +1075,14 @@ with tab4:
             st.markdown(f"前回の課題本: **{last_book.get('title', '不明')}**")
             cont_date = st.date_input("継続開催の日付", key="cont_date")
             
-            if st.button("この本で次回の予告を作る（継続）", use_container_width=True):
+            if st.button("この本で次回の予告を作る（継続）", use_container_width=True, disabled=read_only()):
                 new_event = {
                     "event_date": str(cont_date),
                     "book_id": str(last_event["book_id"])
                 }
-                supabase.table("events").insert(new_event).execute()
-                st.cache_data.clear()
+                repo.add_event(new_event)
+                invalidate_tables("events")
+                archive_decided_votes()
                 st.toast("継続開催を登録しました", icon="🔁")
                 st.rerun()
 
@@ -647,24 +1091,71 @@ with tab4:
     st.subheader("🧹 データの管理")
     st.info("※ 「投票」のみを削除します。「選出」のデータは保持されます。")
     confirm_reset = st.checkbox("全ユーザーの投票リセットを実行します")
-    if st.button("投票を一括リセット", type="primary", use_container_width=True, disabled=not confirm_reset):
+    if st.button("投票を一括リセット", type="primary", use_container_width=True, disabled=not confirm_reset or read_only()):
         try:
-            supabase.table("votes").delete().eq("action", "投票").execute()
-            st.cache_data.clear()
+            discard_deleted("votes", repo.delete_votes({"action": "投票"}))
             st.toast("すべての投票をリセットしました", icon="🙋")
             st.rerun()
         except Exception as e:
             st.error(f"リセットエラー: {e}")
 
+    # --- 4. パフォーマンス ---
+    st.divider()
+    with st.expander("⏱️ パフォーマンス（処理時間の計測）"):
+        summary = tracer.summary(club=CLUB)
+        club_registry = get_club_registry()
+        if summary:
+            st.caption(
+                f"操作ごとの直近 {tracer.window} 回の処理時間（このクラブの全メンバー分） / "
+                f"ログ書き込み: 送信 {log_writer.sent} 行, 待ち {log_writer.pending} 行, "
+                f"再試行 {log_writer.retries} 回, 破棄 {log_writer.dropped + log_writer.failed} 行 / "
+                f"テーブルキャッシュ: hit {table_cache.hits}, 取得 {table_cache.fetches} 回, "
+                f"相乗り {table_cache.coalesced} 回, 更新の間引き {table_cache.debounced} 件"
+                f"（節約できた取得 {table_cache.saved} 回） / "
+                f"クラブ: メモリに {len(club_registry)}/{club_registry.maxsize} クラブ, "
+                f"hit {club_registry.hits}, miss {club_registry.misses}, 追い出し {club_registry.evictions}, "
+                f"不明なクラブ {club_registry.rejected} 回"
+            )
+            st.dataframe(pd.DataFrame(summary), hide_index=True, use_container_width=True)
+        else:
+            st.info("まだ計測結果がありません。")
+
+        # この画面を表示する直前の rerun の内訳
+        last_spans = tracer.rerun_spans(st.session_state.get("trace_rerun"))
+        if last_spans:
+            st.caption("前回の表示の内訳（load.* は読み込み、transform.* は pandas、render.* / html.* は描画）")
+            st.dataframe(
+                pd.DataFrame(last_spans)[["span", "parent", "duration_ms", "rows", "bytes", "error"]],
+                hide_index=True, use_container_width=True,
+            )
+        if st.button("計測結果をリセット", use_container_width=True):
+            tracer.reset(club=CLUB)
+            st.rerun()
+
     # Logout
     st.divider()
     if st.button("Logout", use_container_width=True):
         # 💡 セッションの中身をすべて消去する
         st.session_state.clear()
-        # 💡 クエリパラメータ（URLの後ろについている名前）も消す
+        # 💡 クエリパラメータ（URLの後ろについている名前）も消す（クラブの指定だけは残す）
         st.query_params.clear()
+        if CLUB != DEFAULT_CLUB:
+            st.query_params["club"] = CLUB
         # 💡 強制リロードして最初のログイン画面に戻す
         st.rerun()
         
+SECTION_RENDERERS = {
+    "📖 Books": render_books,
+    "🗳️ Votes": render_votes,
+    "📜 History": render_history,
+    "⚙️ Admin": render_admin,
+}
+renderer = SECTION_RENDERERS[section]
+with span(renderer.__name__.replace("render_", "render.")):
+    renderer()
+
+# 次の rerun の Admin タブで内訳を表示するため
+st.session_state.trace_rerun = RERUN_ID
+
 # 最後に空白
 st.markdown("<div style='margin-bottom: 150px;'></div>", unsafe_allow_html=True)
@@ -0,0 +1,4 @@
+"""合成データでの性能計測（ベンチマーク・負荷試験）。
+
+アプリ本体からは import しない。リポジトリのルートで python -m bench.<module> として実行する。
+"""
@@ -0,0 +1,183 @@
+"""読書会の合成データを作る。
+
+本・投票・開催履歴の規模を指定して、Supabase と同じ形の行を生成し、
+SQLiteRepository に一括で書き込む。乱数は seed で固定するので、同じ規模なら毎回同じデータになる。
+
+    data = generate(SCALES["large"])
+    repo = SQLiteRepository()
+    seed_repository(repo, data)
+"""
+import random
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+ICONS = ["🐱", "🐶", "🦊", "🐻", "🐼", "🐸", "🐧", "🦉", "🐙", "🦄"]
+CATEGORIES = ["小説", "ミステリー", "SF", "歴史", "哲学", "科学", "経済", "ビジネス", "エッセイ", "アート"]
+
+
+class Scale(NamedTuple):
+    users: int
+    books: int
+    votes: int
+    years: int
+    # 現在の回で選出されている本の数（上限は users）
+    nominations: int = 12
+
+
+SCALES = {
+    "small": Scale(users=12, books=300, votes=2_000, years=2),
+    "medium": Scale(users=25, books=1_500, votes=20_000, years=5),
+    "large": Scale(users=40, books=5_000, votes=100_000, years=10),
+}
+
+
+class Dataset(NamedTuple):
+    users: list
+    categories: list
+    books: list
+    votes: list
+    events: list
+
+    def counts(self):
+        return {name: len(rows) for name, rows in self._asdict().items()}
+
+
+def generate(scale, seed=0, today=None):
+    """scale の規模のデータを作る。
+
+    events は月 1 回、today から years 年さかのぼって開催し、最後の 1 件は来月の予定にする。
+    votes は過去の回の選出・投票が大半で、残りが現在の回（未開催の本）の選出・投票になる。
+    """
+    rnd = random.Random(seed)
+    today = today or date.today()
+    start = datetime.combine(today, datetime.min.time()) - timedelta(days=365 * scale.years)
+    clock = _Clock(start, datetime.combine(today, datetime.min.time()))
+
+    users = [
+        {"user_name": f"user{i:03d}", "icon": ICONS[i % len(ICONS)]}
+        for i in range(scale.users)
+    ]
+    names = [u["user_name"] for u in users]
+
+    books = []
+    for i in range(scale.books):
+        books.append({
+            "id": f"b{i:06d}",
+            "title": f"合成タイトル{i}　{rnd.choice(['上', '下', '新版', '完全版', ''])}",
+            "author": f"著者{rnd.randrange(scale.books // 3 + 1)}",
+            "category": rnd.choice(CATEGORIES),
+            "url": f"https://example.com/books/{i}" if rnd.random() < 0.7 else None,
+            "created_by": rnd.choice(names),
+            "created_at": clock.at(i / max(scale.books, 1)),
+            "deleted_at": None,
+        })
+
+    # 月 1 回の開催（同じ本を続けて読む回もある）
+    months = scale.years * 12
+    events = []
+    book_ids = [b["id"] for b in books]
+    read_ids = rnd.sample(book_ids, min(months + 1, len(book_ids)))
+    for m in range(months + 1):
+        event_date = _add_months(date(start.year, start.month, 1), m + 1)
+        if m and rnd.random() < 0.1:
+            book_id = events[-1]["book_id"]
+        else:
+            book_id = read_ids[m % len(read_ids)]
+        events.append({
+            "id": f"e{m:05d}",
+            "event_date": event_date.isoformat(),
+            "event_time": "19:00",
+            "book_id": book_id,
+            "created_at": clock.at(m / (months + 1)),
+        })
+
+    used = {e["book_id"] for e in events}
+    unread = [b for b in book_ids if b not in used]
+    nominees = rnd.sample(unread, min(scale.nominations, len(unread), len(names)))
+
+    votes = []
+
+    def vote(action, book_id, user_name, points, when):
+        votes.append({
+            "id": f"v{len(votes):07d}",
+            "created_at": clock.at(when),
+            "action": action,
+            "book_id": book_id,
+            "user_name": user_name,
+            "points": points,
+            "comment": None,
+        })
+
+    # 現在の回：先頭の nominations 人の選出と、その人たちの 1 点・2 点
+    # （残りのユーザーは今回まだ何もしていない）
+    for user_name, book_id in zip(names, nominees):
+        vote("選出", book_id, user_name, None, 0.999)
+    for user_name in names[:len(nominees)]:
+        for points, book_id in zip((1, 2), rnd.sample(nominees, min(2, len(nominees)))):
+            vote("投票", book_id, user_name, points, 0.9995)
+
+    # 残りは過去の回（開催済みの本）への選出・投票
+    past_ids = sorted(used)
+    while len(votes) < scale.votes:
+        action = "選出" if rnd.random() < 0.15 else "投票"
+        vote(
+            action, rnd.choice(past_ids), rnd.choice(names),
+            None if action == "選出" else rnd.choice((1, 2)), rnd.random() * 0.99,
+        )
+
+    return Dataset(users=users, categories=list(CATEGORIES), books=books, votes=votes, events=events)
+
+
+def seed_repository(repo, data):
+    """SQLiteRepository に data を一括で書き込む（既存の行はそのまま）。
+
+    行は repo.club_id のクラブのものにする。id はクラブの中でだけ一意なので、
+    同じ data を別のクラブにもそのまま入れられる。
+    """
+    club_id = repo.club_id
+    data = _for_club(data, club_id)
+    conn = repo.conn
+    conn.execute("BEGIN")
+    try:
+        conn.executemany(
+            "INSERT INTO users (club_id, user_name, icon) VALUES (:club_id, :user_name, :icon)", data.users
+        )
+        conn.executemany(
+            "INSERT INTO categories (club_id, name) VALUES (?, ?)", [(club_id, c) for c in data.categories]
+        )
+        for table in ("books", "votes", "events"):
+            rows = getattr(data, table)
+            if not rows:
+                continue
+            cols = list(rows[0])
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join(':' + c for c in cols)})",
+                rows,
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return repo
+
+
+def _for_club(data, club_id):
+    return data._replace(**{
+        table: [{**r, "club_id": club_id} for r in getattr(data, table)]
+        for table in ("users", "books", "votes", "events")
+    })
+
+
+class _Clock:
+    # start から end までの created_at を 0〜1 の位置で作る
+    def __init__(self, start, end):
+        self._start = start
+        self._span = end - start
+
+    def at(self, fraction):
+        return (self._start + self._span * fraction).isoformat(timespec="microseconds")
+
+
+def _add_months(d, months):
+    y, m = divmod(d.month - 1 + months, 12)
+    return date(d.year + y, m + 1, 1)
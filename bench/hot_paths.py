@@ -0,0 +1,234 @@
+"""app.py のデータ処理の各段階を合成データで計測し、結果を JSON で出力する。
+
+    python -m bench.hot_paths --scale large --repeat 7 --out bench-large.json
+    python -m bench.hot_paths --scale large --baseline bench-large.json
+    python -m bench.hot_paths --scale large --archive   # 確定済みラウンドの投票をアーカイブしてから計測
+
+計測するのは 1 回の rerun で実行される処理（Streamlit の描画そのものは含まない）:
+    fetch            SQLite から users / books / votes / events を読んで DataFrame にする（型の正規化を含む）
+    merge_votes      votes に本のタイトル・著者名を結合する
+    events_view      events の日付パースと used_book_ids の作成
+    filter_used      df_display_books / df_active_votes（確定済みの本を除外）
+    model            ClubModel の作成と索引（選出中の本・ユーザーごとの選出・アイコン・URL）
+    ranking_client   pandas でのランキング集計（compute_ranking）
+    ranking_server   SQL でのランキング集計（AGGREGATION = "server" 相当）
+    book_cards       Books タブのカード HTML の生成（全ページ分）
+    history          History タブの一覧 HTML の生成
+    category_client  カテゴリグラフ用の集計（pandas）
+    category_server  カテゴリグラフ用の集計（SQL）
+    archived_votes   過去のラウンドの投票の取得（--archive のときだけ）
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+from bench.datagen import SCALES, Scale, generate, seed_repository
+from bookclub.aggregates import category_frame, ranking_from_rows
+from bookclub.events import EventsView, category_counts
+from bookclub.frames import drop_used_books, drop_used_votes, merge_votes
+from bookclub.model import ClubModel, normalize_books, normalize_votes
+from bookclub.projections import query_for
+from bookclub.ranking import compute_ranking
+from bookclub.render import book_card_html, history_entry_html
+from bookclub.repository import SQLiteRepository
+
+SCHEMA_VERSION = 2
+
+
+def timed(fn, repeat, warmup=1):
+    """fn を repeat 回実行した時間（ミリ秒）の統計と、最後の戻り値を返す。"""
+    result = None
+    for _ in range(warmup):
+        result = fn()
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    stats = {
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "max_ms": round(samples[-1], 3),
+        "repeat": repeat,
+    }
+    return stats, result
+
+
+def run(scale, repeat=5, seed=0, today=None, archive=False):
+    """合成データを作って各処理を計測し、JSON にできる dict を返す。
+
+    archive=True なら、計測の前に確定済みの本への投票を votes_archive に移す（Admin の確定後と同じ状態）。
+    """
+    today = today or date.today()
+    data = generate(scale, seed=seed, today=today)
+    repo = seed_repository(SQLiteRepository(), data)
+    archived = len(repo.archive_decided_votes()) if archive else 0
+    user_name = data.users[0]["user_name"]
+    results = {}
+
+    def measure(name, fn):
+        results[name], value = timed(fn, repeat)
+        return value
+
+    def fetch():
+        return {
+            "users": pd.DataFrame(repo.users()),
+            "books": normalize_books(pd.DataFrame(repo.books(**query_for("books")))),
+            "votes": normalize_votes(pd.DataFrame(repo.votes(**query_for("votes")))),
+            "events": pd.DataFrame(repo.events(**query_for("events"))),
+        }
+
+    frames = measure("fetch", fetch)
+    df_users, df_books, df_votes = frames["users"], frames["books"], frames["votes"]
+
+    measure("merge_votes", lambda: merge_votes(df_books, df_votes))
+    view = measure("events_view", lambda: EventsView(frames["events"], today=today))
+    used_book_ids = view.used_book_ids
+
+    def filter_used():
+        return (
+            drop_used_books(df_books, used_book_ids),
+            drop_used_votes(merge_votes(df_books, df_votes), used_book_ids),
+        )
+
+    measure("filter_used", filter_used)
+
+    def build_model():
+        model = ClubModel(df_books, df_votes, df_users, used_book_ids)
+        model.nominated_ids, model.nomination_by_user, model.icon_by_user, model.url_by_book
+        return model
+
+    model = measure("model", build_model)
+    df_display_books, df_active_votes = model.display_books, model.active_votes
+
+    ranking = measure(
+        "ranking_client",
+        lambda: compute_ranking(
+            df_active_votes, df_users, df_books, user_name,
+            icon_by_user=model.icon_by_user, url_by_book=model.url_by_book,
+        ),
+    )
+    measure(
+        "ranking_server",
+        lambda: ranking_from_rows(repo.aggregates.ranking_rows(), df_users, user_name),
+    )
+
+    def book_cards():
+        # render_book_cards と同じ順序（カテゴリごと → 行ごと）で HTML を作る
+        html = []
+        for _, category_books in df_display_books.groupby("category", sort=False, observed=True):
+            for _, row in category_books.iterrows():
+                html.append(book_card_html(row["title"], row["author"], row["url"]))
+        return html
+
+    cards = measure("book_cards", book_cards)
+
+    def history():
+        past = view.past.sort_values("event_date", ascending=False)
+        return [
+            history_entry_html(event_date, book)
+            for event_date, book in zip(past["event_date"], past["books"])
+            if book
+        ]
+
+    entries = measure("history", history)
+    measure("category_client", lambda: category_counts(view.past))
+    measure("category_server", lambda: category_frame(repo.aggregates.category_counts()))
+    if archive:
+        measure("archived_votes", lambda: pd.DataFrame(repo.archived_votes()))
+
+    return {
+        "schema": SCHEMA_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_rev": _git_rev(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "scale": scale._asdict(),
+        "seed": seed,
+        "archive": archive,
+        "rows": {
+            **data.counts(),
+            "archived_votes": archived,
+            "display_books": len(df_display_books),
+            "active_votes": len(df_active_votes),
+            "ranking": len(ranking.table),
+            "book_cards": len(cards),
+            "history": len(entries),
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    """各処理の median を baseline と比べた倍率（> 1 なら遅くなった）。"""
+    ratios = {}
+    for name, stats in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base and base["median_ms"] > 0:
+            ratios[name] = round(stats["median_ms"] / base["median_ms"], 3)
+    return ratios
+
+
+def _git_rev():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium")
+    parser.add_argument("--users", type=int, help="scale の値を上書き")
+    parser.add_argument("--books", type=int, help="scale の値を上書き")
+    parser.add_argument("--votes", type=int, help="scale の値を上書き")
+    parser.add_argument("--years", type=int, help="scale の値を上書き")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--archive", action="store_true", help="確定済みラウンドの投票をアーカイブしてから計測する")
+    parser.add_argument("--out", help="結果の JSON の書き出し先（省略時は標準出力）")
+    parser.add_argument("--baseline", help="比較する過去の結果の JSON")
+    parser.add_argument(
+        "--max-ratio", type=float, default=None,
+        help="baseline より median がこの倍率を超えて遅くなった処理があれば終了コード 1",
+    )
+    args = parser.parse_args(argv)
+
+    overrides = {k: getattr(args, k) for k in Scale._fields if getattr(args, k, None) is not None}
+    scale = SCALES[args.scale]._replace(**overrides)
+    report = run(scale, repeat=args.repeat, seed=args.seed, archive=args.archive)
+
+    regressed = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["vs_baseline"] = compare(report, json.load(f))
+        if args.max_ratio is not None:
+            regressed = [k for k, r in report["vs_baseline"].items() if r > args.max_ratio]
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if regressed:
+        print(f"regressed: {', '.join(regressed)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
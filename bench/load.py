@@ -0,0 +1,329 @@
+"""複数メンバーの同時操作を AppTest でヘッドレスに再現する負荷試験。
+
+    python -m bench.load --members 20 --rounds 3 --scale small --out load.json
+    python -m bench.load --members 20 --secret WRITE_MODE=rpc --secret AGGREGATION=server
+
+合成データを入れたローカル SQLite（DATA_BACKEND = "sqlite"）に対して、
+STRICT_PROJECTIONS を有効にした状態で（宣言にない列を読むとエラーとして数える）、
+N 人分の AppTest セッションを 1 つのプロセスの中で 1 操作ずつ順番に（ラウンドロビンで）進める。
+本番の 1 台のサーバーと同じく、st.cache_resource（テーブルのキャッシュ・スナップショット・
+モデルなど）は全メンバーで共有され、N 人分のセッションの状態が同時にメモリに載る。
+AppTest はスレッドセーフではないので rerun そのものは 1 つずつ実行するが、
+書き込みプール・裏での取り直しのスレッドは、その間も他のメンバーの操作と並行して動く。
+
+各メンバーの操作: ログイン → Books で選出 → Votes で投票 → 投票の取り消し
+→ Books で選出の取り消し → 🔄 更新
+
+出力:
+    interactions   操作ごとのレイテンシ（ミリ秒）のパーセンタイル
+    queries        SQLite に発行された SQL の数
+                   probe は 1 人だけで順番に操作したときの、操作（rerun）ごとの数
+                   （選出・投票の書き込みはバックグラウンドなので、次の rerun に数えられることがある）
+                   load は N 人で操作したときの合計と rerun あたりの平均
+    memory         このプロセスの RSS（開始時・probe 後・終了時・ピーク）と、
+                   probe 後からピークまでの増分をメンバー数で割った 1 人あたりの目安
+    rejected       同時操作の競合でサーバー側のルール検証（WRITE_MODE = "rpc"）が断った書き込み
+                   （別のメンバーが先に同じ本を選出した、など。エラーには数えない）
+    errors         画面のエラー・例外と、メンバーの操作中に投げられた例外（1 件でもあれば終了コード 1）
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+
+from streamlit.testing.v1 import AppTest
+
+import bookclub.repository
+from bench.datagen import SCALES, generate, seed_repository
+from bookclub.repository import SQLiteRepository
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+BOOKS, VOTES = "📖 Books", "🗳️ Votes"
+
+# 他のメンバーの操作と競合したときにだけ出る、ルール検証（bookclub/votes_api.py）のメッセージ
+RACE_REJECTIONS = ("他の人が選んでるよ", "この本は選出されていません")
+
+
+class QueryCounter:
+    """SQLite の trace callback で、実行された SQL を種類（先頭のキーワード）ごとに数える。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+
+    def record(self, sql):
+        kind = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else "?"
+        with self._lock:
+            self.counts[kind] += 1
+
+    def total(self):
+        with self._lock:
+            return sum(self.counts.values())
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+def install_counter(counter):
+    # app.py の get_repository() が作る SQLiteRepository の接続に trace callback を付ける
+    original = bookclub.repository.connect
+
+    def traced_connect(path):
+        conn = original(path)
+        conn.set_trace_callback(counter.record)
+        return conn
+
+    bookclub.repository.connect = traced_connect
+
+
+class Member:
+    """1 人のメンバー（1 つのブラウザセッション）。"""
+
+    def __init__(self, user_name, secrets, timeout, rnd):
+        self.user_name = user_name
+        self.rnd = rnd
+        self.at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+        for key, value in secrets.items():
+            self.at.secrets[key] = value
+        self.timings = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = []
+        self.rejected = []
+        self.reruns = 0
+
+    # --- 操作 ---
+    def login(self):
+        self._step("open", lambda: self.at)
+        self._step("login", lambda: self._button(key=f"l_{self.user_name}").click())
+
+    def nominate(self):
+        self._goto(BOOKS)
+        choices = [b for b in self.at.button if b.key and b.key.startswith("sel_") and not b.disabled]
+        if choices:
+            self._step("nominate", lambda: self.rnd.choice(choices).click())
+
+    def vote(self):
+        self._goto(VOTES)
+        choices = [b for b in self.at.button if b.key and b.key[:3] in ("v1_", "v2_") and not b.disabled]
+        if choices:
+            self._step("vote", lambda: self.rnd.choice(choices).click())
+
+    def cancel_vote(self):
+        self._goto(VOTES)
+        choices = [b for b in self.at.button if b.key and b.key.startswith("del_")]
+        if choices:
+            self._step("cancel_vote", lambda: self.rnd.choice(choices).click())
+
+    def cancel_nomination(self):
+        self._goto(BOOKS)
+        button = self._button(label="選出をキャンセルして選び直す")
+        if button is not None:
+            self._step("cancel_nomination", button.click)
+
+    def refresh(self):
+        self._step("refresh", self._button(label="🔄 更新").click)
+
+    def session(self, rounds):
+        """操作を 1 つ実行するたびに yield するジェネレーター（interleave() で他のメンバーと交互に進める）。"""
+        # 途中で例外が出たらそのメンバーの操作はそこまでにして、例外をエラーとして残す
+        try:
+            self.login()
+            yield
+            for _ in range(rounds):
+                for operation in (self.nominate, self.vote, self.cancel_vote, self.cancel_nomination, self.refresh):
+                    operation()
+                    yield
+        except Exception as e:
+            self.errors.append(f"{self.user_name}: {type(e).__name__}: {e}")
+            traceback.print_exc()
+
+    # --- 内部 ---
+    def _goto(self, section):
+        control = self.at.segmented_control(key="section")
+        if control.value != section:
+            self._step("switch_section", lambda: control.set_value(section))
+
+    def _button(self, key=None, label=None):
+        for b in self.at.button:
+            if (key is not None and b.key == key) or (label is not None and b.label == label):
+                return b
+        return None
+
+    def _step(self, name, action):
+        before = COUNTER.total()
+        t0 = time.perf_counter()
+        action().run()
+        self.timings[name].append((time.perf_counter() - t0) * 1000)
+        self.queries[name].append(COUNTER.total() - before)
+        self.reruns += 1
+        if self.at.exception:
+            self.errors.append(f"{name}: {self.at.exception[0].message}")
+        for e in self.at.error:
+            rejected = any(message in e.value for message in RACE_REJECTIONS)
+            (self.rejected if rejected else self.errors).append(f"{name}: {e.value}")
+
+
+COUNTER = QueryCounter()
+
+
+def interleave(sessions):
+    """セッション（Member.session() のジェネレーター）を 1 操作ずつ順番に、全員が終わるまで進める。"""
+    queue = deque(sessions)
+    while queue:
+        session = queue.popleft()
+        try:
+            next(session)
+        except StopIteration:
+            continue
+        queue.append(session)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))], 3)
+
+    return {
+        "count": len(samples),
+        "p50_ms": round(statistics.median(samples), 3),
+        "p90_ms": pct(0.90),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+def rss_mb():
+    # 現在の RSS（Linux の /proc がなければ None）
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KiB、macOS は byte
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def run(members, rounds, scale, secrets=None, timeout=120, seed=0):
+    """合成データの SQLite を作り、probe（1 人）→ load（members 人同時）の順に実行する。"""
+    rss_start = rss_mb()
+    install_counter(COUNTER)
+
+    # 現在の回で選出済みのユーザーとは別に、シミュレーションするメンバーを用意する
+    scale = scale._replace(users=max(scale.users, scale.nominations + members + 1))
+    data = generate(scale, seed=seed)
+    fd, path = tempfile.mkstemp(prefix="bookclub-load-", suffix=".sqlite3")
+    os.close(fd)
+    seed_repository(SQLiteRepository(path), data)
+
+    # ディスクのスナップショット（SNAPSHOT_DIR）は前回の合成データが混ざらないよう使わない
+    secrets = {
+        "DATA_BACKEND": "sqlite", "SQLITE_PATH": path, "STRICT_PROJECTIONS": True, "SNAPSHOT_DIR": "",
+        **(secrets or {}),
+    }
+    names = [u["user_name"] for u in data.users[scale.nominations:]]
+
+    try:
+        # 1 人だけで順番に操作して、rerun ごとのクエリ数を正確に数える（共有のキャッシュもここで温まる）
+        probe = Member(names[0], secrets, timeout, random.Random(seed))
+        interleave([probe.session(1)])
+        rss_probe = rss_mb()
+
+        # N 人の操作を交互に進める（キャッシュはこのプロセスの全メンバーで共有）
+        crowd = [
+            Member(n, secrets, timeout, random.Random(seed + i))
+            for i, n in enumerate(names[1:members + 1], 1)
+        ]
+        queries_before = Counter(COUNTER.snapshot())
+        started = time.perf_counter()
+        interleave([m.session(rounds) for m in crowd])
+        wall = time.perf_counter() - started
+    finally:
+        os.remove(path)
+
+    timings = defaultdict(list)
+    for m in crowd:
+        for name, samples in m.timings.items():
+            timings[name].extend(samples)
+    load_queries = Counter(COUNTER.snapshot())
+    load_queries.subtract(queries_before)
+    load_queries = +load_queries
+    reruns = sum(m.reruns for m in crowd)
+    load_total = sum(load_queries.values())
+    peak = peak_rss_mb()
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "members": members,
+        "rounds": rounds,
+        "scale": scale._asdict(),
+        "secrets": {k: v for k, v in secrets.items() if k != "SQLITE_PATH"},
+        "wall_s": round(wall, 3),
+        "reruns": reruns,
+        "interactions": {name: percentiles(s) for name, s in sorted(timings.items())},
+        "all_interactions": percentiles([x for s in timings.values() for x in s]),
+        "queries": {
+            "probe": {name: statistics.median(q) for name, q in sorted(probe.queries.items())},
+            "load": {
+                "by_kind": dict(load_queries),
+                "total": load_total,
+                "per_rerun": round(load_total / reruns, 2) if reruns else None,
+            },
+        },
+        "memory": {
+            "rss_start_mb": rss_start, "rss_after_probe_mb": rss_probe, "rss_end_mb": rss_mb(),
+            "peak_rss_mb": peak,
+            "per_member_mb": round((peak - rss_probe) / members, 2) if rss_probe and members else None,
+        },
+        "rejected": [r for m in crowd for r in m.rejected],
+        "errors": probe.errors + [e for m in crowd for e in m.errors],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--members", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=2, help="1 人あたりの操作の繰り返し回数")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="1 回の rerun の上限（秒）")
+    parser.add_argument(
+        "--secret", action="append", default=[], metavar="KEY=VALUE",
+        help="st.secrets に渡す設定（WRITE_MODE=rpc など）",
+    )
+    parser.add_argument("--out", help="結果の JSON の書き出し先（省略時は標準出力）")
+    args = parser.parse_args(argv)
+
+    secrets = dict(s.split("=", 1) for s in args.secret)
+    report = run(args.members, args.rounds, SCALES[args.scale], secrets, args.timeout, args.seed)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+"""プロセス起動からログイン画面の最初の描画までの時間とメモリを計測する。
+
+    python -m bench.startup --repeat 5 --out startup.json
+    python -m bench.startup --max-render-ms 1500 --forbid altair --forbid pyarrow
+
+コンテナの再起動やスケールアウトのたびに払うコストを、毎回新しいプロセスで測る:
+    process_ms        プロセス起動から計測の終了まで（インタープリタの起動を含む）
+    framework_ms      Streamlit（AppTest）の import
+    first_render_ms   app.py の 1 回目の実行（app.py の import + ログイン画面の描画）
+    login_ms          ログインボタンを押した後の rerun（ログイン後に初めて使うモジュールの import を含む）
+    rss_mb / peak_rss_mb  ログイン画面を描画した時点の RSS とピーク
+    heavy_modules     ログイン画面 / ログイン後の時点で読み込まれていた重いモジュール
+    imports           app.py の実行中に import されたモジュールのうち時間のかかったもの（-X importtime）
+
+データは合成データを入れたローカル SQLite（DATA_BACKEND = "sqlite"）。
+--secret で Supabase など別の設定を渡せる。
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# 起動時に読み込まれると重いモジュール（ログイン画面では読み込まないのが目標のものを含む）
+HEAVY_MODULES = ("pandas", "numpy", "pyarrow", "httpx", "supabase", "altair")
+
+
+def _rss_mb():
+    # /proc/self/status の VmRSS（現在）と VmHWM（ピーク）。Linux 以外では None
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None, None
+    to_mb = lambda key: round(int(fields[key].split()[0]) / 1024, 1) if key in fields else None
+    return to_mb("VmRSS"), to_mb("VmHWM")
+
+
+def _child(secrets, timeout):
+    """計測される側（新しいプロセスの中で実行する）。結果を JSON 1 行で標準出力に書く。"""
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    t1 = time.perf_counter()
+
+    before = set(sys.modules)
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    for key, value in secrets.items():
+        at.secrets[key] = value
+    at.run()
+    t2 = time.perf_counter()
+    rss, peak = _rss_mb()
+    app_modules = sorted(set(sys.modules) - before)
+    heavy_login_page = [m for m in HEAVY_MODULES if m in sys.modules]
+
+    errors = [str(e.value) for e in at.exception]
+    buttons = [b for b in at.button if b.key and b.key.startswith("l_")]
+    login_ms = None
+    if buttons and not errors:
+        t3 = time.perf_counter()
+        buttons[0].click().run()
+        login_ms = round((time.perf_counter() - t3) * 1000, 1)
+        errors = [str(e.value) for e in at.exception]
+
+    print(json.dumps({
+        "framework_ms": round((t1 - t0) * 1000, 1),
+        "first_render_ms": round((t2 - t1) * 1000, 1),
+        "login_ms": login_ms,
+        "rss_mb": rss,
+        "peak_rss_mb": peak,
+        "login_buttons": len(buttons),
+        "heavy_modules": {
+            "login_page": heavy_login_page,
+            "after_login": [m for m in HEAVY_MODULES if m in sys.modules],
+        },
+        "app_modules": app_modules,
+        "errors": errors,
+    }, ensure_ascii=False))
+
+
+def parse_importtime(stderr, names):
+    """-X importtime の出力から、names に含まれるモジュールの (累積 import 時間（ミリ秒）, 入れ子の深さ) を取り出す。
+
+    同じモジュールは最初に出てきた行（＝実際に import した行）だけを使う。
+    深さ 0 は app.py（や Streamlit）から直接 import されたもの。
+    """
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        _, cumulative, raw = line.split("|")
+        name = raw.strip()
+        if name in names and name not in out:
+            try:
+                ms = round(int(cumulative) / 1000, 1)
+            except ValueError:
+                continue
+            out[name] = (ms, (len(raw) - len(raw.lstrip()) - 1) // 2)
+    return out
+
+
+def measure_once(secrets, timeout):
+    """新しいプロセスで 1 回計測する。"""
+    cmd = [sys.executable, "-X", "importtime", "-m", "bench.startup", "--child", json.dumps(secrets)]
+    cwd = os.path.dirname(APP_PATH)
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=cwd, timeout=timeout * 3)
+    process_ms = round((time.perf_counter() - t0) * 1000, 1)
+    lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if proc.returncode != 0 or not lines:
+        tail = proc.stderr.strip().splitlines()[-5:]
+        return {"process_ms": process_ms, "errors": [f"exit {proc.returncode}"] + tail}
+    result = json.loads(lines[-1])
+    app_modules = set(result.pop("app_modules"))
+    times = parse_importtime(proc.stderr, app_modules | set(HEAVY_MODULES))
+    result["process_ms"] = process_ms
+    result["import_ms"] = {m: times[m][0] for m in HEAVY_MODULES if m in times}
+    # app.py の実行中に直接 import したものを時間の長い順に
+    top = sorted(((ms, m) for m, (ms, depth) in times.items() if m in app_modules and depth == 0), reverse=True)
+    result["imports"] = {m: ms for ms, m in top[:15]}
+    return result
+
+
+def summarize(samples, key):
+    values = [s[key] for s in samples if s.get(key) is not None]
+    if not values:
+        return None
+    return {"median": round(statistics.median(values), 1), "min": min(values), "max": max(values)}
+
+
+def run(repeat=3, scale="small", secrets=None, timeout=120, seed=0):
+    from bench.datagen import SCALES, generate, seed_repository
+    from bookclub.repository import SQLiteRepository
+
+    fd, path = tempfile.mkstemp(prefix="bookclub-startup-", suffix=".sqlite3")
+    os.close(fd)
+    seed_repository(SQLiteRepository(path), generate(SCALES[scale], seed=seed))
+    # ディスクのスナップショットは使わない（--secret SNAPSHOT_DIR=... で起動直後の読み戻しも測れる）
+    secrets = {"DATA_BACKEND": "sqlite", "SQLITE_PATH": path, "SNAPSHOT_DIR": "", **(secrets or {})}
+    try:
+        samples = [measure_once(secrets, timeout) for _ in range(repeat)]
+    finally:
+        os.remove(path)
+
+    last = samples[-1]
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "repeat": repeat,
+        "scale": scale,
+        "secrets": {k: v for k, v in secrets.items() if k != "SQLITE_PATH"},
+        **{key: summarize(samples, key) for key in (
+            "process_ms", "framework_ms", "first_render_ms", "login_ms", "rss_mb", "peak_rss_mb",
+        )},
+        "heavy_modules": last.get("heavy_modules"),
+        "import_ms": last.get("import_ms"),
+        "imports": last.get("imports"),
+        "errors": [e for s in samples for e in s.get("errors", [])],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="計測するプロセスの数")
+    parser.add_argument("--scale", default="small", help="bench.datagen の SCALES のキー")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120, help="1 回の rerun の上限（秒）")
+    parser.add_argument(
+        "--secret", action="append", default=[], metavar="KEY=VALUE",
+        help="st.secrets に渡す設定（SNAPSHOT_DIR=.snapshot など）",
+    )
+    parser.add_argument("--out", help="結果の JSON の書き出し先（省略時は標準出力）")
+    parser.add_argument(
+        "--max-render-ms", type=float, default=None,
+        help="first_render_ms の中央値がこれを超えたら終了コード 1",
+    )
+    parser.add_argument(
+        "--forbid", action="append", default=[], metavar="MODULE",
+        help="ログイン画面の時点で読み込まれていたら終了コード 1 にするモジュール",
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child is not None:
+        _child(json.loads(args.child), args.timeout)
+        return 0
+
+    secrets = dict(s.split("=", 1) for s in args.secret)
+    report = run(args.repeat, args.scale, secrets, args.timeout, args.seed)
+
+    failures = list(report["errors"])
+    render = report["first_render_ms"]
+    if args.max_render_ms is not None and render and render["median"] > args.max_render_ms:
+        failures.append(f"first_render_ms {render['median']} > {args.max_render_ms}")
+    loaded = (report["heavy_modules"] or {}).get("login_page", [])
+    failures += [f"{m} is imported before the login page renders" for m in args.forbid if m in loaded]
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if failures:
+        print("\n".join(failures), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Book Club アプリ (app.py) から使う共通モジュール。"""
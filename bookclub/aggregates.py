@@ -0,0 +1,145 @@
+"""サーバー側で集計したランキング・カテゴリ件数を取得する。
+
+Supabase ではビュー（supabase/migrations/20261017_add_ranking_aggregates.sql）を、
+オフライン検証ではローカル SQLite に同じ集計を行う SQL を使う。
+どちらも返す行の形は同じなので、ranking_from_rows() で Ranking に変換できる。
+集計は 1 つのクラブ（club_id）の行だけで行う（id はクラブの中でだけ一意なので、結合にも club_id を使う）。
+"""
+import json
+from datetime import date
+
+import pandas as pd
+
+from bookclub.ranking import DEFAULT_ICON, RANKING_COLUMNS, Ranking
+
+RANKING_VIEW = "active_round_ranking"
+CATEGORY_VIEW = "past_category_counts"
+
+SQLITE_RANKING_SQL = """
+WITH active AS (
+    SELECT v.* FROM votes v
+    WHERE v.club_id = :club_id
+      AND NOT EXISTS (SELECT 1 FROM events e WHERE e.club_id = v.club_id AND e.book_id = v.book_id)
+),
+ordered AS (
+    SELECT * FROM active WHERE action = '投票' ORDER BY created_at, id
+),
+tallies AS (
+    SELECT
+        book_id,
+        SUM(COALESCE(points, 0)) AS points,
+        json_group_array(json_object('user_name', user_name, 'points', points)) AS voters
+    FROM ordered
+    GROUP BY book_id
+)
+SELECT
+    n.id AS nomination_id,
+    n.created_at AS nominated_at,
+    n.book_id,
+    n.user_name AS nominator,
+    b.title,
+    b.author,
+    b.url,
+    COALESCE(t.points, 0) AS points,
+    COALESCE(t.voters, '[]') AS voters
+FROM active n
+LEFT JOIN books b ON b.club_id = n.club_id AND b.id = n.book_id
+LEFT JOIN tallies t ON t.book_id = n.book_id
+WHERE n.action = '選出'
+ORDER BY n.created_at, n.id
+"""
+
+SQLITE_CATEGORY_SQL = """
+SELECT b.category, COUNT(DISTINCT e.book_id) AS book_count
+FROM events e
+JOIN books b ON b.club_id = e.club_id AND b.id = e.book_id
+WHERE e.club_id = :club_id
+  AND e.event_date < :today
+  AND b.category IS NOT NULL
+  AND b.category <> ''
+GROUP BY b.category
+"""
+
+
+class SupabaseAggregates:
+    """Supabase のビューから集計結果を取得する。"""
+
+    def __init__(self, get_client, club_id):
+        self._get_client = get_client
+        self._club_id = club_id
+
+    def ranking_rows(self):
+        res = self._view(RANKING_VIEW).order("nominated_at").execute()
+        return res.data
+
+    def category_counts(self):
+        res = self._view(CATEGORY_VIEW).execute()
+        return category_frame(res.data)
+
+    def _view(self, name):
+        return self._get_client().table(name).select("*").eq("club_id", self._club_id)
+
+
+class SQLiteAggregates:
+    """ローカル SQLite（bookclub.sqlite_schema）で同じ集計を行う代用品。"""
+
+    def __init__(self, conn, club_id):
+        self._conn = conn
+        self._club_id = club_id
+
+    def ranking_rows(self):
+        rows = self._conn.execute(SQLITE_RANKING_SQL, {"club_id": self._club_id}).fetchall()
+        return [{**dict(r), "voters": json.loads(r["voters"])} for r in rows]
+
+    def category_counts(self, today=None):
+        today = (today or date.today()).isoformat()
+        rows = self._conn.execute(SQLITE_CATEGORY_SQL, {"club_id": self._club_id, "today": today}).fetchall()
+        return category_frame([dict(r) for r in rows])
+
+
+def category_frame(rows):
+    """History タブのグラフ用に「カテゴリ」「冊数」の DataFrame にする。"""
+    df = pd.DataFrame(rows, columns=["category", "book_count"])
+    df = df.sort_values("book_count", ascending=False, kind="stable").reset_index(drop=True)
+    return df.rename(columns={"category": "カテゴリ", "book_count": "冊数"})
+
+
+def ranking_from_rows(rows, users, current_user, icon_by_user=None):
+    """集計ビューの行を compute_ranking() と同じ形の Ranking にする。"""
+    if icon_by_user is None:
+        icon_by_user = dict(zip(users["user_name"], users["icon"])) if not users.empty else {}
+    records = []
+    my_used_points = set()
+    seen_books = set()
+    for r in rows:
+        # 同じ本への 2 件目以降の選出は表示しない（compute_ranking() と同じく先の選出だけを残す）
+        if str(r["book_id"]) in seen_books:
+            continue
+        seen_books.add(str(r["book_id"]))
+        voters = r.get("voters") or []
+        if isinstance(voters, str):
+            voters = json.loads(voters)
+        chips = []
+        my_points = 0
+        for v in voters:
+            p = int(v.get("points") or 0)
+            chips.append(f"{icon_by_user.get(v['user_name'], DEFAULT_ICON)} {p}")
+            if v["user_name"] == current_user:
+                my_points += p
+                my_used_points.add(p)
+        records.append({
+            "book_id": str(r["book_id"]),
+            "title": r.get("title"),
+            "author": r.get("author"),
+            "url": r.get("url"),
+            "nominator": r["nominator"],
+            "nominator_icon": icon_by_user.get(r["nominator"], DEFAULT_ICON),
+            "points": int(r.get("points") or 0),
+            "details": " + ".join(chips),
+            "my_points": my_points,
+        })
+
+    table = pd.DataFrame(records, columns=[c for c in RANKING_COLUMNS if c != "is_top"])
+    max_points = int(table["points"].max()) if not table.empty else 0
+    table["is_top"] = (table["points"] == max_points) & (max_points > 0)
+    return Ranking(table=table[RANKING_COLUMNS], max_points=max_points, my_used_points=my_used_points)
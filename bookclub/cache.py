@@ -0,0 +1,151 @@
+"""テーブル単位の TTL + バージョン付きキャッシュ。
+
+Streamlit の ``st.cache_data.clear()`` はプロセス全体のキャッシュを消してしまうため、
+テーブルごとにバージョン番号を持たせ、書き込んだテーブルだけを無効化する。
+
+同じテーブルを同時に読み込もうとしたときは、先に始まった 1 回の取得の結果を全員で使う
+（single-flight）。「🔄 更新」の refresh() は、直前に取得したばかりのテーブルは捨てない
+（会の最中に何人もが続けて押しても、取り直すのは最初の 1 回だけ）。
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+# テーブルごとの有効期限（秒）。更新頻度が高いものほど短くする
+DEFAULT_TTLS = {
+    "users": 600,
+    "categories": 3600,
+    "books": 120,
+    "votes": 30,
+    "events": 300,
+}
+
+
+class TableCache:
+    """プロセス内で共有するテーブルキャッシュ。
+
+    値は全セッションで共有されるので、取り出した DataFrame を直接書き換えないこと。
+
+    refresh_window: refresh() でそのまま使う「取得したばかり」の秒数
+
+    カウンター（節約できた取得の回数 = coalesced + debounced）:
+        hits       キャッシュから返した回数
+        fetches    loader() を呼んだ回数
+        coalesced  他の取得の完了を待って、その結果を使った回数
+        debounced  refresh() で取得したばかりのため捨てなかったテーブルの数
+    """
+
+    def __init__(self, ttls=None, default_ttl=60, refresh_window=5.0):
+        self._ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self._ttls.update({k: float(v) for k, v in dict(ttls).items()})
+        self._default_ttl = default_ttl
+        self._refresh_window = float(refresh_window)
+        self._versions = {}
+        self._entries = {}  # table -> (version, fetched_at, value)
+        self._flights = {}  # table -> (version, started_at, Future)。取得中のもの
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.fetches = 0
+        self.coalesced = 0
+        self.debounced = 0
+
+    def ttl(self, table):
+        return self._ttls.get(table, self._default_ttl)
+
+    def version(self, table):
+        with self._lock:
+            return self._versions.get(table, 0)
+
+    @property
+    def saved(self):
+        """single-flight と refresh() の間引きで省けた取得の回数。"""
+        return self.coalesced + self.debounced
+
+    def get(self, table, loader):
+        """キャッシュが新しければそれを返し、古ければ loader() で取り直す。
+
+        同じテーブル（同じバージョン）を取得中なら、loader() は呼ばずにその結果を待つ
+        （取得が失敗したら、待っていた全員に同じ例外を投げる）。
+        """
+        now = time.monotonic()
+        with self._lock:
+            version = self._versions.get(table, 0)
+            entry = self._entries.get(table)
+            if entry and entry[0] == version and now - entry[1] < self.ttl(table):
+                self.hits += 1
+                return entry[2]
+            flight = self._flights.get(table)
+            if flight is not None and flight[0] == version:
+                self.coalesced += 1
+                future = flight[2]
+            else:
+                future = Future()
+                self._flights[table] = (version, now, future)
+                self.fetches += 1
+                flight = None
+        if flight is not None:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            # KeyboardInterrupt や Streamlit の中断（rerun / stop）でも印を外して待っている人を起こす
+            with self._lock:
+                self._land(table, future)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            # 取得中に invalidate された場合は古いデータなので保存しない
+            if self._versions.get(table, 0) == version:
+                self._entries[table] = (version, now, value)
+            self._land(table, future)
+        future.set_result(value)
+        return value
+
+    def put(self, table, value):
+        """書き込み結果などで得た最新の値を、取得し直さずにキャッシュへ入れる。"""
+        with self._lock:
+            self._entries[table] = (self._versions.get(table, 0), time.monotonic(), value)
+
+    def invalidate(self, *tables):
+        """指定テーブルのバージョンを上げる。引数なしなら全テーブル。
+
+        書き込んだ本人が次の表示で自分の変更を見られるよう、間引かずにすぐ無効化する。
+        """
+        with self._lock:
+            for table in tables or self._known_tables():
+                self._bump(table)
+
+    def refresh(self, *tables):
+        """「🔄 更新」用の無効化。引数なしなら全テーブル。
+
+        refresh_window 秒以内に取得した（取得を始めた）テーブルは十分新しいので捨てない。
+        続けて押されても、取り直すのは窓の外になったテーブルだけ。
+        """
+        now = time.monotonic()
+        with self._lock:
+            for table in tables or self._known_tables():
+                version = self._versions.get(table, 0)
+                # entry / flight はどちらも (バージョン, 取得を始めた時刻, ...)
+                started = [x[1] for x in (self._entries.get(table), self._flights.get(table))
+                           if x is not None and x[0] == version]
+                if any(now - t < self._refresh_window for t in started):
+                    self.debounced += 1
+                else:
+                    self._bump(table)
+
+    # --- 内部処理（ロックを取った状態で呼ぶ） ---
+    def _known_tables(self):
+        return tuple(set(self._versions) | set(self._entries) | set(self._flights))
+
+    def _bump(self, table):
+        self._versions[table] = self._versions.get(table, 0) + 1
+        self._entries.pop(table, None)
+
+    def _land(self, table, future):
+        # 自分の取得が終わったので取得中の印を外す（その間に別のバージョンの取得が始まっていればそのまま）
+        flight = self._flights.get(table)
+        if flight is not None and flight[2] is future:
+            del self._flights[table]
@@ -0,0 +1,92 @@
+"""プロセス全体で共有する Supabase クライアント。
+
+セッションや rerun ごとに create_client() するとその都度 TCP/TLS 接続を張り直すため、
+keep-alive 付きの httpx.Client を 1 つ作って使い回す。
+"""
+import threading
+import time
+
+import httpx
+
+DEFAULT_POOL = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 60.0,
+    "connect_timeout": 5.0,
+    "read_timeout": 15.0,
+}
+
+
+class SharedClient:
+    """Supabase クライアントと、その下の HTTP 接続プールをまとめたもの。
+
+    通信エラー（httpx.TransportError）が起きたら mark_unhealthy() し、
+    次の get() で接続プールごと作り直す。
+    event_hooks は httpx.Client にそのまま渡す（計測用のフックなど）。
+    """
+
+    def __init__(self, url, key, pool=None, event_hooks=None):
+        self._url = url
+        self._key = key
+        self._event_hooks = event_hooks or {}
+        self._pool = dict(DEFAULT_POOL)
+        if pool:
+            self._pool.update(dict(pool))
+        self._lock = threading.Lock()
+        self._client = None
+        self._http = None
+        self._healthy = False
+        self.reconnects = 0
+        self.created_at = None
+
+    def get(self):
+        with self._lock:
+            if self._client is None or not self._healthy:
+                self._connect()
+            return self._client
+
+    def mark_unhealthy(self):
+        with self._lock:
+            self._healthy = False
+
+    def ping(self):
+        """軽いクエリで疎通確認する。失敗したら次回の get() で再接続する。"""
+        try:
+            self.get().table("users").select("user_name").limit(1).execute()
+            return True
+        except httpx.TransportError:
+            self.mark_unhealthy()
+            return False
+
+    def close(self):
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+            self._client = None
+            self._http = None
+            self._healthy = False
+
+    def _connect(self):
+        # supabase の import は重い（100ms 以上）ので、最初に接続するときまで遅らせる
+        from supabase import ClientOptions, create_client
+
+        if self._http is not None:
+            self._http.close()
+            self.reconnects += 1
+        p = self._pool
+        self._http = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=int(p["max_connections"]),
+                max_keepalive_connections=int(p["max_keepalive_connections"]),
+                keepalive_expiry=float(p["keepalive_expiry"]),
+            ),
+            timeout=httpx.Timeout(float(p["read_timeout"]), connect=float(p["connect_timeout"])),
+            event_hooks=self._event_hooks,
+        )
+        options = ClientOptions(
+            httpx_client=self._http,
+            postgrest_client_timeout=float(p["read_timeout"]),
+        )
+        self._client = create_client(self._url, self._key, options=options)
+        self._healthy = True
+        self.created_at = time.time()
@@ -0,0 +1,64 @@
+"""events テーブルを 1 回の rerun で使い回すためのビュー。
+
+ヘッダーの「次回の開催」、History タブ、カテゴリグラフ、Admin の「継続」が
+同じ取得結果と同じ日付パース結果を参照する。
+"""
+from datetime import date
+
+import pandas as pd
+
+
+class EventsView:
+    """日付パース済みの events と、過去 / 未来の分割結果。
+
+    all: event_date_dt（date）と year（文字列）を追加した全イベント
+    past: 今日より前のイベント / future: 今日以降のイベント（日付の昇順）
+    """
+
+    def __init__(self, df_events, today=None):
+        today = today or date.today()
+        df = df_events.copy()
+        if df.empty or "event_date" not in df.columns:
+            df = pd.DataFrame(columns=["event_date", "book_id", "books"])
+            df["event_date_dt"] = pd.Series(dtype=object)
+            df["year"] = pd.Series(dtype=str)
+        else:
+            parsed = pd.to_datetime(df["event_date"])
+            df["event_date_dt"] = parsed.dt.date
+            df["year"] = parsed.dt.year.astype(str)
+        self.all = df
+        self.past = df[df["event_date_dt"] < today]
+        self.future = df[df["event_date_dt"] >= today].sort_values("event_date", kind="stable")
+        self.used_book_ids = {str(x) for x in df["book_id"].unique().tolist()}
+
+    @property
+    def next_event(self):
+        """次回（今日以降で一番近い）のイベント。なければ None。"""
+        return self.future.iloc[0] if not self.future.empty else None
+
+    @property
+    def latest_event(self):
+        """日付が一番新しいイベント（Admin の「継続」用）。なければ None。"""
+        if self.all.empty:
+            return None
+        return self.all.sort_values("event_date", ascending=False, kind="stable").iloc[0]
+
+
+def category_counts(past_events):
+    """過去のイベントで読んだ本のカテゴリ別冊数（カテゴリ / 冊数）。
+
+    複数回取り上げた本は 1 冊として数える。
+    """
+    # event_dateなどは無視して、book_idが同じなら1件とみなす
+    unique_books_df = past_events.drop_duplicates(subset=["book_id"])
+    cat_list = [
+        str(row.get("books", {}).get("category"))
+        for row in unique_books_df.to_dict("records")
+        if row.get("books")
+    ]
+    # 無効な値を排除
+    cat_list = [c for c in cat_list if c not in ["None", "", "nan"]]
+
+    df_counts = pd.Series(cat_list, dtype=object).value_counts().reset_index()
+    df_counts.columns = ["カテゴリ", "冊数"]
+    return df_counts
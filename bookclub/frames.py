@@ -0,0 +1,28 @@
+"""books / votes の DataFrame の結合と、確定済みの本の除外。
+
+id 列は取得時に文字列にそろえてある前提（bookclub.model.normalize_books / normalize_votes）。
+"""
+import pandas as pd
+
+VOTE_COLUMNS = ["id", "created_at", "action", "book_id", "user_name", "points", "書籍タイトル", "著者名"]
+
+
+def merge_votes(df_b, df_v_raw):
+    """votes に本のタイトル・著者名（書籍タイトル / 著者名）を付ける。"""
+    if df_v_raw.empty:
+        return pd.DataFrame(columns=VOTE_COLUMNS)
+
+    df_b_subset = df_b[["id", "title", "author"]].rename(
+        columns={"id": "book_id", "title": "書籍タイトル", "author": "著者名"}
+    )
+    return pd.merge(df_v_raw, df_b_subset, on="book_id", how="left")
+
+
+def drop_used_books(df_books, used_book_ids):
+    """Books一覧から、イベントで使用済みの本を除外する。"""
+    return df_books[~df_books["id"].isin(used_book_ids)]
+
+
+def drop_used_votes(df_votes, used_book_ids):
+    """選出・投票データから、既に使用された本のデータを除外する。"""
+    return df_votes[~df_votes["book_id"].isin(used_book_ids)]
@@ -0,0 +1,46 @@
+"""ページ表示に必要なテーブルを並行して読み込む。
+
+各テーブルの取得は互いに独立しているので、スレッドプールで同時に投げて
+待ち時間を「合計」ではなく「一番遅いクエリ」にする。
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Snapshot:
+    """1 回の読み込み結果。values[名前] に結果、errors[名前] に失敗時の例外が入る。"""
+
+    def __init__(self, values, errors):
+        self.values = values
+        self.errors = errors
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+
+def make_executor(max_workers=8, name="bookclub-load"):
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+
+def load_concurrently(executor, loaders, fallbacks=None):
+    """loaders の各関数を並行実行して Snapshot を返す。
+
+    fallbacks に登録された名前は、失敗しても fallback(例外) の値で置き換えて続行する。
+    登録のない名前が失敗した場合は、全件の完了を待ってからその例外をそのまま投げる。
+    """
+    fallbacks = fallbacks or {}
+    futures = {name: executor.submit(fn) for name, fn in loaders.items()}
+    values = {}
+    errors = {}
+    first_fatal = None
+    for name, future in futures.items():
+        try:
+            values[name] = future.result()
+        except Exception as e:
+            errors[name] = e
+            if name in fallbacks:
+                values[name] = fallbacks[name](e)
+            elif first_fatal is None:
+                first_fatal = e
+    if first_fatal is not None:
+        raise first_fatal
+    return Snapshot(values, errors)
@@ -0,0 +1,152 @@
+"""読み込んだテーブルを正規化した、全セッション共有のデータモデル。
+
+取得時に 1 回だけ型をそろえる（id は文字列、action / category はカテゴリ型、points は小さい整数）。
+そのうえで、rerun のたびに作り直していた辞書や絞り込みを ClubModel にまとめて 1 回だけ作り、
+各タブからは id で引くだけにする。
+"""
+import threading
+from functools import cached_property
+
+import pandas as pd
+
+from bookclub.frames import drop_used_books, drop_used_votes, merge_votes
+
+ACTION_DTYPE = pd.CategoricalDtype(["選出", "投票"])
+
+
+def normalize_books(df):
+    """books の id を文字列に、category をカテゴリ型にする。"""
+    if df.empty or "id" not in df.columns:
+        return df
+    df = df.copy()
+    df["id"] = df["id"].astype(str)
+    if "category" in df.columns:
+        df["category"] = df["category"].astype("category")
+    return df
+
+
+def normalize_votes(df):
+    """votes の id / book_id を文字列に、action をカテゴリ型に、points を Int8 にする。"""
+    if df.empty or "book_id" not in df.columns:
+        return df
+    df = df.copy()
+    for col in ("id", "book_id"):
+        if col in df.columns:
+            df[col] = df[col].astype(str)
+    df["action"] = df["action"].astype(ACTION_DTYPE)
+    if "points" in df.columns:
+        df["points"] = pd.to_numeric(df["points"], errors="coerce").astype("Int8")
+    return df
+
+
+class ClubModel:
+    """books / votes / users と確定済みの本から作る、検索用の索引付きモデル。
+
+    display_books: 確定済みの本を除いた books
+    active_votes: books と結合し、確定済みの本を除いた votes（0 からの連番）
+    索引（最初に使われたときに作る）:
+        book_pos: 本の id → books の行番号
+        votes_by_book / votes_by_user: book_id / user_name → active_votes の行番号の配列
+        nominated_ids: 現在選出されている本の id の集合
+        nomination_by_user: user_name → その人が選出中の本の id
+        icon_by_user / url_by_book: 表示用の辞書
+    """
+
+    def __init__(self, books, votes, users, used_book_ids):
+        self.books = books
+        self.users = users
+        self.used_book_ids = frozenset(used_book_ids)
+        if books.empty or "id" not in books.columns:
+            self.display_books = books
+        else:
+            self.display_books = drop_used_books(books, self.used_book_ids)
+        self.active_votes = drop_used_votes(merge_votes(books, votes), self.used_book_ids).reset_index(drop=True)
+
+    @cached_property
+    def book_pos(self):
+        if self.books.empty:
+            return {}
+        return {book_id: i for i, book_id in enumerate(self.books["id"])}
+
+    @cached_property
+    def votes_by_book(self):
+        return self._positions("book_id")
+
+    @cached_property
+    def votes_by_user(self):
+        return self._positions("user_name")
+
+    @cached_property
+    def _nominations(self):
+        v = self.active_votes
+        return v[v["action"] == "選出"]
+
+    @cached_property
+    def nominated_ids(self):
+        return frozenset(self._nominations["book_id"])
+
+    @cached_property
+    def nomination_by_user(self):
+        # 1 人に複数あれば最初の 1 件（逆順に入れて先勝ちにする）
+        n = self._nominations
+        return dict(zip(n["user_name"].iloc[::-1], n["book_id"].iloc[::-1]))
+
+    @cached_property
+    def icon_by_user(self):
+        if self.users.empty:
+            return {}
+        return dict(zip(self.users["user_name"], self.users["icon"]))
+
+    @cached_property
+    def url_by_book(self):
+        if self.books.empty:
+            return {}
+        return dict(zip(self.books["id"], self.books["url"]))
+
+    def book(self, book_id):
+        """id の本の行（Series）。なければ None。"""
+        pos = self.book_pos.get(str(book_id))
+        return None if pos is None else self.books.iloc[pos]
+
+    def books_by_ids(self, book_ids):
+        """book_ids の本を books と同じ並び順で返す（存在しない id は無視する）。"""
+        positions = sorted(self.book_pos[i] for i in book_ids if i in self.book_pos)
+        return self.books.iloc[positions]
+
+    def votes_of_user(self, user_name):
+        return self.active_votes.iloc[self.votes_by_user.get(user_name, [])]
+
+    def votes_for_book(self, book_id):
+        return self.active_votes.iloc[self.votes_by_book.get(str(book_id), [])]
+
+    def _positions(self, col):
+        if self.active_votes.empty:
+            return {}
+        return self.active_votes.groupby(col, sort=False, observed=True).indices
+
+
+class ModelCache:
+    """直近に作った ClubModel を 1 つだけ持ち、入力が同じなら使い回す。
+
+    books / votes / users は TableCache から返る DataFrame そのもの（同一オブジェクト）で比較する。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inputs = None
+        self._model = None
+        self.builds = 0
+
+    def get(self, books, votes, users, used_book_ids):
+        used = frozenset(used_book_ids)
+        with self._lock:
+            if self._inputs is not None:
+                b, v, u, used_prev = self._inputs
+                if b is books and v is votes and u is users and used_prev == used:
+                    return self._model
+        model = ClubModel(books, votes, users, used)
+        with self._lock:
+            self._inputs = (books, votes, users, used)
+            self._model = model
+            self.builds += 1
+        return model
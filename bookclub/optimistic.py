@@ -0,0 +1,119 @@
+"""楽観的更新（optimistic update）のための書き込み待ち行列。
+
+ボタンを押したら、サーバーへの書き込みはバックグラウンドに回し、
+結果が返るまでの間はローカルの votes に変更を重ねて表示する。
+1 セッション分を st.session_state に置いて使う。
+"""
+import concurrent.futures
+import threading
+import uuid
+from datetime import datetime, timezone
+
+import pandas as pd
+
+
+class PendingWrites:
+    """サーバーへの反映待ちの変更。
+
+    add_insert() / add_delete() で登録し、apply() で DataFrame に重ね、
+    settle() で書き込みが終わったものを取り除く。同じセッションの書き込みは
+    登録順に 1 つずつ実行する（+1 → 取り消し の順序が入れ替わらないように）。
+
+    origin は書き込みを行った画面（フラグメント）の名前。失敗はその画面の settle() で返す。
+    """
+
+    # 挿入した行がサーバーの行と同じものかを判定するときに見ない列（サーバーが付け直す列）
+    SERVER_COLUMNS = ("id", "created_at", "comment")
+
+    def __init__(self):
+        self._items = []
+        self._errors = {}  # origin -> 失敗した書き込みの例外
+        self._last_future = None
+        self._lock = threading.Lock()
+
+    def add_insert(self, executor, row, write, origin=None):
+        """row をローカルに追加し、write() をバックグラウンドで実行する。"""
+        row = dict(row)
+        match = {k: v for k, v in row.items() if k not in self.SERVER_COLUMNS}
+        row.setdefault("id", f"pending-{uuid.uuid4().hex}")
+        row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        row.setdefault("comment", None)
+        self._submit(executor, {"kind": "insert", "row": row, "match": match, "origin": origin}, write)
+
+    def add_delete(self, executor, match, write, origin=None):
+        """match（列名 -> 値）に一致する行をローカルで消し、write() をバックグラウンドで実行する。"""
+        self._submit(executor, {"kind": "delete", "match": dict(match), "origin": origin}, write)
+
+    def apply(self, df):
+        """反映待ちの変更を df に重ねた DataFrame を返す（df 自体は変更しない）。
+
+        settle() の後に書き込みが終わっていると、読み直した df にはもうその行が入っている。
+        同じ行（SERVER_COLUMNS 以外が一致する行）がすでにある挿入は重ねない（同じ行を 2 回出さない）。
+        """
+        with self._lock:
+            items = list(self._items)
+        for item in items:
+            if item["kind"] == "insert":
+                if not df.empty and _matches(df, item["match"]).any():
+                    continue
+                new_row = pd.DataFrame([item["row"]])
+                df = new_row if df.empty else pd.concat([df, new_row], ignore_index=True)
+            elif not df.empty:
+                df = df[~_matches(df, item["match"])]
+        return df
+
+    def settle(self, origin=None):
+        """書き込みが終わったものを取り除き、origin の画面で失敗した書き込みの例外のリストを返す。"""
+        with self._lock:
+            remaining = []
+            for item in self._items:
+                if not item["future"].done():
+                    remaining.append(item)
+                elif item["future"].exception() is not None:
+                    self._errors.setdefault(item["origin"], []).append(item["future"].exception())
+            self._items = remaining
+            return self._errors.pop(origin, [])
+
+    def wait(self, origin=None, timeout=None):
+        """origin の画面の書き込みが終わるまで最大 timeout 秒待つ。
+
+        待っていた書き込みがあり、すべて終わったら True（画面を描き直す合図）。
+        """
+        with self._lock:
+            futures = [item["future"] for item in self._items if item["origin"] == origin]
+        if not futures:
+            return False
+        _, not_done = concurrent.futures.wait(futures, timeout=timeout)
+        return not not_done
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._items)
+
+    def _submit(self, executor, item, write):
+        with self._lock:
+            prev = self._last_future
+
+            def run():
+                # 前の書き込みが終わるまで待つ（失敗していても続行する）
+                if prev is not None:
+                    try:
+                        prev.result()
+                    except Exception:
+                        pass
+                return write()
+
+            item["future"] = executor.submit(run)
+            self._last_future = item["future"]
+            self._items.append(item)
+
+
+def _matches(df, match):
+    # match（列名 -> 値）にすべて一致する行。値は文字列にして比べる（points の Int8 と int など）
+    hit = pd.Series(True, index=df.index)
+    for col, value in match.items():
+        if col not in df.columns:
+            return pd.Series(False, index=df.index)
+        hit &= df[col].astype(str) == str(value)
+    return hit
@@ -0,0 +1,206 @@
+"""最後に取得できたテーブルをディスクに保存し、起動直後やバックエンド障害時に使う。
+
+stale-while-revalidate:
+- 起動直後（メモリにまだ値がない）: ディスクに保存した値をすぐ返し、裏で取り直す
+- 取得に失敗: 直近の値（メモリ → ディスク）を返し、そのテーブルを「オフライン」として記録する
+  （オフラインの間は retry_interval 秒ごとに裏で取り直し、成功したら元に戻る）
+
+保存形式は DataFrame なら Parquet（Streamlit が依存している pyarrow で読み書きする）、
+list（users / categories の行）なら JSON。ログイン画面で使う users は JSON なので、
+起動直後に読み戻すときも pandas を読み込まない。
+"""
+import json
+import os
+import threading
+import time
+from typing import NamedTuple
+
+
+class DiskStore:
+    """テーブル名 → <directory>/<テーブル名>.parquet（DataFrame）または .json（list）。"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, table, ext="parquet"):
+        return os.path.join(self.directory, f"{table}.{ext}")
+
+    def save(self, table, value):
+        os.makedirs(self.directory, exist_ok=True)
+        ext = "json" if isinstance(value, list) else "parquet"
+        # 書きかけのファイルを読まれないよう、一時ファイルに書いてから置き換える
+        tmp = f"{self.path(table, ext)}.{threading.get_ident()}.tmp"
+        if ext == "json":
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(value, f, ensure_ascii=False, default=str)
+        else:
+            value.to_parquet(tmp, index=False)
+        os.replace(tmp, self.path(table, ext))
+
+    def load(self, table):
+        """(値, 保存した時刻) を返す。保存がない・読めないときは None。"""
+        path = self.path(table, "json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f), os.path.getmtime(path)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError):
+            return None
+        path = self.path(table)
+        if not os.path.exists(path):
+            return None
+        import pandas as pd
+        try:
+            return pd.read_parquet(path), os.path.getmtime(path)
+        except (OSError, ValueError):
+            return None
+
+
+class Staleness(NamedTuple):
+    """古いデータを返しているテーブルの状態。
+
+    since: データを取得した時刻（time.time()） / error: 取得に失敗した例外（裏で取り直し中なら None）
+    """
+    since: float
+    error: Exception = None
+
+
+class StaleWhileRevalidate:
+    """テーブルごとの直近の値を持ち、取得できないときはそれ（なければディスクの値）を返す。
+
+    store: DiskStore（None ならディスクを使わない）
+    executor: 裏での取り直しに使うスレッドプール（None なら起動直後もその場で取得する）
+    restore: テーブル名 → ディスクから読んだ値に適用する関数
+    """
+
+    def __init__(self, store=None, executor=None, retry_interval=30, save_interval=60, restore=None):
+        self._store = store
+        self._executor = executor
+        self._retry_interval = retry_interval
+        self._save_interval = save_interval
+        self._restore = restore or {}
+        self._lock = threading.Lock()
+        self._last = {}        # table -> (値, 取得した時刻)
+        self._stale = {}       # table -> Staleness
+        self._refreshing = set()
+        self._retry_at = {}    # table -> 次に取り直してよい時刻（monotonic）
+        self._saved = {}       # table -> (保存した値, 保存した時刻（monotonic）)
+        self._fetchers = {}    # table -> 最後に渡された fetch（他のテーブルの復旧時に取り直す）
+
+    def get(self, table, fetch):
+        """fetch() の結果を返す。失敗したら直近の値を返し、どれもなければ例外をそのまま投げる。"""
+        with self._lock:
+            entry = self._last.get(table)
+            self._fetchers[table] = fetch
+        if entry is None:
+            disk = self._load_disk(table)
+            if disk is not None and self._executor is not None:
+                # 起動直後: 保存済みの値ですぐに表示し、最新のデータは裏で取りに行く
+                with self._lock:
+                    entry = self._last.setdefault(table, disk)
+                    self._stale.setdefault(table, Staleness(entry[1]))
+                self._revalidate(table, fetch)
+                return entry[0]
+        elif table in self._stale:
+            # 古い値を返している間は待たせず、取り直しは裏で行う
+            self._revalidate(table, fetch)
+            return entry[0]
+
+        try:
+            value = fetch()
+        except Exception as e:
+            fallback = entry or self._load_disk(table)
+            if fallback is None:
+                raise
+            self._mark_failed(table, fallback, e)
+            return fallback[0]
+        self._remember(table, value)
+        return value
+
+    def status(self):
+        """古いデータを返しているテーブル → Staleness。"""
+        with self._lock:
+            return dict(self._stale)
+
+    def offline(self):
+        """取得に失敗して古いデータを返しているテーブルがあるか。"""
+        with self._lock:
+            return any(s.error is not None for s in self._stale.values())
+
+    # --- 内部処理 ---
+    def _load_disk(self, table):
+        if self._store is None:
+            return None
+        loaded = self._store.load(table)
+        if loaded is None:
+            return None
+        value, saved_at = loaded
+        restore = self._restore.get(table)
+        return (restore(value) if restore else value), saved_at
+
+    def _revalidate(self, table, fetch):
+        if self._executor is None:
+            return
+        with self._lock:
+            if table in self._refreshing or time.monotonic() < self._retry_at.get(table, 0):
+                return
+            self._refreshing.add(table)
+        self._executor.submit(self._refresh, table, fetch)
+
+    def _refresh(self, table, fetch):
+        try:
+            value = fetch()
+        except Exception as e:
+            with self._lock:
+                entry = self._last.get(table)
+            if entry is not None:
+                self._mark_failed(table, entry, e)
+        else:
+            self._remember(table, value)
+            self._revalidate_others(table)
+        finally:
+            with self._lock:
+                self._refreshing.discard(table)
+
+    def _revalidate_others(self, table):
+        # 1 つでも取得できたらバックエンドは復旧しているので、他の古いテーブルもすぐ取り直す
+        # （いまのタブで使わないテーブルがオフラインのまま残らないようにする）
+        with self._lock:
+            others = [(t, self._fetchers[t]) for t in self._stale if t != table and t in self._fetchers]
+            for t, _ in others:
+                self._retry_at.pop(t, None)
+        for t, fetch in others:
+            self._revalidate(t, fetch)
+
+    def _mark_failed(self, table, entry, error):
+        with self._lock:
+            self._last[table] = entry
+            self._stale[table] = Staleness(entry[1], error)
+            self._retry_at[table] = time.monotonic() + self._retry_interval
+
+    def _remember(self, table, value):
+        now = time.monotonic()
+        with self._lock:
+            self._last[table] = (value, time.time())
+            self._stale.pop(table, None)
+            self._retry_at.pop(table, None)
+            saved = self._saved.get(table)
+            due = saved is None or (saved[0] is not value and now - saved[1] >= self._save_interval)
+            if due:
+                self._saved[table] = (value, now)
+        if due and self._store is not None:
+            self._save(table, value)
+
+    def _save(self, table, value):
+        # 保存はページの表示を待たせないよう裏で行う（失敗しても表示には影響させない）
+        def save():
+            try:
+                self._store.save(table, value)
+            except Exception:
+                with self._lock:
+                    self._saved.pop(table, None)
+        if self._executor is not None:
+            self._executor.submit(save)
+        else:
+            save()
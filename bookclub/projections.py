@@ -0,0 +1,100 @@
+"""画面（ビュー）ごとに読む列の宣言と、そこから作るクエリの列リスト。
+
+books / votes / events は全セッション・全タブで 1 つのキャッシュを共有するので、
+取得する列は「そのテーブルを使うビューの列の和集合」+ 差分同期に必要な列になる。
+ここに書いていない列（メモやメタデータなど）は取得しない。
+
+STRICT_PROJECTIONS を有効にすると、events に埋め込まれた本（books）の dict が
+宣言にないキーを読まれたときに ProjectionError を投げる（DataFrame の列は取得して
+いなければそもそも KeyError になる）。
+
+views を渡すと、そのビューの列だけで取得する。全ビューの和集合では、あるビューが別の
+ビューの列を読んでいても気づけないので、テスト（tests/test_projections.py）では
+画面ごとに、その画面で描画するビューの列だけを取得して描画する。
+"""
+
+# ビュー -> テーブル -> 読む列（"events.books" は events に埋め込む本の列）
+VIEWS = {
+    "header": {
+        "events": ("event_date", "book_id"),
+        "events.books": ("title", "url"),
+    },
+    "books": {
+        "books": ("id", "title", "author", "category", "url"),
+        "votes": ("id", "action", "book_id", "user_name"),
+    },
+    "votes": {
+        "books": ("id", "title", "author", "url"),
+        "votes": ("id", "action", "book_id", "user_name", "points"),
+    },
+    "history": {
+        "events": ("event_date", "book_id"),
+        "events.books": ("title", "author", "category", "url"),
+    },
+    "admin": {
+        # author は ClubModel（選出に書籍タイトル・著者名を付ける）で使う
+        "books": ("id", "title", "author", "category"),
+        "votes": ("id", "action", "book_id", "user_name"),
+        "events": ("event_date", "book_id"),
+        "events.books": ("title",),
+    },
+}
+
+# 差分同期（bookclub.sync）で必ず使う列
+SYNC_COLUMNS = ("id", "created_at")
+
+
+class ProjectionError(KeyError):
+    """宣言（VIEWS）にない列を読もうとした。"""
+
+
+def columns_for(table, views=None):
+    """table を取得するときの列（同期用の列 + 各ビューの列の和集合、宣言順）。
+
+    views: 対象にするビューの名前（None なら全ビュー）
+    """
+    columns = [] if table == "events.books" else list(SYNC_COLUMNS)
+    for name in VIEWS if views is None else views:
+        for col in VIEWS[name].get(table, ()):
+            if col not in columns:
+                columns.append(col)
+    return columns
+
+
+def query_for(table, views=None):
+    """Repository の books / votes / events に渡すキーワード引数。"""
+    query = {"columns": columns_for(table, views)}
+    if table == "events":
+        query["book_columns"] = columns_for("events.books", views)
+    return query
+
+
+class ProjectedRow(dict):
+    """宣言にないキーを読むと ProjectionError になる dict（STRICT_PROJECTIONS 用）。"""
+
+    def __init__(self, row, allowed, name):
+        super().__init__(row)
+        self._allowed = frozenset(allowed)
+        self._name = name
+
+    def _check(self, key):
+        if key not in self._allowed:
+            raise ProjectionError(f"{self._name} に宣言されていない列 {key!r} を読んでいます")
+
+    def __getitem__(self, key):
+        self._check(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self._check(key)
+        return super().get(key, default)
+
+
+def strict_embedded(df, column="books", table="events.books", views=None):
+    """df の埋め込み列（dict）を ProjectedRow に置き換えた DataFrame を返す。"""
+    if df.empty or column not in df.columns:
+        return df
+    allowed = columns_for(table, views)
+    df = df.copy()
+    df[column] = [ProjectedRow(v, allowed, table) if isinstance(v, dict) else v for v in df[column]]
+    return df
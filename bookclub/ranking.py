@@ -0,0 +1,87 @@
+"""Votes タブのランキング集計。
+
+選出（action="選出"）ごとに投票ポイントを合計し、表示に必要な列をまとめた表を
+groupby 1 回で作る。Streamlit 側はこの結果を描画するだけにする。
+"""
+from typing import NamedTuple
+
+import pandas as pd
+
+DEFAULT_ICON = "👤"
+
+RANKING_COLUMNS = [
+    "book_id", "title", "author", "url", "nominator", "nominator_icon",
+    "points", "details", "is_top", "my_points",
+]
+
+
+class Ranking(NamedTuple):
+    table: pd.DataFrame      # 選出された本 1 冊につき 1 行（選出順）
+    max_points: int          # 最高得点（👑 の判定に使う）
+    my_used_points: set      # ログインユーザーが既に使ったポイント（1 / 2）
+
+
+def compute_ranking(active_votes, users, books, current_user, icon_by_user=None, url_by_book=None):
+    """確定前の選出・投票データからランキング表を作る。
+
+    active_votes: fetch_data() の votes から確定済みの本を除いたもの（book_id は文字列）
+    users: user_name, icon を持つ DataFrame
+    books: id, url を持つ DataFrame
+    icon_by_user / url_by_book: 作成済みの辞書（ClubModel）があれば users / books の代わりに使う
+    """
+    nominated = active_votes[active_votes["action"] == "選出"]
+    # 同じ本を 2 人が同時に選出できてしまった（table モードの書き込み）ときは、先の選出だけを残す
+    nominated = nominated.drop_duplicates("book_id", keep="first")
+    vote_only = active_votes[active_votes["action"] == "投票"]
+
+    if icon_by_user is None:
+        icon_by_user = _lookup(users, "user_name", "icon")
+    if url_by_book is None:
+        url_by_book = _lookup(books, "id", "url", key_as_str=True)
+
+    votes = pd.DataFrame({
+        "book_id": vote_only["book_id"],
+        "user_name": vote_only["user_name"],
+        "points": pd.to_numeric(vote_only["points"], errors="coerce").fillna(0).astype(int),
+    })
+    votes["chip"] = (
+        votes["user_name"].map(icon_by_user).fillna(DEFAULT_ICON).astype(str)
+        + " " + votes["points"].astype(str)
+    )
+
+    per_book = votes.groupby("book_id", sort=False).agg(
+        points=("points", "sum"),
+        details=("chip", " + ".join),
+    )
+    mine = votes[votes["user_name"] == current_user]
+    my_by_book = mine.groupby("book_id", sort=False)["points"].sum()
+
+    table = pd.DataFrame({
+        "book_id": nominated["book_id"],
+        "title": nominated["書籍タイトル"],
+        "author": nominated["著者名"],
+        "nominator": nominated["user_name"],
+    }).reset_index(drop=True)
+    table["url"] = table["book_id"].map(url_by_book)
+    table["nominator_icon"] = table["nominator"].map(icon_by_user).fillna(DEFAULT_ICON)
+    table["points"] = table["book_id"].map(per_book["points"]).fillna(0).astype(int)
+    table["details"] = table["book_id"].map(per_book["details"]).fillna("")
+    table["my_points"] = table["book_id"].map(my_by_book).fillna(0).astype(int)
+
+    max_points = int(table["points"].max()) if not table.empty else 0
+    table["is_top"] = (table["points"] == max_points) & (max_points > 0)
+
+    return Ranking(
+        table=table[RANKING_COLUMNS],
+        max_points=max_points,
+        my_used_points=set(mine["points"].tolist()),
+    )
+
+
+def _lookup(df, key, value, key_as_str=False):
+    # dict(zip(...)) と同じく、キーが重複したら後勝ち
+    if df.empty or key not in df.columns or value not in df.columns:
+        return pd.Series(dtype=object)
+    keys = df[key].astype(str) if key_as_str else df[key]
+    s = pd.Series(df[value].values, index=keys.values)
+    return s[~s.index.duplicated(keep="last")]
@@ -0,0 +1,106 @@
+"""カード・ランキング・履歴の HTML を組み立てる関数。
+
+Streamlit には依存せず、st.markdown(..., unsafe_allow_html=True) に渡す文字列だけを返す。
+"""
+import pandas as pd
+
+
+def is_link(url):
+    return pd.notnull(url) and str(url).startswith("http")
+
+
+def book_card_html(title, author, url):
+    """Books タブの本カード（タイトル・著者エリア）。"""
+    if is_link(url):
+        # リンクがある場合は青色（#1E88E5）
+        return f"""
+            <div style="margin-bottom: 12px;">
+                <a href="{url}" target="_blank" class="book-title-link">
+                    <div style="font-size: 1.15rem; font-weight: bold; color: #1E88E5; line-height: 1.4;">
+                        {title}
+                    </div>
+                </a>
+                <div style="color: #888; font-size: 0.8rem; margin-top: 4px;">{author}</div>
+            </div>
+        """
+    # リンクがない場合は通常の黒色
+    return f"""
+        <div style="margin-bottom: 12px;">
+            <div style="font-size: 1.15rem; font-weight: bold; color: #333; line-height: 1.4;">
+                {title}
+            </div>
+            <div style="color: #888; font-size: 0.8rem; margin-top: 4px;">{author}</div>
+        </div>
+    """
+
+
+def ranking_row_html(n):
+    """Votes タブのランキング 1 行（n は Ranking.table の 1 行）。"""
+    prefix = "👑 " if n["is_top"] else ""
+    pts_color = "#E65100" if n["is_top"] else "#1E88E5"
+    return f"""
+            <div style="margin-bottom: 4px; line-height: 1.2;">
+                {prefix}<b>{n['title']}</b> 
+                <span style="font-size: 1.5rem; font-weight: bold; color: {pts_color}; margin-left: 6px;">{n['points']}</span>
+                <span style="font-size: 0.8rem; color: #555;">pts</span>
+                <span style="font-size: 1.0rem; color: #555; margin-left: 8px;">...{n['details']}</span>
+            </div>
+            <hr style="margin: 4px 0; border: 0; border-top: 1px solid #eee;">
+            """
+
+
+def vote_panel_html(n):
+    """Votes タブの投票パネルの見出し部分（タイトル・著者・推薦者）。"""
+    # タイトルリンク（青色・下線なし）
+    if is_link(n["url"]):
+        title_style = "color: #1E88E5; text-decoration: none; font-weight: bold; font-size: 1.05rem;"
+        title_html = f'<a href="{n["url"]}" target="_blank" style="{title_style}">{n["title"]}</a>'
+    else:
+        title_html = f'<b style="font-size: 1.05rem;">{n["title"]}</b>'
+
+    return f"""
+        <div style="line-height: 1.5; margin-bottom: 12px;">
+            {title_html}<br>
+            <div style="color: #666; font-size: 0.85rem; margin-bottom: 8px;">{n['author']}</div>
+            <span style="background: #e1f5fe; border-radius: 4px; padding: 2px 8px; font-size: 0.75rem; color: #01579b; font-weight: bold; display: inline-block;">
+                推薦: {n['nominator_icon']} {n['nominator']}
+            </span>
+        </div>
+    """
+
+
+def history_entry_html(event_date, book):
+    """History タブの 1 件（book は events に埋め込まれた本の dict）。"""
+    date_str = str(event_date).replace("-", "/")
+    title = book.get("title", "不明")
+    author = book.get("author", "不明")
+    category = book.get("category", "その他")
+    target_url = book.get("url", "")
+
+    # カテゴリ色
+    bg_color = "#F5F5F5"
+
+    # HTML組み立て（f-string内でダブルクォーテーションがぶつからないようシングルクォーテーションを使用）
+    if target_url:
+        title_html = f"<a href='{target_url}' target='_blank' style='text-decoration: none; color: #1E88E5; font-weight: 600; font-size: 1rem;'>{title}</a>"
+    else:
+        title_html = f"<span style='color: #333; font-weight: 600; font-size: 1rem;'>{title}</span>"
+
+    return f"""
+            <div style='display: flex; align-items: flex-start; padding: 15px 0; border-bottom: 1px solid #eee; gap: 15px;'>
+                <div style='width: 100px; flex-shrink: 0;'>
+                    <div style='color: #888; font-size: 0.8rem; margin-bottom: 4px;'>{date_str}</div>
+                    <div style='color: #555; font-size: 0.85rem; line-height: 1.2; word-break: break-all;'>{author}</div>
+                </div>
+                <div style='flex-grow: 1;'>
+                    <div style='margin-bottom: 8px; line-height: 1.4;'>
+                        {title_html}
+                    </div>
+                    <div>
+                        <span style='background-color: {bg_color}; padding: 2px 10px; border-radius: 4px; font-size: 0.7rem; font-weight: bold; border: 1px solid #ddd; color: #444;'>
+                            {category}
+                        </span>
+                    </div>
+                </div>
+            </div>
+            """
@@ -0,0 +1,472 @@
+"""データアクセス層（リポジトリ）。
+
+app.py からは Repository のメソッドだけを使い、テーブル名やフィルタを UI に書かない。
+実装は 2 つ:
+    SupabaseRepository: 本番の Supabase
+    SQLiteRepository:   同じスキーマのローカル SQLite（ネットワークなしでの計測・負荷試験用）
+
+1 つのデプロイで複数の読書会（クラブ）を扱う。リポジトリは 1 つのクラブ（club_id）の行だけを
+読み書きし、別のクラブ用には for_club() で同じ接続を共有するリポジトリを作る。
+"""
+import copy
+import threading
+from abc import ABC, abstractmethod
+from functools import cached_property
+
+from bookclub.sqlite_schema import connect
+
+# Supabase (PostgREST) の 1 リクエストあたりの最大行数
+PAGE_SIZE = 1000
+
+# 差分同期（since）に対応するテーブル
+SYNC_TABLES = ("books", "votes", "events")
+
+# ids を指定して取得するときの 1 リクエスト（1 クエリ）あたりの id の数
+IDS_CHUNK = 200
+
+# add_log_rows でまとめて追記できるログ用テーブル（読み込みには使わない）
+LOG_TABLES = ("access_logs",)
+
+# クラブを指定しないときのクラブ（クラブを持つ前の行はすべてこのクラブのもの）
+DEFAULT_CLUB = "default"
+
+
+class Repository(ABC):
+    """データアクセスのインターフェース。
+
+    books / votes / events は since（created_at の透かし）を渡すと、それ以降（同時刻を含む）の
+    行だけを返す。ids を渡すとその id の行だけを返す（差分同期で取りこぼした行の取り直し用）。
+    行は created_at, id の順（ページングで同時刻の行を飛ばさないよう id でも並べる）。events の各行には、本の情報を "books" キーに dict で埋め込む。
+    columns（と events の book_columns）を渡すとその列だけを取得する（省略時は全列。
+    ビューごとの列は bookclub.projections で宣言する）。
+
+    読み書きはすべて club_id のクラブの行に限る（書き込む行には club_id を付ける）。
+    実装はすべてのメソッドを定義する（足りなければインスタンスを作る時点で TypeError）。
+    """
+
+    club_id = DEFAULT_CLUB
+
+    def for_club(self, club_id):
+        """同じ接続を共有し、club_id のクラブの行だけを読み書きするリポジトリ。"""
+        scoped = copy.copy(self)
+        scoped.club_id = club_id
+        # 集計・投票 API はクラブごとに作り直す（cached_property の値はコピーしない）
+        scoped.__dict__.pop("aggregates", None)
+        scoped.__dict__.pop("vote_commands", None)
+        return scoped
+
+    # --- 読み込み ---
+    @abstractmethod
+    def clubs(self):
+        """全クラブの {"id", "name"}（クラブに関係なく返す）。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def users(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def categories(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def books(self, since=None, columns=None, ids=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def votes(self, since=None, columns=None, ids=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def events(self, since=None, columns=None, book_columns=None, ids=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def ids(self, table):
+        """現存する行の id 一覧（差分同期の突き合わせ用）。"""
+        raise NotImplementedError
+
+    # --- 書き込み ---
+    @abstractmethod
+    def add_book(self, row):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_event(self, row):
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_vote(self, row):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_votes(self, match):
+        """match（列名 -> 値）に一致する votes を削除し、削除した行を返す。"""
+        raise NotImplementedError
+
+    # --- 確定済みラウンドの投票 ---
+    @abstractmethod
+    def archive_decided_votes(self):
+        """events に登録済みの本への votes を votes_archive に移し、移した行を返す。
+
+        移した行には、その本の（最初の）開催の id を event_id として付ける。
+        votes には今回のラウンド（まだ開催が決まっていない本）の行だけが残る。
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def archived_votes(self, event_id=None, columns=None):
+        """votes_archive の行（過去のラウンドの分析用）。event_id を渡すとその開催の分だけ。"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def add_log_rows(self, table, rows):
+        """ログ用テーブル（LOG_TABLES）に rows をまとめて 1 回で追記する。
+
+        行に club_id がなければこのリポジトリのクラブにする（1 つの書き込みキューを全クラブで共有できる）。
+        """
+        raise NotImplementedError
+
+    # --- 集計・投票 API ---
+    @property
+    @abstractmethod
+    def aggregates(self):
+        """ranking_rows() / category_counts() を持つオブジェクト。"""
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def vote_commands(self):
+        """nominate() / cast_vote() などを持つオブジェクト。"""
+        raise NotImplementedError
+
+
+class SupabaseRepository(Repository):
+    def __init__(self, get_client):
+        self._get_client = get_client
+
+    def clubs(self):
+        return self._table("clubs").select("id, name").order("id").execute().data
+
+    def users(self):
+        return self._scoped("users", "user_name, icon").execute().data
+
+    def categories(self):
+        res = self._scoped("categories", "name").order("id").execute()
+        return [item["name"] for item in res.data]
+
+    def books(self, since=None, columns=None, ids=None):
+        return self._select_since("books", _select_list(columns), since, ids)
+
+    def votes(self, since=None, columns=None, ids=None):
+        return self._select_since("votes", _select_list(columns), since, ids)
+
+    def events(self, since=None, columns=None, book_columns=None, ids=None):
+        select = f"{_select_list(columns)}, books({_select_list(book_columns)})"
+        rows = self._select_since("events", select, since, ids)
+        return sorted(rows, key=lambda r: str(r.get("event_date")), reverse=True)
+
+    def ids(self, table):
+        rows = self._fetch_all_pages(lambda: self._scoped(table, "id").order("id"))
+        return [r["id"] for r in rows]
+
+    def add_book(self, row):
+        return self._table("books").insert(self._stamp(row)).execute().data
+
+    def add_event(self, row):
+        return self._table("events").insert(self._stamp(row)).execute().data
+
+    def add_vote(self, row):
+        return self._table("votes").insert(self._stamp(row)).execute().data
+
+    def delete_votes(self, match):
+        q = self._table("votes").delete().eq("club_id", self.club_id)
+        for col, value in match.items():
+            q = q.eq(col, value)
+        return q.execute().data
+
+    def archive_decided_votes(self):
+        # 移動と削除を 1 トランザクションで行う RPC（supabase/migrations/20261017_scope_tables_by_club.sql）
+        return self._get_client().rpc("archive_decided_votes", {"p_club_id": self.club_id}).execute().data
+
+    def archived_votes(self, event_id=None, columns=None):
+        def make_query():
+            q = self._scoped("votes_archive", _select_list(columns))
+            if event_id is not None:
+                q = q.eq("event_id", str(event_id))
+            return q.order("created_at").order("id")
+        return self._fetch_all_pages(make_query)
+
+    def add_log_rows(self, table, rows):
+        _check_log_table(table)
+        rows = [{"club_id": self.club_id, **row} for row in rows]
+        return self._table(table).insert(rows).execute().data
+
+    # 集計・投票 API は pandas を使うので、最初に使われたときに読み込む（ログイン画面では使わない）
+    @cached_property
+    def aggregates(self):
+        from bookclub.aggregates import SupabaseAggregates
+        return SupabaseAggregates(self._get_client, self.club_id)
+
+    @cached_property
+    def vote_commands(self):
+        from bookclub.votes_api import SupabaseVoteCommands
+        return SupabaseVoteCommands(self._get_client, self.club_id)
+
+    def _table(self, name):
+        return self._get_client().table(name)
+
+    def _scoped(self, table, columns):
+        # このクラブの行だけを選ぶ select
+        return self._table(table).select(columns).eq("club_id", self.club_id)
+
+    def _stamp(self, row):
+        return {**row, "club_id": self.club_id}
+
+    def _select_since(self, table, columns, since, ids=None):
+        # id の一覧は URL に入るので、IDS_CHUNK 件ずつに分けて取得する
+        return [r for chunk in _chunks(ids) for r in self._select_chunk(table, columns, since, chunk)]
+
+    def _select_chunk(self, table, columns, since, ids):
+        def make_query():
+            q = self._scoped(table, columns)
+            if since is not None:
+                q = q.gte("created_at", since)
+            if ids is not None:
+                q = q.in_("id", ids)
+            return q.order("created_at").order("id")
+        return self._fetch_all_pages(make_query)
+
+    @staticmethod
+    def _fetch_all_pages(make_query):
+        # range() でページングしながら全件を取得する
+        rows = []
+        start = 0
+        while True:
+            res = make_query().range(start, start + PAGE_SIZE - 1).execute()
+            rows.extend(res.data)
+            if len(res.data) < PAGE_SIZE:
+                return rows
+            start += PAGE_SIZE
+
+
+class SQLiteRepository(Repository):
+    """ローカル SQLite の実装。1 つの接続をロックで守って全スレッドから使う。"""
+
+    # delete_votes() の match に使える列
+    VOTE_COLUMNS = {"id", "action", "book_id", "user_name", "points"}
+    # events に埋め込む本の列（book_columns を省略したとき）
+    BOOK_COLUMNS = ("id", "title", "author", "category", "url", "created_by", "created_at", "deleted_at")
+
+    def __init__(self, path=":memory:"):
+        self._conn = connect(path)
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self):
+        return self._conn
+
+    def clubs(self):
+        return self._query("SELECT id, name FROM clubs ORDER BY id")
+
+    def users(self):
+        return self._query("SELECT user_name, icon FROM users WHERE club_id = ?", (self.club_id,))
+
+    def categories(self):
+        rows = self._query("SELECT name FROM categories WHERE club_id = ? ORDER BY id", (self.club_id,))
+        return [r["name"] for r in rows]
+
+    def books(self, since=None, columns=None, ids=None):
+        return self._select_since("books", since, columns, ids)
+
+    def votes(self, since=None, columns=None, ids=None):
+        return self._select_since("votes", since, columns, ids)
+
+    def events(self, since=None, columns=None, book_columns=None, ids=None):
+        event_cols = ", ".join(f"e.{c}" for c in columns) if columns else "e.*"
+        book_cols = book_columns or self.BOOK_COLUMNS
+        sql = (
+            f"SELECT {event_cols}, b.id AS b__found, "
+            + ", ".join(f"b.{c} AS b_{c}" for c in book_cols)
+            + " FROM events e LEFT JOIN books b ON b.club_id = e.club_id AND b.id = e.book_id WHERE e.club_id = ?"
+        )
+        params = (self.club_id,)
+        if since is not None:
+            sql += " AND e.created_at >= ?"
+            params += (since,)
+        raw = []
+        for chunk in _chunks(ids):
+            where, chunk_params = _in_clause("e.id", chunk)
+            raw.extend(self._query(sql + where + " ORDER BY e.event_date DESC", params + chunk_params))
+        rows = []
+        for r in raw:
+            found = r.pop("b__found")
+            book = {k[2:]: r.pop(k) for k in list(r) if k.startswith("b_")}
+            r["books"] = book if found is not None else None
+            rows.append(r)
+        return rows
+
+    def ids(self, table):
+        if table not in SYNC_TABLES:
+            raise ValueError(f"unknown table: {table}")
+        return [r["id"] for r in self._query(f"SELECT id FROM {table} WHERE club_id = ?", (self.club_id,))]
+
+    def add_book(self, row):
+        return self._insert("books", row)
+
+    def add_event(self, row):
+        return self._insert("events", row)
+
+    def add_vote(self, row):
+        return self._insert("votes", row)
+
+    def delete_votes(self, match):
+        unknown = set(match) - self.VOTE_COLUMNS
+        if unknown:
+            raise ValueError(f"unknown columns: {sorted(unknown)}")
+        where = " AND ".join(["club_id = ?"] + [f"{col} = ?" for col in match])
+        params = (self.club_id,) + tuple(str(v) if col != "points" else v for col, v in match.items())
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                deleted = [dict(r) for r in self._conn.execute(f"SELECT * FROM votes WHERE {where}", params)]
+                self._conn.execute(f"DELETE FROM votes WHERE {where}", params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return deleted
+
+    def archive_decided_votes(self):
+        decided = "v.club_id = ? AND EXISTS (SELECT 1 FROM events e WHERE e.club_id = v.club_id AND e.book_id = v.book_id)"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                archived = [dict(r) for r in self._conn.execute(
+                    "INSERT INTO votes_archive "
+                    "(id, club_id, created_at, action, book_id, user_name, points, comment, event_id) "
+                    "SELECT v.id, v.club_id, v.created_at, v.action, v.book_id, v.user_name, v.points, v.comment, "
+                    "(SELECT e.id FROM events e WHERE e.club_id = v.club_id AND e.book_id = v.book_id "
+                    "ORDER BY e.event_date LIMIT 1) "
+                    f"FROM votes v WHERE {decided} RETURNING *",
+                    (self.club_id,),
+                ).fetchall()]
+                self._conn.execute(f"DELETE FROM votes AS v WHERE {decided}", (self.club_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return archived
+
+    def archived_votes(self, event_id=None, columns=None):
+        cols = ", ".join(columns) if columns else "*"
+        sql = f"SELECT {cols} FROM votes_archive WHERE club_id = ?"
+        params = (self.club_id,)
+        if event_id is not None:
+            sql += " AND event_id = ?"
+            params += (str(event_id),)
+        return self._query(sql + " ORDER BY created_at, id", params)
+
+    def add_log_rows(self, table, rows):
+        _check_log_table(table)
+        rows = [{"club_id": self.club_id, **row} for row in rows]
+        if not rows:
+            return []
+        # 行ごとに列が違ってもよいように、列の組み合わせごとに executemany する
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row), []).append(tuple(row.values()))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for cols, values in groups.items():
+                    marks = ", ".join("?" for _ in cols)
+                    self._conn.executemany(
+                        f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({marks})", values
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    @cached_property
+    def aggregates(self):
+        from bookclub.aggregates import SQLiteAggregates
+        return _Locked(SQLiteAggregates(self._conn, self.club_id), self._lock)
+
+    @cached_property
+    def vote_commands(self):
+        from bookclub.votes_api import SQLiteVoteCommands
+        return SQLiteVoteCommands(self._conn, self.club_id, self._lock)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, params).fetchall()]
+
+    def _select_since(self, table, since, columns=None, ids=None):
+        cols = ", ".join(columns) if columns else "*"
+        sql = f"SELECT {cols} FROM {table} WHERE club_id = ?"
+        params = (self.club_id,)
+        if since is not None:
+            sql += " AND created_at >= ?"
+            params += (since,)
+        rows = []
+        for chunk in _chunks(ids):
+            where, chunk_params = _in_clause("id", chunk)
+            rows.extend(self._query(sql + where + " ORDER BY created_at, id", params + chunk_params))
+        return rows
+
+    def _insert(self, table, row):
+        row = {**row, "club_id": self.club_id}
+        cols = ", ".join(row)
+        marks = ", ".join("?" for _ in row)
+        with self._lock:
+            cur = self._conn.execute(
+                f"INSERT INTO {table} ({cols}) VALUES ({marks}) RETURNING *", tuple(row.values())
+            )
+            return [dict(r) for r in cur.fetchall()]
+
+
+def _chunks(ids):
+    # ids が None なら絞り込みなしの 1 回、あれば IDS_CHUNK 件ずつ（空なら 0 回）
+    if ids is None:
+        yield None
+        return
+    ids = [str(i) for i in ids]
+    for start in range(0, len(ids), IDS_CHUNK):
+        yield ids[start:start + IDS_CHUNK]
+
+
+def _in_clause(column, chunk):
+    # SQLite の " AND <column> IN (?, ...)" とそのパラメーター（chunk が None なら絞り込まない）
+    if chunk is None:
+        return "", ()
+    return f" AND {column} IN ({', '.join('?' for _ in chunk)})", tuple(chunk)
+
+
+def _check_log_table(table):
+    if table not in LOG_TABLES:
+        raise ValueError(f"unknown log table: {table}")
+
+
+def _select_list(columns):
+    # PostgREST の select 文字列（省略時は全列）
+    return ", ".join(columns) if columns else "*"
+
+
+class _Locked:
+    # SQLite の接続を共有しているので、集計クエリもロックを取ってから実行する
+    def __init__(self, target, lock):
+        self._target = target
+        self._lock = lock
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attr(*args, **kwargs)
+        return call
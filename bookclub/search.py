@@ -0,0 +1,180 @@
+"""本と開催履歴のインメモリ全文検索（文字 bigram の転置インデックス）。
+
+日本語は単語の区切りがないので、正規化した文字列の 2 文字ずつ（と 1 文字）を索引語にする。
+正規化: NFKC（全角英数・半角カナをそろえる）→ 小文字 → カタカナをひらがなに → 空白を除く。
+
+    index = SearchIndex()
+    index.sync(df_books, book_documents)   # 元データが変わったときだけ差分を反映する
+    ids = index.search("村上 春樹")          # 関連度の高い順の id
+"""
+import math
+import re
+import threading
+import unicodedata
+
+# カタカナ（ァ〜ヶ）をひらがなに寄せる
+_KANA = str.maketrans({chr(c): chr(c - 0x60) for c in range(0x30A1, 0x30F7)})
+_SPACE = re.compile(r"\s+")
+
+# 一致したフィールドごとの加点（タイトル > 著者 > カテゴリ）
+FIELD_WEIGHTS = (2.0, 1.0, 0.5)
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def normalize(text):
+    if _is_missing(text):
+        return ""
+    s = unicodedata.normalize("NFKC", str(text)).lower().translate(_KANA)
+    return _SPACE.sub("", s)
+
+
+def grams(s):
+    """索引語（1 文字と 2 文字）の集合。"""
+    return set(s) | {s[i:i + 2] for i in range(len(s) - 1)}
+
+
+def query_grams(s):
+    # 2 文字以上なら bigram だけで絞る（1 文字のときは 1 文字で引く）
+    if len(s) < 2:
+        return {s} if s else set()
+    return {s[i:i + 2] for i in range(len(s) - 1)}
+
+
+class SearchIndex:
+    """文書 id → (タイトル, 著者, カテゴリ) の検索インデックス。
+
+    sync() で元データとの差分（追加・変更・削除）だけを反映するので、
+    本が 1 冊増えても全体を作り直さない。全セッションで共有する（スレッドセーフ）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._docs = {}       # id -> 元の値のタプル
+        self._normalized = {}  # id -> 正規化したフィールドのタプル
+        self._postings = {}   # 索引語 -> id の集合
+        self._source = None
+        self.builds = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def sync(self, source, documents):
+        """source（DataFrame など）が前回と別物なら、documents(source) との差分を反映する。
+
+        documents は (id, (タイトル, 著者, カテゴリ)) を返すイテラブルを作る関数。
+        """
+        with self._lock:
+            if source is self._source:
+                return self
+            new_docs = {
+                doc_id: tuple(None if _is_missing(v) else v for v in fields)
+                for doc_id, fields in documents(source)
+            }
+            for doc_id in [d for d in self._docs if d not in new_docs]:
+                self._remove(doc_id)
+            for doc_id, fields in new_docs.items():
+                old = self._docs.get(doc_id)
+                if old == fields:
+                    continue
+                if old is not None:
+                    self._remove(doc_id)
+                self._add(doc_id, fields)
+            self._source = source
+            self.builds += 1
+        return self
+
+    def add(self, doc_id, fields):
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove(doc_id)
+            self._add(doc_id, tuple(None if _is_missing(v) else v for v in fields))
+
+    def remove(self, doc_id):
+        with self._lock:
+            if doc_id in self._docs:
+                self._remove(doc_id)
+
+    def search(self, query, limit=None):
+        """query に一致する id を関連度の高い順に返す。
+
+        すべての bigram を含む文書を候補にし、見つからなければ半分以上を含む文書まで広げる。
+        並び順: 一致した bigram の割合 + フィールドごとの部分一致の加点（同点ならタイトルが短い順）。
+        """
+        q = normalize(query)
+        qgrams = query_grams(q)
+        if not qgrams:
+            return []
+        with self._lock:
+            postings = [self._postings.get(g, set()) for g in qgrams]
+            # 候補 id -> 含まれている bigram の割合
+            if all(postings):
+                matched = dict.fromkeys(set.intersection(*postings), 1.0)
+            else:
+                matched = {}
+            if not matched and len(qgrams) > 1:
+                counts = {}
+                for p in postings:
+                    for doc_id in p:
+                        counts[doc_id] = counts.get(doc_id, 0) + 1
+                need = math.ceil(len(qgrams) / 2)
+                matched = {d: c / len(qgrams) for d, c in counts.items() if c >= need}
+            scored = []
+            for doc_id, score in matched.items():
+                fields = self._normalized[doc_id]
+                for weight, value in zip(FIELD_WEIGHTS, fields):
+                    if q in value:
+                        score += weight
+                        if value.startswith(q):
+                            score += weight / 4
+                scored.append((-score, len(fields[0]), doc_id))
+        scored.sort()
+        ids = [doc_id for _, _, doc_id in scored]
+        return ids if limit is None else ids[:limit]
+
+    # --- 内部処理 ---
+    @staticmethod
+    def _grams_of(fields):
+        out = set()
+        for value in fields:
+            out |= grams(value)
+        return out
+
+    def _add(self, doc_id, fields):
+        normalized = tuple(normalize(v) for v in fields)
+        self._docs[doc_id] = fields
+        self._normalized[doc_id] = normalized
+        for g in self._grams_of(normalized):
+            self._postings.setdefault(g, set()).add(doc_id)
+
+    def _remove(self, doc_id):
+        for g in self._grams_of(self._normalized.pop(doc_id)):
+            ids = self._postings.get(g)
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self._postings[g]
+        del self._docs[doc_id]
+
+
+def book_documents(df_books):
+    """books の DataFrame から (id, (タイトル, 著者, カテゴリ)) を作る。"""
+    if df_books.empty:
+        return []
+    return zip(
+        df_books["id"],
+        zip(df_books["title"], df_books["author"], df_books["category"].astype(object)),
+    )
+
+
+def history_documents(df_events):
+    """events の DataFrame（books を埋め込み済み）から (イベント id, (タイトル, 著者, カテゴリ)) を作る。"""
+    if df_events.empty or "books" not in df_events.columns:
+        return []
+    return (
+        (str(event_id), (book.get("title"), book.get("author"), book.get("category")))
+        for event_id, book in zip(df_events["id"], df_events["books"])
+        if book
+    )
@@ -0,0 +1,118 @@
+"""Supabase と同じテーブル構成のローカル SQLite データベース。
+
+ネットワークなしで集計や負荷試験を行うための代用品。
+"""
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clubs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+INSERT OR IGNORE INTO clubs (id, name) VALUES ('default', 'Book Club');
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    club_id TEXT NOT NULL DEFAULT 'default',
+    user_name TEXT NOT NULL,
+    icon TEXT DEFAULT '👤',
+    UNIQUE (club_id, user_name)
+);
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    club_id TEXT NOT NULL DEFAULT 'default',
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS books (
+    id TEXT NOT NULL DEFAULT (lower(hex(randomblob(16)))),
+    club_id TEXT NOT NULL DEFAULT 'default',
+    title TEXT NOT NULL,
+    author TEXT,
+    category TEXT,
+    url TEXT,
+    created_by TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    deleted_at TEXT,
+    PRIMARY KEY (club_id, id)
+);
+CREATE TABLE IF NOT EXISTS votes (
+    id TEXT NOT NULL DEFAULT (lower(hex(randomblob(16)))),
+    club_id TEXT NOT NULL DEFAULT 'default',
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    action TEXT NOT NULL CHECK (action IN ('選出', '投票')),
+    book_id TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    points INTEGER,
+    comment TEXT,
+    PRIMARY KEY (club_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    id TEXT NOT NULL DEFAULT (lower(hex(randomblob(16)))),
+    club_id TEXT NOT NULL DEFAULT 'default',
+    event_date TEXT NOT NULL,
+    event_time TEXT,
+    book_id TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    PRIMARY KEY (club_id, id)
+);
+CREATE TABLE IF NOT EXISTS votes_archive (
+    id TEXT NOT NULL,
+    club_id TEXT NOT NULL DEFAULT 'default',
+    created_at TEXT NOT NULL,
+    action TEXT NOT NULL,
+    book_id TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    points INTEGER,
+    comment TEXT,
+    event_id TEXT,
+    archived_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now')),
+    PRIMARY KEY (club_id, id)
+);
+CREATE TABLE IF NOT EXISTS access_logs (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(16)))),
+    club_id TEXT NOT NULL DEFAULT 'default',
+    user_name TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+);
+"""
+
+# クラブ（clubs.id）ごとに行を分ける列。クラブを持つ前に作ったファイルには connect() で足す
+# books / votes / events / votes_archive の id はクラブの中で一意（別のクラブと同じ id でもよい）
+CLUB_TABLES = ("users", "categories", "books", "votes", "events", "votes_archive", "access_logs")
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS books_created_at_idx ON books (created_at);
+CREATE INDEX IF NOT EXISTS votes_created_at_idx ON votes (created_at);
+CREATE INDEX IF NOT EXISTS votes_book_id_idx ON votes (book_id);
+CREATE INDEX IF NOT EXISTS events_created_at_idx ON events (created_at);
+CREATE INDEX IF NOT EXISTS events_book_id_idx ON events (book_id);
+CREATE INDEX IF NOT EXISTS events_club_id_book_id_idx ON events (club_id, book_id);
+CREATE INDEX IF NOT EXISTS votes_archive_event_id_idx ON votes_archive (event_id);
+CREATE INDEX IF NOT EXISTS categories_club_id_idx ON categories (club_id, id);
+CREATE INDEX IF NOT EXISTS books_club_id_created_at_idx ON books (club_id, created_at);
+CREATE INDEX IF NOT EXISTS votes_club_id_created_at_idx ON votes (club_id, created_at);
+CREATE INDEX IF NOT EXISTS events_club_id_created_at_idx ON events (club_id, created_at);
+"""
+
+
+def connect(path=":memory:"):
+    """スキーマを作成済みの接続を返す。
+
+    スレッド間で共有できるようにし、トランザクションは呼び出し側で明示的に張る
+    （isolation_level=None で自動 BEGIN をしない）。
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    _add_club_columns(conn)
+    conn.executescript(INDEXES)
+    return conn
+
+
+def _add_club_columns(conn):
+    # 既存の行はすべて 'default' クラブのものにする
+    # （古いファイルの users.user_name の UNIQUE と、id だけの主キーは SQLite では外せないので残る）
+    for table in CLUB_TABLES:
+        columns = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if "club_id" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN club_id TEXT NOT NULL DEFAULT 'default'")
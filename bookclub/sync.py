@@ -0,0 +1,178 @@
+"""books / votes / events の差分同期。
+
+毎回 ``select("*")`` で全件を取り直す代わりに、テーブルごとのスナップショットを
+メモリに持ち、``created_at`` の透かし（watermark）以降の行だけを取りに行く。
+削除は、削除クエリの戻り値による即時反映（tombstone）と、定期的な id 突き合わせ
+（reconcile）の二段構えで反映する。
+
+created_at はトランザクションの開始時刻なので、後からコミットされた行が透かしより前の
+created_at を持つことがある。差分は透かしから overlap 秒さかのぼって取り直し、
+それでも取りこぼした行は突き合わせのときに id で取り直す。
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+
+class TableSnapshot:
+    """1 テーブル分の差分同期スナップショット。
+
+    fetch_since(watermark) は watermark 以降（同時刻を含む）の行を、
+    watermark が None のときは全件を返す関数。fetch_ids() は現存する id の一覧を返す関数。
+    fetch_by_ids(ids) は ids の行を返す関数（None なら取りこぼしがあったとき全件を取り直す）。
+    overlap: 差分の取得で透かしからさかのぼる秒数
+    """
+
+    def __init__(self, fetch_since, fetch_ids, columns, key="id", watermark="created_at",
+                 sort_by=None, reconcile_interval=300, fetch_by_ids=None, overlap=10.0):
+        self._fetch_since = fetch_since
+        self._fetch_ids = fetch_ids
+        self._fetch_by_ids = fetch_by_ids
+        self._overlap = timedelta(seconds=overlap)
+        self._columns = columns
+        self._key = key
+        self._watermark_col = watermark
+        self._sort_by = sort_by  # (列名, 降順か)
+        self._reconcile_interval = reconcile_interval
+        self._rows = None  # id -> row(dict)。挿入順を保つ
+        self._watermark = None
+        self._frame = None
+        self._last_reconcile = 0.0
+        self._stale = False
+        self._lock = threading.Lock()
+
+    def sync(self):
+        """差分を取り込み、最新の DataFrame を返す。"""
+        with self._lock:
+            if self._rows is None:
+                self._load_full()
+            else:
+                self._pull_delta()
+                due = time.monotonic() - self._last_reconcile >= self._reconcile_interval
+                if self._stale or due:
+                    self._reconcile()
+            if self._frame is None:
+                self._frame = self._build_frame()
+            return self._frame
+
+    def discard(self, rows):
+        """削除クエリの戻り値（削除された行）をスナップショットから取り除く。
+
+        戻り値が空（RLS などで行が返らない場合）は、次回の sync で突き合わせを行う。
+        """
+        ids = [str(r[self._key]) for r in rows or [] if r.get(self._key) is not None]
+        with self._lock:
+            if not ids:
+                self._stale = True
+                return
+            if self._rows is None:
+                return
+            removed = False
+            for i in ids:
+                if self._rows.pop(i, None) is not None:
+                    removed = True
+            if removed:
+                self._frame = None
+
+    def mark_stale(self, min_age=0):
+        """次回の sync で id の突き合わせを強制する。
+
+        最後の突き合わせから min_age 秒たっていなければ何もしない（続けて呼ばれたときの間引き）。
+        突き合わせを予約したら True。
+        """
+        with self._lock:
+            if time.monotonic() - self._last_reconcile < min_age:
+                return False
+            self._stale = True
+            return True
+
+    # --- 内部処理 ---
+    def _load_full(self):
+        self._rows = {}
+        self._merge(self._fetch_since(None))
+        self._frame = None
+        self._last_reconcile = time.monotonic()
+        self._stale = False
+
+    def _pull_delta(self):
+        new_rows = self._fetch_since(self._delta_start())
+        if not new_rows:
+            return
+        # 追記だけなら既存の DataFrame に連結、更新を含むなら作り直す
+        appended = [r for r in new_rows if str(r[self._key]) not in self._rows]
+        updated = [r for r in new_rows
+                   if str(r[self._key]) in self._rows and self._rows[str(r[self._key])] != r]
+        self._merge(new_rows)
+        if not appended and not updated:
+            return
+        if not updated and self._frame is not None and not self._sort_by:
+            self._frame = pd.concat([self._frame, pd.DataFrame(appended)], ignore_index=True)
+        else:
+            self._frame = None
+
+    def _reconcile(self):
+        # 消えた行を取り除き、差分で取りこぼした行を id で取り直す
+        alive = [str(i) for i in self._fetch_ids()]
+        alive_set = set(alive)
+        gone = [i for i in self._rows if i not in alive_set]
+        missing = [i for i in alive if i not in self._rows]
+        for i in gone:
+            del self._rows[i]
+        if missing:
+            if self._fetch_by_ids is None:
+                self._rows = {}
+                self._merge(self._fetch_since(None))
+            else:
+                self._merge(self._fetch_by_ids(missing))
+        if gone or missing:
+            self._frame = None
+        self._last_reconcile = time.monotonic()
+        self._stale = False
+
+    def _delta_start(self):
+        # 透かしから overlap だけさかのぼった時刻（読めない形式なら透かしそのもの）
+        if self._watermark is None or not self._overlap:
+            return self._watermark
+        try:
+            start = datetime.fromisoformat(self._watermark) - self._overlap
+        except ValueError:
+            return self._watermark
+        # 文字列で比べるので、日付と時刻の区切り（"T" か " "）は透かしに合わせる
+        return start.isoformat(sep=" " if self._watermark[10:11] == " " else "T")
+
+    def _merge(self, rows):
+        for r in rows:
+            self._rows[str(r[self._key])] = r
+            w = r.get(self._watermark_col)
+            if w is not None and (self._watermark is None or str(w) > self._watermark):
+                self._watermark = str(w)
+
+    def _build_frame(self):
+        if not self._rows:
+            return pd.DataFrame(columns=self._columns)
+        df = pd.DataFrame(list(self._rows.values()))
+        if self._sort_by:
+            col, desc = self._sort_by
+            df = df.sort_values(col, ascending=not desc, kind="stable").reset_index(drop=True)
+        return df
+
+
+def repository_snapshot(repo, table, empty_columns=None, sort_by=None, reconcile_interval=300,
+                        query=None, overlap=10.0):
+    """Repository（bookclub.repository）の books / votes / events に対する TableSnapshot を作る。
+
+    query は取得メソッドに渡すキーワード引数（columns など。bookclub.projections.query_for）。
+    """
+    fetch = getattr(repo, table)
+    query = query or {}
+    return TableSnapshot(
+        fetch_since=lambda since: fetch(since, **query),
+        fetch_ids=lambda: repo.ids(table),
+        fetch_by_ids=lambda ids: fetch(ids=ids, **query),
+        columns=empty_columns or [],
+        sort_by=sort_by,
+        reconcile_interval=reconcile_interval,
+        overlap=overlap,
+    )
@@ -0,0 +1,107 @@
+"""1 つのプロセスで複数のクラブ（読書会）を扱うための、クラブごとのキャッシュの置き場所。
+
+    registry = ClubRegistry(make_club, maxsize=16)
+    club = registry.get("default")          # なければ make_club("default") で作る
+    snapshots = club.resource("snapshots", make_snapshots)
+
+キャッシュはクラブごとに分けるので、あるクラブの投票で別のクラブのキャッシュは無効にならない。
+メモリに置くクラブの数は maxsize までで、それを超えたら最近使っていないクラブから捨てる
+（次に使われたときに作り直す。ディスクに保存したスナップショットがあればそれで温まる）。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class ClubState:
+    """1 つのクラブのキャッシュ一式。
+
+    作るときに渡したもの（repo / table_cache など）は属性で、最初に使うときに作るもの
+    （pandas が要るスナップショットなど）は resource() で取り出す。
+    """
+
+    def __init__(self, club_id, **parts):
+        self.club_id = club_id
+        self.__dict__.update(parts)
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    def resource(self, name, make):
+        """name のオブジェクトを返す。まだなければ make() で作る（同時に呼ばれても 1 回だけ）。"""
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = make()
+            return self._resources[name]
+
+
+class ClubRegistry:
+    """club_id → factory(club_id) の戻り値を、最大 maxsize 件まで持つ LRU。
+
+    factory が例外を投げたら何も保存せずにそのまま投げる。KeyError（存在しないクラブ）は
+    missing_ttl 秒のあいだ覚えておき、その間は factory を呼ばずに KeyError を投げる
+    （でたらめな ?club= が来るたびにバックエンドへ問い合わせない。覚えるのは max_missing 件まで）。
+    """
+
+    def __init__(self, factory, maxsize=16, missing_ttl=30.0, max_missing=1024):
+        self._factory = factory
+        self._maxsize = max(1, int(maxsize))
+        self._missing_ttl = float(missing_ttl)
+        self._max_missing = max_missing
+        self._entries = OrderedDict()
+        self._missing = OrderedDict()  # club_id -> 覚えておく期限（monotonic）
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def clubs(self):
+        """メモリにあるクラブの id（最近使った順）。"""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def get(self, club_id):
+        with self._lock:
+            entry = self._entries.get(club_id)
+            if entry is not None:
+                self._entries.move_to_end(club_id)
+                self.hits += 1
+                return entry
+            if self._missing.get(club_id, 0) > time.monotonic():
+                self.rejected += 1
+                raise KeyError(club_id)
+            self.misses += 1
+        # 作るのはロックの外で（他のクラブの取り出しを待たせない）。同時に作られたら先に入ったほうを使う
+        try:
+            created = self._factory(club_id)
+        except KeyError:
+            with self._lock:
+                self._missing[club_id] = time.monotonic() + self._missing_ttl
+                self._missing.move_to_end(club_id)
+                while len(self._missing) > self._max_missing:
+                    self._missing.popitem(last=False)
+            raise
+        with self._lock:
+            self._missing.pop(club_id, None)
+            entry = self._entries.setdefault(club_id, created)
+            self._entries.move_to_end(club_id)
+            self._evict()
+            return entry
+
+    def resize(self, maxsize):
+        with self._lock:
+            self._maxsize = max(1, int(maxsize))
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,235 @@
+"""rerun ごとの処理時間の計測（スパン）と、操作ごとの直近のパーセンタイル。
+
+    with tracer.span("load.books", rerun=rerun_id) as s:
+        df = s.measure(load())      # 行数・サイズも記録する
+
+スパンは同じスレッドの中で入れ子にでき、rerun を省略すると親スパンの rerun を引き継ぐ。
+（スレッドプールで動く読み込みも、外側のスパンに rerun を渡せば中の Supabase 呼び出しまで紐づく）
+club（クラブの id）も同じく親から引き継ぎ、集計（summary）はクラブごとに分けられる。
+"""
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+
+logger = logging.getLogger("bookclub.trace")
+
+
+class Span:
+    """1 回の計測。rows（行数）と bytes（データ量）は分かるときだけ入る。"""
+
+    __slots__ = ("name", "rerun", "club", "parent", "started", "duration_ms", "rows", "bytes", "error")
+
+    def __init__(self, name, rerun, parent, club=None):
+        self.name = name
+        self.rerun = rerun
+        self.club = club
+        self.parent = parent
+        self.started = time.time()
+        self.duration_ms = None
+        self.rows = None
+        self.bytes = None
+        self.error = None
+
+    def set(self, rows=None, bytes=None):
+        if rows is not None:
+            self.rows = rows
+        if bytes is not None:
+            self.bytes = bytes
+
+    def add_bytes(self, n):
+        self.bytes = (self.bytes or 0) + n
+
+    def measure(self, value):
+        """value の行数・サイズを記録して、そのまま返す。"""
+        # pandas はログイン画面では読み込まないので、ここでも import しない（未読み込みなら DataFrame ではない）
+        pd = sys.modules.get("pandas")
+        if pd is not None and isinstance(value, pd.DataFrame):
+            self.set(rows=len(value), bytes=int(value.memory_usage(index=True).sum()))
+        elif isinstance(value, str):
+            self.set(bytes=len(value.encode("utf-8")))
+        elif isinstance(value, (list, tuple, set, dict)):
+            self.set(rows=len(value))
+        return value
+
+    def as_dict(self):
+        return {
+            "span": self.name,
+            "rerun": self.rerun,
+            "club": self.club,
+            "parent": self.parent,
+            "started": round(self.started, 3),
+            "duration_ms": self.duration_ms,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "error": self.error,
+        }
+
+
+class Tracer:
+    """全セッション・全クラブで共有する計測結果（集計はクラブごと）。
+
+    window: 操作ごとに保持する直近の計測数（パーセンタイルはこの範囲で計算する）
+    keep_reruns: スパンの一覧を保持する rerun の数
+    log: True ならスパンの終了ごとに JSON 1 行を logger "bookclub.trace" に出す
+    """
+
+    def __init__(self, window=500, keep_reruns=50, log=False):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.window = window
+        self._durations = defaultdict(lambda: deque(maxlen=window))  # (club, name) -> 直近の時間
+        self._last = {}  # (club, name) -> 最後のスパン
+        self._reruns = OrderedDict()
+        self._keep_reruns = keep_reruns
+        self.log = log
+        if log and not logger.handlers:
+            logger.addHandler(logging.StreamHandler())
+            logger.setLevel(logging.INFO)
+
+    def span(self, name, rerun=None, club=None):
+        return _SpanContext(self, name, rerun, club)
+
+    def current(self):
+        """このスレッドで実行中の一番内側のスパン（なければ None）。"""
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else None
+
+    def on_http_response(self, response):
+        """httpx の response フック。受信したバイト数を実行中のスパンに足す。"""
+        span = self.current()
+        if span is not None:
+            response.read()
+            span.add_bytes(len(response.content))
+
+    def summary(self, club=None):
+        """操作ごとの件数・p50 / p95 / p99（ミリ秒）と直近の行数・バイト数。
+
+        club を渡すとそのクラブのスパンだけ（省略時は全クラブ分をまとめて）集計する。
+        """
+        merged = defaultdict(list)
+        last = {}
+        with self._lock:
+            for (c, name), d in self._durations.items():
+                if club is None or c == club:
+                    merged[name].extend(d)
+            for (c, name), span in self._last.items():
+                if (club is None or c == club) and (name not in last or span.started > last[name].started):
+                    last[name] = span
+        rows = []
+        for name, durations in sorted(merged.items()):
+            q = _percentiles(durations)
+            rows.append({
+                "operation": name,
+                "count": len(durations),
+                "p50_ms": round(q[49], 1),
+                "p95_ms": round(q[94], 1),
+                "p99_ms": round(q[98], 1),
+                "rows": last[name].rows,
+                "bytes": last[name].bytes,
+            })
+        return rows
+
+    def rerun_spans(self, rerun):
+        """rerun のスパンの一覧（開始順）。"""
+        with self._lock:
+            return [s.as_dict() for s in self._reruns.get(rerun, ())]
+
+    def reset(self, club=None):
+        """計測結果を捨てる（club を渡すとそのクラブの分だけ）。"""
+        with self._lock:
+            if club is None:
+                self._durations.clear()
+                self._last.clear()
+                self._reruns.clear()
+                return
+            for key in [k for k in self._durations if k[0] == club]:
+                del self._durations[key]
+                self._last.pop(key, None)
+            for rerun in [r for r, spans in self._reruns.items() if spans and spans[0].club == club]:
+                del self._reruns[rerun]
+
+    def _push(self, name, rerun, club):
+        stack = self._local.__dict__.setdefault("stack", [])
+        parent = stack[-1] if stack else None
+        if rerun is None and parent is not None:
+            rerun = parent.rerun
+        if club is None and parent is not None:
+            club = parent.club
+        span = Span(name, rerun, parent.name if parent else None, club)
+        stack.append(span)
+        return span
+
+    def _pop(self, span):
+        self._local.stack.pop()
+        with self._lock:
+            self._durations[span.club, span.name].append(span.duration_ms)
+            self._last[span.club, span.name] = span
+            if span.rerun is not None:
+                spans = self._reruns.setdefault(span.rerun, [])
+                self._reruns.move_to_end(span.rerun)
+                spans.append(span)
+                while len(self._reruns) > self._keep_reruns:
+                    self._reruns.popitem(last=False)
+        if self.log:
+            logger.info(json.dumps(span.as_dict(), ensure_ascii=False))
+
+
+def _percentiles(values):
+    # 1〜99 パーセンタイル（pandas の quantile と同じ線形補間）
+    if len(values) == 1:
+        return values * 99
+    return statistics.quantiles(values, n=100, method="inclusive")
+
+
+class _SpanContext:
+    def __init__(self, tracer, name, rerun, club):
+        self._tracer = tracer
+        self._name = name
+        self._rerun = rerun
+        self._club = club
+        self._span = None
+        self._t0 = None
+
+    def __enter__(self):
+        self._span = self._tracer._push(self._name, self._rerun, self._club)
+        self._t0 = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        self._span.duration_ms = round((time.perf_counter() - self._t0) * 1000, 3)
+        if exc_type is not None:
+            self._span.error = exc_type.__name__
+        self._tracer._pop(self._span)
+        return False
+
+
+class TracedRepository:
+    """Repository の各メソッド呼び出しを "repo.<メソッド名>" のスパンで囲むラッパー。
+
+    aggregates / vote_commands の呼び出しも "aggregates.<名前>" などで計測する。
+    club を渡すと、外側のスパンがない呼び出しもそのクラブのスパンにする。
+    """
+
+    NESTED = ("aggregates", "vote_commands")
+
+    def __init__(self, target, tracer, prefix="repo", club=None):
+        self._target = target
+        self._tracer = tracer
+        self._prefix = prefix
+        self._club = club
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in self.NESTED:
+            return TracedRepository(attr, self._tracer, prefix=name, club=self._club)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with self._tracer.span(f"{self._prefix}.{name}", club=self._club) as s:
+                return s.measure(attr(*args, **kwargs))
+        return call
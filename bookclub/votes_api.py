@@ -0,0 +1,138 @@
+"""選出・投票の書き込み API。
+
+ルール（選出は 1 人 1 冊、+1 / +2 は 1 回ずつ、自分の選出には投票不可）を
+サーバー側で検証し、更新後のランキング（active_round_ranking と同じ形の行）を返す。
+ルールはクラブ（club_id）ごと。本の id はクラブの中でだけ一意なので、book_id はそのクラブの行とだけ突き合わせる。
+Supabase では RPC（supabase/migrations/20261017_add_vote_rpcs.sql）を呼び、
+オフライン検証ではローカル SQLite 上で同じ検証をトランザクション内で行う。
+"""
+import threading
+
+from bookclub.aggregates import SQLiteAggregates
+
+
+class VoteRuleError(Exception):
+    """投票ルールに反する操作。"""
+
+
+class SupabaseVoteCommands:
+    def __init__(self, get_client, club_id):
+        self._get_client = get_client
+        self._club_id = club_id
+
+    def nominate(self, user_name, book_id, comment=None):
+        return self._call("nominate", p_user_name=user_name, p_book_id=str(book_id), p_comment=comment)
+
+    def cancel_nomination(self, user_name):
+        return self._call("cancel_nomination", p_user_name=user_name)
+
+    def cast_vote(self, user_name, book_id, points):
+        return self._call("cast_vote", p_user_name=user_name, p_book_id=str(book_id), p_points=int(points))
+
+    def cancel_vote(self, user_name, book_id):
+        return self._call("cancel_vote", p_user_name=user_name, p_book_id=str(book_id))
+
+    def reset_my_votes(self, user_name):
+        return self._call("reset_my_votes", p_user_name=user_name)
+
+    def _call(self, name, **params):
+        return self._get_client().rpc(name, {**params, "p_club_id": self._club_id}).execute().data
+
+
+# 「今回のラウンド」の votes（events に未登録の本）
+_ACTIVE = "NOT EXISTS (SELECT 1 FROM events e WHERE e.club_id = v.club_id AND e.book_id = v.book_id)"
+
+
+class SQLiteVoteCommands:
+    """ローカル SQLite 上で RPC と同じ検証を行う代用品。"""
+
+    def __init__(self, conn, club_id, lock=None):
+        self._conn = conn
+        self._club_id = club_id
+        self._lock = lock or threading.Lock()
+        self._aggregates = SQLiteAggregates(conn, club_id)
+
+    def nominate(self, user_name, book_id, comment=None):
+        book_id = str(book_id)
+        with self._transaction() as c:
+            if c.execute("SELECT 1 FROM events WHERE club_id = ? AND book_id = ?",
+                         (self._club_id, book_id)).fetchone():
+                raise VoteRuleError("この本はもう開催が決まっています")
+            if c.execute(f"SELECT 1 FROM votes v WHERE club_id = ? AND user_name = ? AND action = '選出' AND {_ACTIVE}",
+                         (self._club_id, user_name)).fetchone():
+                raise VoteRuleError("もうすでに1冊選んでるよ")
+            if c.execute("SELECT 1 FROM votes WHERE club_id = ? AND book_id = ? AND action = '選出'",
+                         (self._club_id, book_id)).fetchone():
+                raise VoteRuleError("他の人が選んでるよ")
+            if not c.execute("SELECT 1 FROM books WHERE id = ? AND club_id = ?",
+                             (book_id, self._club_id)).fetchone():
+                raise VoteRuleError(f"本が見つかりません: {book_id}")
+            c.execute("INSERT INTO votes (action, book_id, user_name, comment, club_id) VALUES ('選出', ?, ?, ?, ?)",
+                      (book_id, user_name, comment, self._club_id))
+            return self._aggregates.ranking_rows()
+
+    def cancel_nomination(self, user_name):
+        with self._transaction() as c:
+            c.execute(f"DELETE FROM votes AS v WHERE club_id = ? AND user_name = ? AND action = '選出' AND {_ACTIVE}",
+                      (self._club_id, user_name))
+            return self._aggregates.ranking_rows()
+
+    def cast_vote(self, user_name, book_id, points):
+        book_id = str(book_id)
+        points = int(points)
+        with self._transaction() as c:
+            if points not in (1, 2):
+                raise VoteRuleError("投票できるのは 1 点か 2 点です")
+            nominators = [r[0] for r in c.execute(
+                f"SELECT user_name FROM votes v WHERE club_id = ? AND book_id = ? AND action = '選出' AND {_ACTIVE}",
+                (self._club_id, book_id))]
+            if not nominators:
+                raise VoteRuleError("この本は選出されていません")
+            if user_name in nominators:
+                raise VoteRuleError("自分の選出には投票できません")
+            if c.execute("SELECT 1 FROM votes WHERE club_id = ? AND user_name = ? AND action = '投票' AND book_id = ?",
+                         (self._club_id, user_name, book_id)).fetchone():
+                raise VoteRuleError("この本にはもう投票しています")
+            if c.execute(f"SELECT 1 FROM votes v WHERE club_id = ? AND user_name = ? AND action = '投票' "
+                         f"AND points = ? AND {_ACTIVE}", (self._club_id, user_name, points)).fetchone():
+                raise VoteRuleError(f"{points} 点はもう使っています")
+            c.execute("INSERT INTO votes (action, book_id, user_name, points, club_id) VALUES ('投票', ?, ?, ?, ?)",
+                      (book_id, user_name, points, self._club_id))
+            return self._aggregates.ranking_rows()
+
+    def cancel_vote(self, user_name, book_id):
+        with self._transaction() as c:
+            c.execute("DELETE FROM votes WHERE club_id = ? AND user_name = ? AND action = '投票' AND book_id = ?",
+                      (self._club_id, user_name, str(book_id)))
+            return self._aggregates.ranking_rows()
+
+    def reset_my_votes(self, user_name):
+        with self._transaction() as c:
+            c.execute("DELETE FROM votes WHERE club_id = ? AND user_name = ? AND action = '投票'",
+                      (self._club_id, user_name))
+            return self._aggregates.ranking_rows()
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+
+class _Transaction:
+    # 接続をスレッド間で共有するので、ロックを取ってから BEGIN IMMEDIATE する
+    def __init__(self, conn, lock):
+        self._conn = conn
+        self._lock = lock
+
+    def __enter__(self):
+        self._lock.acquire()
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._conn.execute("COMMIT")
+            else:
+                self._conn.execute("ROLLBACK")
+        finally:
+            self._lock.release()
+        return False
@@ -0,0 +1,155 @@
+"""ログなどの「書きっぱなし」の行を、裏のスレッドでまとめて書き込む。
+
+    writer = BatchWriter(repo.add_log_rows)
+    writer.submit("access_logs", {"user_name": "alice"})   # すぐ戻る（通信を待たない）
+
+- 行はテーブルごとに最大 max_batch 行ずつ、1 回の insert にまとめる
+- キューは最大 max_pending 行。あふれたら古い行から捨てる（メモリを使い切らない）
+- 失敗したら指数バックオフで max_retries 回まで再試行し、それでもだめならその束を捨てる
+- close() で残りを書き出してから止まる（プロセス終了時に atexit から呼ぶ）
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+logger = logging.getLogger("bookclub.writer")
+
+
+def timestamp():
+    """created_at 用の UTC 時刻（ミリ秒まで、+00:00 付きの ISO 8601。timestamptz にそのまま入る）。
+
+    まとめて書くと書き込みが遅れるので、時刻は submit した時点で付ける。
+    """
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+class BatchWriter:
+    """write(table, rows) をワーカースレッドから呼ぶ、上限付きの書き込みキュー。
+
+    flush_interval: 最初の行が来てから書き込むまで待つ秒数（その間に来た行を同じ束にする）
+    backoff / max_backoff: 再試行の待ち時間（秒）。失敗するたびに 2 倍にする
+    """
+
+    def __init__(self, write, max_batch=100, max_pending=10000, flush_interval=1.0,
+                 max_retries=5, backoff=0.5, max_backoff=30.0, name="bookclub-writer"):
+        self._write = write
+        self._max_batch = max_batch
+        self._flush_interval = flush_interval
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._queue = deque(maxlen=max_pending)  # (table, row)
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._closed = False
+        self._flushing = 0  # flush() で待っている数（いれば束ね待ちをせずに書く）
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self):
+        with self._cond:
+            return len(self._queue) + self._in_flight
+
+    def submit(self, table, row):
+        """行をキューに入れてすぐ戻る。閉じた後の行は捨てる。"""
+        row = {"created_at": timestamp(), **row}
+        with self._cond:
+            if self._closed:
+                self.dropped += 1
+                return
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1  # 一番古い行が押し出される
+            self._queue.append((table, row))
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """キューが空になる（書き込みが終わる）まで待つ。空になれば True。"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                while self._queue or self._in_flight:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flushing -= 1
+        return True
+
+    def close(self, timeout=5.0):
+        """残りを書き出してワーカーを止める（timeout 秒で諦める）。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if self.pending:
+            logger.warning("%d 行を書き込めないまま終了しました", self.pending)
+
+    # --- ワーカー ---
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                # 最初の行から flush_interval 秒たつまで、同時に来た行を同じ束にまとめる
+                # submit() の通知では起きたあとも待ち続け、max_batch 行たまったか close() / flush() のときだけ早めに書く
+                deadline = time.monotonic() + self._flush_interval
+                while not self._closed and not self._flushing and len(self._queue) < self._max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                table, batch = self._take_batch()
+                self._in_flight = len(batch)
+            try:
+                self._write_with_retry(table, batch)
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+    def _take_batch(self):
+        # 先頭の行と同じテーブルの行を、最大 max_batch 行まで取り出す
+        table = self._queue[0][0]
+        batch, rest = [], deque(maxlen=self._queue.maxlen)
+        while self._queue:
+            t, row = self._queue.popleft()
+            if t == table and len(batch) < self._max_batch:
+                batch.append(row)
+            else:
+                rest.append((t, row))
+        self._queue.extend(rest)
+        return table, batch
+
+    def _write_with_retry(self, table, batch):
+        delay = self._backoff
+        for attempt in range(self._max_retries + 1):
+            try:
+                self._write(table, batch)
+            except Exception as e:
+                if attempt == self._max_retries:
+                    self.failed += len(batch)
+                    logger.warning("%s への %d 行の書き込みをあきらめました: %s", table, len(batch), e)
+                    return
+                self.retries += 1
+                # 閉じる途中なら長くは待たない
+                with self._cond:
+                    if self._closed:
+                        delay = min(delay, self._backoff)
+                time.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, self._max_backoff)
+            else:
+                self.sent += len(batch)
+                return
@@ -0,0 +1,49 @@
+-- Votes タブのランキングと History タブのカテゴリ集計をサーバー側で行うビュー
+
+-- 確定前（events に未登録）の本について、選出 1 件ごとに合計ポイントと投票者の内訳を返す
+CREATE OR REPLACE VIEW active_round_ranking AS
+WITH active AS (
+    SELECT v.*
+    FROM votes v
+    WHERE NOT EXISTS (
+        SELECT 1 FROM events e WHERE e.book_id::text = v.book_id::text
+    )
+),
+tallies AS (
+    SELECT
+        book_id::text AS book_id,
+        SUM(COALESCE(points, 0))::int AS points,
+        jsonb_agg(
+            jsonb_build_object('user_name', user_name, 'points', points)
+            ORDER BY created_at, id
+        ) AS voters
+    FROM active
+    WHERE action = '投票'
+    GROUP BY book_id::text
+)
+SELECT
+    n.id AS nomination_id,
+    n.created_at AS nominated_at,
+    n.book_id::text AS book_id,
+    n.user_name AS nominator,
+    b.title,
+    b.author,
+    b.url,
+    COALESCE(t.points, 0) AS points,
+    COALESCE(t.voters, '[]'::jsonb) AS voters
+FROM active n
+LEFT JOIN books b ON b.id::text = n.book_id::text
+LEFT JOIN tallies t ON t.book_id = n.book_id::text
+WHERE n.action = '選出';
+
+-- 過去の開催で読んだ本のカテゴリ別冊数（同じ本を複数回読んでも 1 冊）
+CREATE OR REPLACE VIEW past_category_counts AS
+SELECT
+    b.category,
+    COUNT(DISTINCT e.book_id::text)::int AS book_count
+FROM events e
+JOIN books b ON b.id::text = e.book_id::text
+WHERE e.event_date < CURRENT_DATE
+  AND b.category IS NOT NULL
+  AND b.category <> ''
+GROUP BY b.category;
@@ -0,0 +1,6 @@
+-- 差分同期（created_at 以降の行だけを取得）用のカラムとインデックス
+ALTER TABLE events ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS books_created_at_idx ON books (created_at);
+CREATE INDEX IF NOT EXISTS votes_created_at_idx ON votes (created_at);
+CREATE INDEX IF NOT EXISTS events_created_at_idx ON events (created_at);
@@ -0,0 +1,117 @@
+-- 選出・投票のルールをサーバー側で検証し、更新後のランキングを返す RPC
+--   * 選出は 1 人 1 冊まで、同じ本を 2 人が選出することはできない
+--   * 投票は +1 と +2 を 1 回ずつ、同じ本には 1 回まで、自分の選出には投票できない
+-- 同じユーザー（選出は同じ本も）の操作は advisory lock で直列化するので、
+-- 2 つのタブから同時に押しても重複した行はできない。
+-- 「今回のラウンド」は events に未登録の本（active_round_ranking と同じ定義）。
+
+CREATE OR REPLACE FUNCTION nominate(p_user_name text, p_book_id text, p_comment text DEFAULT NULL)
+RETURNS SETOF active_round_ranking
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('votes:user:' || p_user_name));
+    PERFORM pg_advisory_xact_lock(hashtext('votes:book:' || p_book_id));
+
+    IF EXISTS (SELECT 1 FROM events e WHERE e.book_id::text = p_book_id) THEN
+        RAISE EXCEPTION 'この本はもう開催が決まっています';
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM votes v
+        WHERE v.user_name = p_user_name AND v.action = '選出'
+          AND NOT EXISTS (SELECT 1 FROM events e WHERE e.book_id::text = v.book_id::text)
+    ) THEN
+        RAISE EXCEPTION 'もうすでに1冊選んでるよ';
+    END IF;
+    IF EXISTS (SELECT 1 FROM votes v WHERE v.book_id::text = p_book_id AND v.action = '選出') THEN
+        RAISE EXCEPTION '他の人が選んでるよ';
+    END IF;
+
+    INSERT INTO votes (action, book_id, user_name, comment)
+    SELECT '選出', b.id, p_user_name, p_comment FROM books b WHERE b.id::text = p_book_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION '本が見つかりません: %', p_book_id;
+    END IF;
+
+    RETURN QUERY SELECT * FROM active_round_ranking ORDER BY nominated_at;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION cancel_nomination(p_user_name text)
+RETURNS SETOF active_round_ranking
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('votes:user:' || p_user_name));
+
+    DELETE FROM votes v
+    WHERE v.user_name = p_user_name AND v.action = '選出'
+      AND NOT EXISTS (SELECT 1 FROM events e WHERE e.book_id::text = v.book_id::text);
+
+    RETURN QUERY SELECT * FROM active_round_ranking ORDER BY nominated_at;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION cast_vote(p_user_name text, p_book_id text, p_points int)
+RETURNS SETOF active_round_ranking
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('votes:user:' || p_user_name));
+
+    IF p_points NOT IN (1, 2) THEN
+        RAISE EXCEPTION '投票できるのは 1 点か 2 点です';
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM active_round_ranking r WHERE r.book_id = p_book_id
+    ) THEN
+        RAISE EXCEPTION 'この本は選出されていません';
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM active_round_ranking r
+        WHERE r.book_id = p_book_id AND r.nominator = p_user_name
+    ) THEN
+        RAISE EXCEPTION '自分の選出には投票できません';
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM votes v
+        WHERE v.user_name = p_user_name AND v.action = '投票' AND v.book_id::text = p_book_id
+    ) THEN
+        RAISE EXCEPTION 'この本にはもう投票しています';
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM votes v
+        WHERE v.user_name = p_user_name AND v.action = '投票' AND v.points = p_points
+          AND NOT EXISTS (SELECT 1 FROM events e WHERE e.book_id::text = v.book_id::text)
+    ) THEN
+        RAISE EXCEPTION '% 点はもう使っています', p_points;
+    END IF;
+
+    INSERT INTO votes (action, book_id, user_name, points)
+    SELECT '投票', b.id, p_user_name, p_points FROM books b WHERE b.id::text = p_book_id;
+
+    RETURN QUERY SELECT * FROM active_round_ranking ORDER BY nominated_at;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION cancel_vote(p_user_name text, p_book_id text)
+RETURNS SETOF active_round_ranking
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('votes:user:' || p_user_name));
+
+    DELETE FROM votes v
+    WHERE v.user_name = p_user_name AND v.action = '投票' AND v.book_id::text = p_book_id;
+
+    RETURN QUERY SELECT * FROM active_round_ranking ORDER BY nominated_at;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION reset_my_votes(p_user_name text)
+RETURNS SETOF active_round_ranking
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('votes:user:' || p_user_name));
+
+    DELETE FROM votes v WHERE v.user_name = p_user_name AND v.action = '投票';
+
+    RETURN QUERY SELECT * FROM active_round_ranking ORDER BY nominated_at;
+END;
+$$;
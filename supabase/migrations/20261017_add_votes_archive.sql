@@ -0,0 +1,32 @@
+-- 開催が決まった本への votes を votes_archive に移す
+-- votes には今回のラウンド（events に未登録の本）の行だけが残るので、毎回の取得量が開催のたびに増えない。
+-- 過去のラウンドの分析は votes_archive を event_id（その本の最初の開催）で引く。
+
+CREATE TABLE IF NOT EXISTS votes_archive (LIKE votes INCLUDING DEFAULTS);
+ALTER TABLE votes_archive ADD COLUMN IF NOT EXISTS event_id TEXT;
+ALTER TABLE votes_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMPTZ NOT NULL DEFAULT now();
+
+CREATE INDEX IF NOT EXISTS votes_archive_event_id_idx ON votes_archive (event_id);
+
+-- 移した行を返す（クライアントはその id をスナップショットから取り除く）
+CREATE OR REPLACE FUNCTION archive_decided_votes()
+RETURNS SETOF votes_archive
+LANGUAGE plpgsql AS $$
+BEGIN
+    RETURN QUERY
+    WITH moved AS (
+        DELETE FROM votes v
+        WHERE EXISTS (SELECT 1 FROM events e WHERE e.book_id::text = v.book_id::text)
+        RETURNING v.*
+    )
+    INSERT INTO votes_archive
+    SELECT m.*, (
+        SELECT e.id::text FROM events e
+        WHERE e.book_id::text = m.book_id::text
+        ORDER BY e.event_date
+        LIMIT 1
+    ), now()
+    FROM moved m
+    RETURNING *;
+END;
+$$;
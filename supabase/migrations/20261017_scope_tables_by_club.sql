@@ -0,0 +1,236 @@
+-- 1 つのデプロイで複数の読書会（クラブ）を扱うための club_id
+-- （ファイル名の順に適用すると、20261017_add_* のビュー・RPC・votes_archive を作った後に実行される）
+-- 既存の行はすべて 'default' クラブのものとして扱う。
+-- id が全クラブで一意であることは保証しない（取り込んだデータなど）ので、events / books との
+-- 突き合わせには book_id と一緒に club_id も揃える。
+
+CREATE TABLE IF NOT EXISTS clubs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+INSERT INTO clubs (id, name) VALUES ('default', 'Book Club') ON CONFLICT (id) DO NOTHING;
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS club_id TEXT NOT NULL DEFAULT 'default' REFERENCES clubs (id);
+ALTER TABLE categories ADD COLUMN IF NOT EXISTS club_id TEXT NOT NULL DEFAULT 'default' REFERENCES clubs (id);
+ALTER TABLE books ADD COLUMN IF NOT EXISTS club_id TEXT NOT NULL DEFAULT 'default' REFERENCES clubs (id);
+ALTER TABLE votes ADD COLUMN IF NOT EXISTS club_id TEXT NOT NULL DEFAULT 'default' REFERENCES clubs (id);
+ALTER TABLE events ADD COLUMN IF NOT EXISTS club_id TEXT NOT NULL DEFAULT 'default' REFERENCES clubs (id);
+ALTER TABLE votes_archive ADD COLUMN IF NOT EXISTS club_id TEXT NOT NULL DEFAULT 'default';
+ALTER TABLE access_logs ADD COLUMN IF NOT EXISTS club_id TEXT NOT NULL DEFAULT 'default';
+
+-- 同じ名前のメンバーは別のクラブにもいてよい
+CREATE UNIQUE INDEX IF NOT EXISTS users_club_id_user_name_idx ON users (club_id, user_name);
+CREATE INDEX IF NOT EXISTS categories_club_id_idx ON categories (club_id, id);
+-- 差分同期（club_id + created_at 以降）用
+CREATE INDEX IF NOT EXISTS books_club_id_created_at_idx ON books (club_id, created_at);
+CREATE INDEX IF NOT EXISTS votes_club_id_created_at_idx ON votes (club_id, created_at);
+CREATE INDEX IF NOT EXISTS events_club_id_created_at_idx ON events (club_id, created_at);
+CREATE INDEX IF NOT EXISTS votes_archive_club_id_event_id_idx ON votes_archive (club_id, event_id);
+
+-- ビューの行の形が変わるので、それを返す関数ごと作り直す
+DROP FUNCTION IF EXISTS nominate(text, text, text);
+DROP FUNCTION IF EXISTS cancel_nomination(text);
+DROP FUNCTION IF EXISTS cast_vote(text, text, int);
+DROP FUNCTION IF EXISTS cancel_vote(text, text);
+DROP FUNCTION IF EXISTS reset_my_votes(text);
+DROP FUNCTION IF EXISTS archive_decided_votes();
+DROP VIEW IF EXISTS active_round_ranking;
+DROP VIEW IF EXISTS past_category_counts;
+
+-- 20261017_add_ranking_aggregates.sql と同じ集計に club_id を加えたもの（クライアントは club_id で絞る）
+CREATE VIEW active_round_ranking AS
+WITH active AS (
+    SELECT v.*
+    FROM votes v
+    WHERE NOT EXISTS (
+        SELECT 1 FROM events e WHERE e.club_id = v.club_id AND e.book_id::text = v.book_id::text
+    )
+),
+tallies AS (
+    SELECT
+        club_id,
+        book_id::text AS book_id,
+        SUM(COALESCE(points, 0))::int AS points,
+        jsonb_agg(
+            jsonb_build_object('user_name', user_name, 'points', points)
+            ORDER BY created_at, id
+        ) AS voters
+    FROM active
+    WHERE action = '投票'
+    GROUP BY club_id, book_id::text
+)
+SELECT
+    n.id AS nomination_id,
+    n.created_at AS nominated_at,
+    n.book_id::text AS book_id,
+    n.user_name AS nominator,
+    b.title,
+    b.author,
+    b.url,
+    COALESCE(t.points, 0) AS points,
+    COALESCE(t.voters, '[]'::jsonb) AS voters,
+    n.club_id
+FROM active n
+LEFT JOIN books b ON b.club_id = n.club_id AND b.id::text = n.book_id::text
+LEFT JOIN tallies t ON t.club_id = n.club_id AND t.book_id = n.book_id::text
+WHERE n.action = '選出';
+
+CREATE VIEW past_category_counts AS
+SELECT
+    e.club_id,
+    b.category,
+    COUNT(DISTINCT e.book_id::text)::int AS book_count
+FROM events e
+JOIN books b ON b.club_id = e.club_id AND b.id::text = e.book_id::text
+WHERE e.event_date < CURRENT_DATE
+  AND b.category IS NOT NULL
+  AND b.category <> ''
+GROUP BY e.club_id, b.category;
+
+-- 20261017_add_vote_rpcs.sql の RPC にクラブを加えたもの。
+-- ユーザーのロックと「1 人 1 冊」などの検証はクラブごと（同じ名前の別クラブのメンバーとは干渉しない）。
+
+CREATE FUNCTION nominate(p_user_name text, p_book_id text, p_comment text DEFAULT NULL,
+                         p_club_id text DEFAULT 'default')
+RETURNS SETOF active_round_ranking
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('votes:user:' || p_club_id || ':' || p_user_name));
+    PERFORM pg_advisory_xact_lock(hashtext('votes:book:' || p_club_id || ':' || p_book_id));
+
+    IF EXISTS (SELECT 1 FROM events e WHERE e.club_id = p_club_id AND e.book_id::text = p_book_id) THEN
+        RAISE EXCEPTION 'この本はもう開催が決まっています';
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM votes v
+        WHERE v.club_id = p_club_id AND v.user_name = p_user_name AND v.action = '選出'
+          AND NOT EXISTS (SELECT 1 FROM events e WHERE e.club_id = v.club_id AND e.book_id::text = v.book_id::text)
+    ) THEN
+        RAISE EXCEPTION 'もうすでに1冊選んでるよ';
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM votes v WHERE v.club_id = p_club_id AND v.book_id::text = p_book_id AND v.action = '選出'
+    ) THEN
+        RAISE EXCEPTION '他の人が選んでるよ';
+    END IF;
+
+    INSERT INTO votes (action, book_id, user_name, comment, club_id)
+    SELECT '選出', b.id, p_user_name, p_comment, p_club_id
+    FROM books b WHERE b.id::text = p_book_id AND b.club_id = p_club_id;
+    IF NOT FOUND THEN
+        RAISE EXCEPTION '本が見つかりません: %', p_book_id;
+    END IF;
+
+    RETURN QUERY SELECT * FROM active_round_ranking r WHERE r.club_id = p_club_id ORDER BY nominated_at;
+END;
+$$;
+
+CREATE FUNCTION cancel_nomination(p_user_name text, p_club_id text DEFAULT 'default')
+RETURNS SETOF active_round_ranking
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('votes:user:' || p_club_id || ':' || p_user_name));
+
+    DELETE FROM votes v
+    WHERE v.club_id = p_club_id AND v.user_name = p_user_name AND v.action = '選出'
+      AND NOT EXISTS (SELECT 1 FROM events e WHERE e.club_id = v.club_id AND e.book_id::text = v.book_id::text);
+
+    RETURN QUERY SELECT * FROM active_round_ranking r WHERE r.club_id = p_club_id ORDER BY nominated_at;
+END;
+$$;
+
+CREATE FUNCTION cast_vote(p_user_name text, p_book_id text, p_points int, p_club_id text DEFAULT 'default')
+RETURNS SETOF active_round_ranking
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('votes:user:' || p_club_id || ':' || p_user_name));
+
+    IF p_points NOT IN (1, 2) THEN
+        RAISE EXCEPTION '投票できるのは 1 点か 2 点です';
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM active_round_ranking r WHERE r.club_id = p_club_id AND r.book_id = p_book_id
+    ) THEN
+        RAISE EXCEPTION 'この本は選出されていません';
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM active_round_ranking r
+        WHERE r.club_id = p_club_id AND r.book_id = p_book_id AND r.nominator = p_user_name
+    ) THEN
+        RAISE EXCEPTION '自分の選出には投票できません';
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM votes v
+        WHERE v.club_id = p_club_id AND v.user_name = p_user_name AND v.action = '投票'
+          AND v.book_id::text = p_book_id
+    ) THEN
+        RAISE EXCEPTION 'この本にはもう投票しています';
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM votes v
+        WHERE v.club_id = p_club_id AND v.user_name = p_user_name AND v.action = '投票'
+          AND v.points = p_points
+          AND NOT EXISTS (SELECT 1 FROM events e WHERE e.club_id = v.club_id AND e.book_id::text = v.book_id::text)
+    ) THEN
+        RAISE EXCEPTION '% 点はもう使っています', p_points;
+    END IF;
+
+    INSERT INTO votes (action, book_id, user_name, points, club_id)
+    SELECT '投票', b.id, p_user_name, p_points, p_club_id
+    FROM books b WHERE b.id::text = p_book_id AND b.club_id = p_club_id;
+
+    RETURN QUERY SELECT * FROM active_round_ranking r WHERE r.club_id = p_club_id ORDER BY nominated_at;
+END;
+$$;
+
+CREATE FUNCTION cancel_vote(p_user_name text, p_book_id text, p_club_id text DEFAULT 'default')
+RETURNS SETOF active_round_ranking
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('votes:user:' || p_club_id || ':' || p_user_name));
+
+    DELETE FROM votes v
+    WHERE v.club_id = p_club_id AND v.user_name = p_user_name AND v.action = '投票'
+      AND v.book_id::text = p_book_id;
+
+    RETURN QUERY SELECT * FROM active_round_ranking r WHERE r.club_id = p_club_id ORDER BY nominated_at;
+END;
+$$;
+
+CREATE FUNCTION reset_my_votes(p_user_name text, p_club_id text DEFAULT 'default')
+RETURNS SETOF active_round_ranking
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('votes:user:' || p_club_id || ':' || p_user_name));
+
+    DELETE FROM votes v WHERE v.club_id = p_club_id AND v.user_name = p_user_name AND v.action = '投票';
+
+    RETURN QUERY SELECT * FROM active_round_ranking r WHERE r.club_id = p_club_id ORDER BY nominated_at;
+END;
+$$;
+
+-- 20261017_add_votes_archive.sql と同じ移動を、そのクラブの votes だけに行う
+CREATE FUNCTION archive_decided_votes(p_club_id text DEFAULT 'default')
+RETURNS SETOF votes_archive
+LANGUAGE plpgsql AS $$
+BEGIN
+    RETURN QUERY
+    WITH moved AS (
+        DELETE FROM votes v
+        WHERE v.club_id = p_club_id
+          AND EXISTS (SELECT 1 FROM events e WHERE e.club_id = v.club_id AND e.book_id::text = v.book_id::text)
+        RETURNING v.*
+    )
+    INSERT INTO votes_archive (id, created_at, action, book_id, user_name, points, comment,
+                               event_id, archived_at, club_id)
+    SELECT m.id, m.created_at, m.action, m.book_id, m.user_name, m.points, m.comment, (
+        SELECT e.id::text FROM events e
+        WHERE e.club_id = m.club_id AND e.book_id::text = m.book_id::text
+        ORDER BY e.event_date
+        LIMIT 1
+    ), now(), m.club_id
+    FROM moved m
+    RETURNING *;
+END;
+$$;
@@ -0,0 +1,135 @@
+"""テーブルキャッシュ（bookclub/cache.py の TableCache）の single-flight と「🔄 更新」の間引き。
+
+同じテーブルを同時に読み込んでも loader() は 1 回だけ呼び、失敗・中断したら待っていた全員に同じ例外を返す。
+refresh() は refresh_window 秒以内に取得したテーブルを捨てない。
+"""
+import threading
+import time
+
+import pytest
+
+from bookclub import cache
+from bookclub.cache import TableCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    return clock
+
+
+class SlowLoader:
+    """release されるまで戻らない loader。呼ばれた回数を数える。"""
+
+    def __init__(self, result="rows", error=None):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.result = result
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def run_concurrently(tc, loader, n):
+    # 1 本目が loader() に入ってから残りを始め、全員の結果（か例外）を返す
+    results = [None] * n
+
+    def get(i):
+        try:
+            results[i] = tc.get("votes", loader)
+        except BaseException as e:
+            results[i] = e
+    threads = [threading.Thread(target=get, args=(i,), daemon=True) for i in range(n)]
+    threads[0].start()
+    assert loader.started.wait(2)
+    for t in threads[1:]:
+        t.start()
+    # 後続が取得中の印を見つけて待ち始めるまで待つ
+    deadline = time.monotonic() + 2
+    while tc.coalesced < n - 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    loader.release.set()
+    for t in threads:
+        t.join(2)
+    return results
+
+
+def test_concurrent_gets_share_one_fetch():
+    tc = TableCache()
+    loader = SlowLoader()
+    assert run_concurrently(tc, loader, 5) == ["rows"] * 5
+    assert (loader.calls, tc.fetches, tc.coalesced) == (1, 1, 4)
+    # 取得後はキャッシュから返す
+    assert tc.get("votes", loader) == "rows"
+    assert tc.hits == 1
+
+
+@pytest.mark.parametrize("error", [ConnectionError("down"), KeyboardInterrupt()])
+def test_failed_fetch_is_shared_and_not_cached(error):
+    tc = TableCache()
+    loader = SlowLoader(error=error)
+    results = run_concurrently(tc, loader, 3)
+    assert all(r is error for r in results)
+    # 取得中の印は外れているので、次の get はもう一度取得する
+    assert tc.get("votes", lambda: "retry") == "retry"
+    assert tc.fetches == 2
+
+
+def test_invalidate_during_a_fetch_discards_its_result():
+    tc = TableCache()
+    loader = SlowLoader(result="old")
+    thread = threading.Thread(target=tc.get, args=("votes", loader))
+    thread.start()
+    assert loader.started.wait(2)
+    tc.invalidate("votes")
+    loader.release.set()
+    thread.join(2)
+    assert tc.get("votes", lambda: "new") == "new"
+
+
+def test_ttl_expires_per_table(clock):
+    tc = TableCache(ttls={"votes": 30})
+    tc.get("votes", lambda: "v1")
+    clock.now += 29
+    assert tc.get("votes", lambda: "v2") == "v1"
+    clock.now += 2
+    assert tc.get("votes", lambda: "v2") == "v2"
+
+
+def test_refresh_keeps_tables_fetched_within_the_window(clock):
+    tc = TableCache(refresh_window=5)
+    tc.get("votes", lambda: "v1")
+    tc.get("books", lambda: "b1")
+    clock.now += 3
+    tc.refresh()
+    assert tc.get("votes", lambda: "v2") == "v1"
+    assert tc.debounced == 2
+    clock.now += 3
+    tc.refresh("votes")
+    assert tc.get("votes", lambda: "v2") == "v2"
+    assert tc.get("books", lambda: "b2") == "b1"
+    assert tc.saved == 2
+
+
+def test_invalidate_is_not_debounced(clock):
+    tc = TableCache(refresh_window=5)
+    tc.get("votes", lambda: "v1")
+    tc.invalidate("votes")
+    assert tc.get("votes", lambda: "v2") == "v2"
+    assert tc.version("votes") == 1
@@ -0,0 +1,64 @@
+"""2 つのクラブが同じ book_id の本を持っていても、events との突き合わせはクラブごとに行う。
+
+id はクラブの中でだけ一意なので、あるクラブで開催が決まった本が、別のクラブの同じ id の本を
+「開催済み」にしてはいけない（ランキング・選出の検証・アーカイブ・カテゴリ集計・events の埋め込み）。
+"""
+from datetime import date
+
+import pytest
+
+from bookclub.repository import SQLiteRepository
+from bookclub.votes_api import VoteRuleError
+
+BOOK_ID = "b1"
+
+
+@pytest.fixture
+def clubs():
+    base = SQLiteRepository()
+    base.conn.execute("INSERT INTO clubs (id, name) VALUES ('a', 'A'), ('b', 'B')")
+    a, b = base.for_club("a"), base.for_club("b")
+    a.add_book({"id": BOOK_ID, "title": "A の本", "category": "小説"})
+    b.add_book({"id": BOOK_ID, "title": "B の本", "category": "SF"})
+    # A では b1 がもう選ばれて開催が決まっている。B では今回のラウンドの候補
+    a.add_vote({"id": "v1", "action": "選出", "book_id": BOOK_ID, "user_name": "alice"})
+    a.add_event({"id": "e1", "event_date": "2000-01-01", "book_id": BOOK_ID})
+    b.add_vote({"id": "v1", "action": "選出", "book_id": BOOK_ID, "user_name": "bob"})
+    b.add_vote({"id": "v2", "action": "投票", "book_id": BOOK_ID, "user_name": "carol", "points": 2})
+    return a, b
+
+
+def test_ranking_ignores_other_clubs_events(clubs):
+    a, b = clubs
+    assert a.aggregates.ranking_rows() == []
+    [row] = b.aggregates.ranking_rows()
+    assert (row["book_id"], row["title"], row["points"]) == (BOOK_ID, "B の本", 2)
+
+
+def test_vote_rules_ignore_other_clubs_rows(clubs):
+    a, b = clubs
+    with pytest.raises(VoteRuleError, match="開催が決まっています"):
+        a.vote_commands.nominate("dave", BOOK_ID)
+    b.vote_commands.cancel_nomination("bob")
+    # A の開催・A の選出は B の選出を妨げない
+    [row] = b.vote_commands.nominate("bob", BOOK_ID)
+    assert row["title"] == "B の本"
+
+
+def test_archive_moves_only_decided_votes_of_the_club(clubs):
+    a, b = clubs
+    assert b.archive_decided_votes() == []
+    assert len(b.votes()) == 2
+    [archived] = a.archive_decided_votes()
+    assert (archived["club_id"], archived["id"], archived["event_id"]) == ("a", "v1", "e1")
+    assert a.votes() == []
+
+
+def test_events_embed_and_count_the_clubs_own_book(clubs):
+    a, b = clubs
+    [event] = a.events()
+    assert event["books"]["title"] == "A の本"
+    assert b.events() == []
+    counts = a.aggregates.category_counts(today=date(2001, 1, 1))
+    assert counts.to_dict("records") == [{"カテゴリ": "小説", "冊数": 1}]
+    assert b.aggregates.category_counts(today=date(2001, 1, 1)).empty
@@ -0,0 +1,51 @@
+"""画面ごとに、その画面で描画するビューの列（bookclub/projections.py の VIEWS）だけを取得して描画する。
+
+全ビューの和集合で取得すると、あるビューが別のビューの列を読んでいても気づけない
+（たとえばヘッダーが books.category を読んでも、History が宣言しているので通ってしまう）。
+宣言にない DataFrame の列は KeyError、埋め込みの本の dict のキーは ProjectionError になる。
+"""
+import os
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+from bench.datagen import SCALES, generate, seed_repository
+from bookclub.repository import SQLiteRepository
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# 画面（セクション） -> 描画するビュー（ヘッダーはどの画面でも描画する）
+SECTION_VIEWS = {
+    "📖 Books": ("header", "books"),
+    "🗳️ Votes": ("header", "votes"),
+    "📜 History": ("header", "history"),
+    "⚙️ Admin": ("header", "admin"),
+}
+
+
+@pytest.fixture(scope="module")
+def database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("projections") / "bookclub.sqlite3")
+    seed_repository(SQLiteRepository(path), generate(SCALES["small"]))
+    return path
+
+
+@pytest.mark.parametrize("section", list(SECTION_VIEWS))
+def test_section_reads_only_its_views(database, section):
+    # テーブルのキャッシュは全セッションで共有なので、別の列で取得したものを使わないよう捨てておく
+    st.cache_resource.clear()
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.secrets.update({
+        "DATA_BACKEND": "sqlite", "SQLITE_PATH": database, "SNAPSHOT_DIR": "",
+        "STRICT_PROJECTIONS": True, "PROJECTION_VIEWS": list(SECTION_VIEWS[section]),
+    })
+    # ログイン直後からこの画面を開く（最初に別の画面を描画しない）
+    at.session_state["section"] = section
+    at.run()
+    login = [b for b in at.button if b.key and b.key.startswith("l_")]
+    login[-1].click().run()
+    assert at.segmented_control(key="section").value == section
+
+    assert not at.exception, [e.message for e in at.exception]
+    assert not at.error, [e.value for e in at.error]
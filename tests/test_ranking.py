@@ -0,0 +1,132 @@
+"""compute_ranking（bookclub/ranking.py）が、置き換える前の app.py のループと同じ結果になるか。"""
+import pandas as pd
+import pytest
+
+from bookclub.ranking import compute_ranking
+
+USERS = pd.DataFrame({"user_name": ["alice", "bob", "carol"], "icon": ["🐱", "🐶", "🦊"]})
+BOOKS = pd.DataFrame({"id": [1, 2, 3, 4], "url": ["u1", None, "u3", "u4"]})
+VOTE_COLUMNS = ["action", "book_id", "user_name", "points", "書籍タイトル", "著者名"]
+
+
+def nomination(book_id, user_name):
+    return ("選出", str(book_id), user_name, 0, f"本{book_id}", f"著者{book_id}")
+
+
+def vote(book_id, user_name, points):
+    return ("投票", str(book_id), user_name, points, None, None)
+
+
+def votes_frame(rows):
+    return pd.DataFrame(rows, columns=VOTE_COLUMNS)
+
+
+def baseline(df_active_votes, user_df, df_books, current_user):
+    # 置き換える前の app.py のループ（iterrows で選出ごとに投票を絞り込む）
+    nominated_rows = df_active_votes[df_active_votes["action"] == "選出"]
+    vote_only = df_active_votes[df_active_votes["action"] == "投票"]
+    user_icon_map = dict(zip(user_df["user_name"], user_df["icon"]))
+    url_map = dict(zip(df_books["id"].astype(str), df_books["url"]))
+
+    max_p = 0
+    all_stats = []
+    for _, n in nominated_rows.iterrows():
+        p = int(vote_only[vote_only["book_id"] == str(n["book_id"])]["points"].sum())
+        if p > max_p:
+            max_p = p
+        all_stats.append(p)
+
+    my_votes = vote_only[vote_only["user_name"] == current_user]
+    rows = []
+    for i, (_, n) in enumerate(nominated_rows.iterrows()):
+        b_id = str(n["book_id"])
+        b_votes = vote_only[vote_only["book_id"] == b_id]
+        rows.append({
+            "book_id": b_id,
+            "title": n["書籍タイトル"],
+            "author": n["著者名"],
+            "url": url_map.get(b_id),
+            "nominator": n["user_name"],
+            "nominator_icon": user_icon_map.get(n["user_name"], "👤"),
+            "points": all_stats[i],
+            "details": " + ".join(
+                f"{user_icon_map.get(v['user_name'], '👤')} {int(v['points'])}" for _, v in b_votes.iterrows()
+            ),
+            "is_top": all_stats[i] == max_p and max_p > 0,
+            "my_points": int(my_votes[my_votes["book_id"] == b_id]["points"].sum()),
+        })
+    return rows, max_p, set(my_votes["points"].tolist())
+
+
+def normalized(row):
+    # URL のない本は None / NaN のどちらでもよい。is_top は numpy.bool_ でも bool でもよい
+    return {**row, "url": None if pd.isna(row["url"]) else row["url"], "is_top": bool(row["is_top"])}
+
+
+def assert_same(df_active_votes, current_user="alice"):
+    ranking = compute_ranking(df_active_votes, USERS, BOOKS, current_user)
+    rows, max_p, used = baseline(df_active_votes, USERS, BOOKS, current_user)
+
+    got = [normalized(r) for r in ranking.table.to_dict("records")]
+    assert got == [normalized(r) for r in rows]
+    assert ranking.max_points == max_p
+    assert ranking.my_used_points == used
+
+
+def test_points_details_and_my_points():
+    assert_same(votes_frame([
+        nomination(1, "alice"), nomination(2, "bob"), nomination(3, "carol"),
+        vote(1, "bob", 2), vote(1, "carol", 1), vote(2, "alice", 2), vote(3, "alice", 1),
+    ]))
+
+
+def test_ties_mark_every_top_book():
+    df = votes_frame([
+        nomination(1, "alice"), nomination(2, "bob"), nomination(3, "carol"),
+        vote(1, "bob", 2), vote(2, "alice", 2), vote(3, "alice", 1),
+    ])
+    assert_same(df)
+    assert compute_ranking(df, USERS, BOOKS, "alice").table["is_top"].tolist() == [True, True, False]
+
+
+def test_no_points_means_no_top():
+    df = votes_frame([nomination(1, "alice"), nomination(2, "bob")])
+    assert_same(df)
+    assert not compute_ranking(df, USERS, BOOKS, "alice").table["is_top"].any()
+
+
+@pytest.mark.parametrize("cancelled", [
+    [1],        # alice が本 3 への投票を取り消した
+    [0, 1],     # alice が投票をすべて取り消した
+])
+def test_cancelled_votes(cancelled):
+    # 取り消した投票は votes から行ごと消えるので、残りの行だけで同じ結果になること
+    votes = [vote(2, "alice", 2), vote(3, "alice", 1), vote(2, "bob", 1)]
+    kept = [v for i, v in enumerate(votes) if i not in cancelled]
+    assert_same(votes_frame([nomination(1, "alice"), nomination(2, "bob"), nomination(3, "carol")] + kept))
+
+
+def test_votes_for_cancelled_nomination_are_ignored():
+    # 選出を取り消した本への投票が残っていても、ランキングには出さない
+    assert_same(votes_frame([nomination(1, "alice"), vote(1, "bob", 1), vote(2, "alice", 2)]))
+
+
+def test_unknown_user_and_book_use_defaults():
+    assert_same(votes_frame([nomination(9, "dave"), vote(9, "erin", 2)]), current_user="erin")
+
+
+def test_empty_input():
+    assert_same(votes_frame([]))
+    ranking = compute_ranking(votes_frame([]), USERS, BOOKS, "alice")
+    assert ranking.table.empty
+    assert ranking.max_points == 0
+    assert ranking.my_used_points == set()
+
+
+def test_book_nominated_twice_keeps_the_first_nomination():
+    # 2 人が同時に同じ本を選出できてしまっても、本 1 冊につき 1 行（投票ボタンのキーが重複しない）
+    df = votes_frame([nomination(1, "alice"), nomination(1, "bob"), vote(1, "carol", 2)])
+    table = compute_ranking(df, USERS, BOOKS, "carol").table
+    assert table[["book_id", "nominator", "points", "my_points"]].to_dict("records") == [
+        {"book_id": "1", "nominator": "alice", "points": 2, "my_points": 2},
+    ]
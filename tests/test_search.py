@@ -0,0 +1,74 @@
+"""本の全文検索（bookclub/search.py）の正規化・並び順・差分反映。
+
+表記ゆれ（全角半角・カタカナひらがな・空白）をそろえて bigram で引き、
+すべての bigram を含む本がなければ、半分以上を含む本まで広げる。
+"""
+import pandas as pd
+
+from bookclub.search import SearchIndex, book_documents, normalize
+
+BOOKS = [
+    ("b1", "ノルウェイの森", "村上春樹", "小説"),
+    ("b2", "海辺のカフカ", "村上 春樹", "小説"),
+    ("b3", "村上春樹を読む", "評論家", "評論"),
+    ("b4", "Python 入門", "ＡＢＣ", "技術書"),
+    ("b5", "森の生活", "ソロー", "エッセイ"),
+]
+
+
+def books(rows=BOOKS):
+    return pd.DataFrame(rows, columns=["id", "title", "author", "category"])
+
+
+def index(rows=BOOKS):
+    return SearchIndex().sync(books(rows), book_documents)
+
+
+def test_normalize_folds_width_kana_and_spaces():
+    assert normalize("ＡＢＣ カタカナ") == "abcかたかな"
+    assert normalize(None) == ""
+    assert normalize(float("nan")) == ""
+
+
+def test_title_match_ranks_above_author_match():
+    # タイトルに含む本が先、同点ならタイトルが短い順
+    assert index().search("村上春樹") == ["b3", "b2", "b1"]
+
+
+def test_query_is_normalized_like_the_documents():
+    idx = index()
+    assert idx.search("python") == ["b4"]
+    assert idx.search("abc") == ["b4"]
+    assert idx.search("のるうぇい") == ["b1"]
+
+
+def test_single_character_query():
+    assert index().search("森") == ["b5", "b1"]
+
+
+def test_falls_back_to_half_of_the_bigrams():
+    # 「村上春子」は「春子」を含む本がないので、bigram の半分以上が一致する本を返す
+    idx = index()
+    assert sorted(idx.search("村上春子")) == ["b1", "b2", "b3"]
+    assert idx.search("まったく無関係") == []
+
+
+def test_limit_and_empty_query():
+    idx = index()
+    assert idx.search("村上春樹", limit=1) == ["b3"]
+    assert idx.search("  ") == []
+
+
+def test_sync_applies_only_the_differences():
+    idx = index()
+    source = books()
+    assert idx.sync(source, book_documents).builds == 2
+    # 同じ DataFrame なら何もしない
+    assert idx.sync(source, book_documents).builds == 2
+    changed = BOOKS[1:] + [("b1", "ダンス・ダンス・ダンス", "村上春樹", "小説")]
+    idx.sync(books(changed), book_documents)
+    assert idx.search("ノルウェイ") == []
+    assert idx.search("ダンス") == ["b1"]
+    idx.sync(books(BOOKS[:1]), book_documents)
+    assert len(idx) == 1
+    assert idx.search("カフカ") == []
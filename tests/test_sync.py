@@ -0,0 +1,131 @@
+"""差分同期（bookclub/sync.py の TableSnapshot）が、取りこぼし・削除をサーバーと突き合わせて直すか。"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from bookclub.repository import SQLiteRepository
+from bookclub.sync import TableSnapshot, repository_snapshot
+
+
+class FakeTable:
+    """created_at 付きの行を持つテーブル。呼び出しの引数を記録する。"""
+
+    def __init__(self, rows=()):
+        self.rows = {r["id"]: r for r in rows}
+        self.since_calls = []
+        self.by_ids_calls = []
+
+    def fetch_since(self, since):
+        self.since_calls.append(since)
+        return [r for r in self.rows.values() if since is None or r["created_at"] >= since]
+
+    def fetch_ids(self):
+        return list(self.rows)
+
+    def fetch_by_ids(self, ids):
+        self.by_ids_calls.append(sorted(ids))
+        return [self.rows[i] for i in ids if i in self.rows]
+
+    def add(self, id, created_at):
+        self.rows[id] = {"id": id, "created_at": created_at}
+
+
+def snapshot(table, **kwargs):
+    kwargs = {"fetch_by_ids": table.fetch_by_ids, "reconcile_interval": 1e9, **kwargs}
+    return TableSnapshot(table.fetch_since, table.fetch_ids, columns=["id", "created_at"], **kwargs)
+
+
+def ids(df):
+    return sorted(df["id"])
+
+
+def test_delta_rereads_the_overlap_window():
+    table = FakeTable([{"id": "a", "created_at": "2026-01-01 00:00:30"}])
+    snap = snapshot(table, overlap=10)
+    assert ids(snap.sync()) == ["a"]
+    # 透かしより前の created_at で、後からコミットされた行
+    table.add("late", "2026-01-01 00:00:25")
+    assert ids(snap.sync()) == ["a", "late"]
+    # 区切り文字（" "）は透かしに合わせる（文字列で比べるため）
+    assert table.since_calls[-1] == "2026-01-01 00:00:20"
+
+
+def test_delta_start_keeps_the_t_separator():
+    table = FakeTable([{"id": "a", "created_at": "2026-01-01T00:00:30.500+00:00"}])
+    snap = snapshot(table, overlap=10)
+    snap.sync()
+    snap.sync()
+    assert table.since_calls[-1] == "2026-01-01T00:00:20.500000+00:00"
+
+
+def test_reconcile_fetches_rows_missed_by_the_delta():
+    table = FakeTable([{"id": "a", "created_at": "2026-01-01 00:01:00"}])
+    snap = snapshot(table, overlap=10)
+    snap.sync()
+    # overlap より前の created_at は差分では拾えない
+    table.add("very-late", "2026-01-01 00:00:00")
+    assert ids(snap.sync()) == ["a"]
+    assert snap.mark_stale()
+    assert ids(snap.sync()) == ["a", "very-late"]
+    assert table.by_ids_calls == [["very-late"]]
+
+
+def test_reconcile_without_fetch_by_ids_reloads_everything():
+    table = FakeTable([{"id": "a", "created_at": "2026-01-01 00:01:00"}])
+    snap = snapshot(table, fetch_by_ids=None)
+    snap.sync()
+    table.add("very-late", "2026-01-01 00:00:00")
+    snap.mark_stale()
+    assert ids(snap.sync()) == ["a", "very-late"]
+    assert table.since_calls[-1] is None
+
+
+def test_deletes_from_elsewhere_are_pruned_on_reconcile():
+    table = FakeTable([{"id": "a", "created_at": "2026-01-01 00:00:00"},
+                       {"id": "b", "created_at": "2026-01-01 00:00:01"}])
+    snap = snapshot(table)
+    snap.sync()
+    del table.rows["a"]
+    assert ids(snap.sync()) == ["a", "b"]
+    # 削除の戻り値が空（RLS などで行が返らない）なら、次の sync で突き合わせる
+    snap.discard([])
+    assert ids(snap.sync()) == ["b"]
+
+
+def test_discard_removes_returned_rows_immediately():
+    table = FakeTable([{"id": "a", "created_at": "2026-01-01 00:00:00"}])
+    snap = snapshot(table)
+    snap.sync()
+    del table.rows["a"]
+    snap.discard([{"id": "a"}])
+    assert snap.sync().empty
+    assert table.by_ids_calls == []
+
+
+def test_mark_stale_is_debounced_by_min_age():
+    snap = snapshot(FakeTable())
+    snap.sync()
+    assert not snap.mark_stale(min_age=60)
+    assert snap.mark_stale(min_age=0)
+
+
+def test_sqlite_snapshot_recovers_late_rows():
+    repo = SQLiteRepository()
+    repo.add_book({"title": "a"})
+    snap = repository_snapshot(repo, "books", reconcile_interval=1e9, overlap=10)
+    watermark = snap.sync()["created_at"].max()
+    at = datetime.fromisoformat(watermark)
+    repo.add_book({"title": "slightly-late", "created_at": (at - timedelta(seconds=2)).isoformat()})
+    repo.add_book({"title": "very-late", "created_at": (at - timedelta(hours=1)).isoformat()})
+    assert sorted(snap.sync()["title"]) == ["a", "slightly-late"]
+    snap.mark_stale()
+    assert sorted(snap.sync()["title"]) == ["a", "slightly-late", "very-late"]
+
+
+@pytest.mark.parametrize("count", [0, 1, 450])
+def test_sqlite_fetch_by_ids_in_chunks(count):
+    repo = SQLiteRepository()
+    for i in range(count):
+        repo.add_book({"id": f"b{i:04d}", "title": str(i)})
+    wanted = [f"b{i:04d}" for i in range(count)]
+    assert sorted(r["id"] for r in repo.books(ids=wanted)) == wanted
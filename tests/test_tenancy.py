@@ -0,0 +1,126 @@
+"""クラブごとのキャッシュの置き場所（bookclub/tenancy.py の ClubRegistry）。
+
+メモリに置くクラブは maxsize 件までの LRU。存在しないクラブ（factory の KeyError）は
+missing_ttl 秒のあいだ覚えておき、その間はバックエンドに問い合わせない。
+"""
+import threading
+
+import pytest
+
+from bookclub import tenancy
+from bookclub.tenancy import ClubRegistry, ClubState
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tenancy, "time", clock)
+    return clock
+
+
+class Factory:
+    """known のクラブだけ ClubState を作り、それ以外は KeyError。呼ばれた id を記録する。"""
+
+    def __init__(self, known=("a", "b", "c")):
+        self.known = set(known)
+        self.calls = []
+
+    def __call__(self, club_id):
+        self.calls.append(club_id)
+        if club_id not in self.known:
+            raise KeyError(club_id)
+        return ClubState(club_id)
+
+
+def test_lru_evicts_the_least_recently_used_club():
+    factory = Factory()
+    registry = ClubRegistry(factory, maxsize=2)
+    a = registry.get("a")
+    registry.get("b")
+    assert registry.get("a") is a
+    registry.get("c")
+    assert registry.clubs() == ["c", "a"]
+    assert (registry.hits, registry.misses, registry.evictions) == (1, 3, 1)
+    # 捨てたクラブは次に使われたときに作り直す
+    registry.get("b")
+    assert factory.calls == ["a", "b", "c", "b"]
+    assert registry.clubs() == ["b", "c"]
+
+
+def test_resize_evicts_down_to_the_new_size():
+    registry = ClubRegistry(Factory(), maxsize=3)
+    for club_id in "abc":
+        registry.get(club_id)
+    registry.resize(1)
+    assert registry.clubs() == ["c"]
+    assert registry.maxsize == 1
+    assert registry.evictions == 2
+
+
+def test_missing_club_is_remembered_for_the_ttl(clock):
+    factory = Factory()
+    registry = ClubRegistry(factory, missing_ttl=30)
+    for _ in range(3):
+        with pytest.raises(KeyError):
+            registry.get("nope")
+    assert factory.calls == ["nope"]
+    assert registry.rejected == 2
+    # TTL が過ぎたらもう一度問い合わせる
+    clock.now += 31
+    factory.known.add("nope")
+    assert registry.get("nope").club_id == "nope"
+    assert factory.calls == ["nope", "nope"]
+
+
+def test_remembered_missing_clubs_are_bounded(clock):
+    factory = Factory(known=())
+    registry = ClubRegistry(factory, missing_ttl=30, max_missing=2)
+    for club_id in ("x", "y", "z"):
+        with pytest.raises(KeyError):
+            registry.get(club_id)
+    # 一番古い "x" は忘れているので、もう一度問い合わせる
+    with pytest.raises(KeyError):
+        registry.get("x")
+    assert factory.calls == ["x", "y", "z", "x"]
+
+
+def test_other_factory_errors_are_not_cached():
+    calls = []
+
+    def factory(club_id):
+        calls.append(club_id)
+        if len(calls) == 1:
+            raise ConnectionError("down")
+        return ClubState(club_id)
+    registry = ClubRegistry(factory)
+    with pytest.raises(ConnectionError):
+        registry.get("a")
+    assert registry.get("a").club_id == "a"
+    assert len(registry) == 1
+
+
+def test_resource_is_made_once_per_club():
+    club = ClubState("a", repo="repo")
+    made = []
+
+    def make():
+        made.append(1)
+        return object()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(club.resource("snapshots", make)))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert club.repo == "repo"
+    assert len(made) == 1
+    assert all(r is results[0] for r in results)
@@ -0,0 +1,108 @@
+"""選出・投票のルールを書き込み側（SQLiteVoteCommands）で検証できているか。
+
+Supabase の RPC と同じルールを、ローカル SQLite 上でトランザクション内で確かめる。
+ルール違反は VoteRuleError になり、votes には何も書き込まれない。
+"""
+import pytest
+
+from bookclub.repository import SQLiteRepository
+from bookclub.votes_api import VoteRuleError
+
+
+@pytest.fixture
+def repo():
+    repo = SQLiteRepository()
+    for i in (1, 2, 3):
+        repo.add_book({"id": f"b{i}", "title": f"本{i}"})
+    return repo
+
+
+@pytest.fixture
+def commands(repo):
+    return repo.vote_commands
+
+
+def points(rows):
+    return {r["book_id"]: r["points"] for r in rows}
+
+
+def test_nominate_and_vote_return_the_ranking(commands):
+    commands.nominate("alice", "b1")
+    commands.nominate("bob", "b2")
+    commands.cast_vote("carol", "b1", 2)
+    rows = commands.cast_vote("carol", "b2", 1)
+    assert points(rows) == {"b1": 2, "b2": 1}
+
+
+def test_one_nomination_per_user(commands):
+    commands.nominate("alice", "b1")
+    with pytest.raises(VoteRuleError, match="もうすでに1冊選んでるよ"):
+        commands.nominate("alice", "b2")
+    # 取り消せば選び直せる
+    commands.cancel_nomination("alice")
+    assert [r["book_id"] for r in commands.nominate("alice", "b2")] == ["b2"]
+
+
+def test_book_nominated_by_someone_else(commands):
+    commands.nominate("alice", "b1")
+    with pytest.raises(VoteRuleError, match="他の人が選んでるよ"):
+        commands.nominate("bob", "b1")
+
+
+def test_unknown_book_cannot_be_nominated(repo, commands):
+    with pytest.raises(VoteRuleError, match="本が見つかりません"):
+        commands.nominate("alice", "nope")
+    assert repo.votes() == []
+
+
+def test_decided_book_cannot_be_nominated(repo, commands):
+    repo.add_event({"id": "e1", "event_date": "2000-01-01", "book_id": "b1"})
+    with pytest.raises(VoteRuleError, match="開催が決まっています"):
+        commands.nominate("alice", "b1")
+
+
+def test_cannot_vote_for_own_nomination(commands):
+    commands.nominate("alice", "b1")
+    with pytest.raises(VoteRuleError, match="自分の選出には投票できません"):
+        commands.cast_vote("alice", "b1", 2)
+
+
+def test_vote_needs_a_nominated_book(commands):
+    with pytest.raises(VoteRuleError, match="選出されていません"):
+        commands.cast_vote("alice", "b1", 1)
+
+
+@pytest.mark.parametrize("value", [0, 3, -1])
+def test_points_must_be_one_or_two(commands, value):
+    commands.nominate("alice", "b1")
+    with pytest.raises(VoteRuleError, match="1 点か 2 点"):
+        commands.cast_vote("bob", "b1", value)
+
+
+def test_each_point_value_is_used_once(commands):
+    commands.nominate("alice", "b1")
+    commands.nominate("bob", "b2")
+    commands.cast_vote("carol", "b1", 2)
+    with pytest.raises(VoteRuleError, match="2 点はもう使っています"):
+        commands.cast_vote("carol", "b2", 2)
+    with pytest.raises(VoteRuleError, match="この本にはもう投票しています"):
+        commands.cast_vote("carol", "b1", 1)
+
+
+def test_cancel_and_reset_free_the_points(commands):
+    commands.nominate("alice", "b1")
+    commands.nominate("bob", "b2")
+    commands.cast_vote("carol", "b1", 2)
+    commands.cancel_vote("carol", "b1")
+    commands.cast_vote("carol", "b2", 2)
+    rows = commands.reset_my_votes("carol")
+    assert points(rows) == {"b1": 0, "b2": 0}
+    assert points(commands.cast_vote("carol", "b1", 2)) == {"b1": 2, "b2": 0}
+
+
+def test_rejected_command_writes_nothing(repo, commands):
+    commands.nominate("alice", "b1")
+    before = repo.votes()
+    with pytest.raises(VoteRuleError):
+        commands.cast_vote("alice", "b1", 1)
+    assert repo.votes() == before
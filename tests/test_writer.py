@@ -0,0 +1,134 @@
+"""ログの書き込みキュー（bookclub/writer.py の BatchWriter）の束ね方・再試行・終了処理。
+
+submit() はすぐ戻り、行はテーブルごとに束ねて裏のスレッドから書き込まれる。
+失敗は指数バックオフで再試行し、close() は残りを書き出してから止まる。
+"""
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from bookclub.repository import SQLiteRepository
+from bookclub.writer import BatchWriter, timestamp
+
+
+class Recorder:
+    """write(table, rows) の呼び出しを記録する。最初の fail 回は ConnectionError にする。"""
+
+    def __init__(self, fail=0):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, table, rows):
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError("down")
+        self.calls.append((table, [r["i"] for r in rows]))
+
+
+@pytest.fixture
+def writers():
+    # テストが失敗してもワーカーを止める
+    made = []
+
+    def make(write, **kwargs):
+        w = BatchWriter(write, **kwargs)
+        made.append(w)
+        return w
+    yield make
+    for w in made:
+        w.close(timeout=1)
+
+
+def test_rows_within_the_interval_share_one_batch(writers):
+    write = Recorder()
+    w = writers(write, flush_interval=0.5)
+    for i in range(5):
+        w.submit("access_logs", {"i": i})
+        time.sleep(0.02)
+    # 最初の行から flush_interval 秒たつまでは書かない
+    time.sleep(0.1)
+    assert write.calls == []
+    time.sleep(0.6)
+    assert write.calls == [("access_logs", [0, 1, 2, 3, 4])]
+
+
+def test_full_batch_is_written_without_waiting(writers):
+    write = Recorder()
+    w = writers(write, flush_interval=10, max_batch=3)
+    for i in range(7):
+        w.submit("access_logs", {"i": i})
+    time.sleep(0.3)
+    assert write.calls == [("access_logs", [0, 1, 2]), ("access_logs", [3, 4, 5])]
+    # 残りの 1 行は close() で書き出す
+    w.close()
+    assert write.calls[-1] == ("access_logs", [6])
+
+
+def test_batches_are_per_table(writers):
+    write = Recorder()
+    w = writers(write, flush_interval=10)
+    for i, table in enumerate(["a", "b", "a", "b"]):
+        w.submit(table, {"i": i})
+    assert w.flush(2)
+    assert sorted(write.calls) == [("a", [0, 2]), ("b", [1, 3])]
+
+
+def test_failed_writes_are_retried_with_backoff(writers):
+    write = Recorder(fail=3)
+    w = writers(write, flush_interval=0, backoff=0.01)
+    w.submit("access_logs", {"i": 0})
+    assert w.flush(5)
+    assert write.calls == [("access_logs", [0])]
+    assert (w.sent, w.retries, w.failed) == (1, 3, 0)
+
+
+def test_gives_up_after_max_retries(writers):
+    write = Recorder(fail=100)
+    w = writers(write, flush_interval=0, max_retries=2, backoff=0.01)
+    w.submit("access_logs", {"i": 0})
+    w.submit("access_logs", {"i": 1})
+    assert w.flush(5)
+    assert (w.sent, w.retries, w.failed) == (0, 2, 2)
+
+
+def test_pending_rows_are_bounded(writers):
+    started = threading.Event()
+
+    def write(table, rows):
+        started.set()
+        time.sleep(0.3)
+    w = writers(write, max_pending=10, flush_interval=0)
+    w.submit("x", {"i": -1})
+    started.wait(1)
+    for i in range(100):
+        w.submit("x", {"i": i})
+    assert w.dropped == 90
+    assert w.pending <= 11
+
+
+def test_close_flushes_and_rejects_later_rows():
+    write = Recorder()
+    w = BatchWriter(write, flush_interval=10)
+    w.submit("access_logs", {"i": 0})
+    started = time.monotonic()
+    w.close()
+    assert time.monotonic() - started < 1
+    assert write.calls == [("access_logs", [0])]
+    w.submit("access_logs", {"i": 1})
+    assert w.dropped == 1
+    assert w.pending == 0
+
+
+def test_submit_stamps_the_time_of_the_call():
+    stamp = datetime.fromisoformat(timestamp())
+    assert stamp.utcoffset().total_seconds() == 0
+    repo = SQLiteRepository()
+    w = BatchWriter(repo.add_log_rows, flush_interval=10)
+    before = timestamp()
+    w.submit("access_logs", {"user_name": "alice"})
+    w.close()
+    [(user, created_at)] = repo.conn.execute("SELECT user_name, created_at FROM access_logs").fetchall()
+    assert user == "alice"
+    assert before <= created_at <= timestamp()